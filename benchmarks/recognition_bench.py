@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+端到端识别基准 - 在合成帧上逐阶段计时并统计识别准确率，结果输出为JSON
+
+无需运行游戏或连接显示器：截图阶段用“从整屏画面拷贝区域并集”代替mss截图，
+其余阶段（裁剪、模板打分、OCR、Buy XP检测、数据库写入）与GUI调用的代码相同。
+
+用法:
+    python benchmarks/recognition_bench.py --frames 200 --output bench.json
+    python benchmarks/recognition_bench.py --resolutions 1920x1080 --noise 6 --blur 3 --jpeg 70
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from synthetic import DEFAULT_BUY_XP_PATH, DEFAULT_CONFIG_PATH, DEFAULT_TEMPLATES_DIR, Degradation, SyntheticFrameFactory
+
+from capture import Frame
+from database import TFTStatsDatabase
+from matching import MATCH_MODES, RegionDetector, TemplateBankSet, match_slots
+from ocr_module import DEFAULT_OCR_BACKEND, OCR_BACKENDS, NumberOCR
+
+
+# 计时的流水线阶段，按执行顺序
+STAGES = ("capture", "crop", "score", "ocr", "buy_xp", "db_write", "total")
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_resolution(text: str):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """毫秒延迟的分位数、均值和最大值"""
+    if not samples:
+        return {}
+    values = np.asarray(samples) * 1000.0
+    summary = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary["mean"] = round(float(values.mean()), 3)
+    summary["max"] = round(float(values.max()), 3)
+    return summary
+
+
+def ratio(hits: int, total: int) -> Optional[float]:
+    return round(hits / total, 4) if total else None
+
+
+def best_hit(hits: List[dict]) -> Optional[str]:
+    """区域内分数最高的模板名，没有命中时为None"""
+    if not hits:
+        return None
+    return max(hits, key=lambda hit: hit["score"])["name"]
+
+
+def run_resolution(args, width: int, height: int, db: TFTStatsDatabase, session_id: int) -> dict:
+    """在一种分辨率下运行基准，返回该分辨率的结果"""
+    degradation = Degradation(noise_sigma=args.noise, blur_ksize=args.blur, jpeg_quality=args.jpeg)
+    factory = SyntheticFrameFactory(width, height, config_path=args.config, templates_dir=args.templates_dir,
+                                    buy_xp_path=args.buy_xp, degradation=degradation,
+                                    empty_rate=args.empty_rate, buy_xp_rate=args.buy_xp_rate,
+                                    slot_jitter=args.slot_jitter, font_path=args.font, seed=args.seed)
+
+    fixed_regions = factory.fixed_regions
+    capture_regions = fixed_regions + [factory.level_region, factory.stage_region, factory.buy_xp_region]
+    layout = factory.geometry.layout(capture_regions)
+    rows = slice(layout.origin[1], layout.origin[1] + layout.area["height"])
+    cols = slice(layout.origin[0], layout.origin[0] + layout.area["width"])
+
+    setup_start = time.perf_counter()
+    bank = TemplateBankSet(args.templates_dir, cache_dir=args.template_cache).for_regions(fixed_regions)
+    setup_bank = time.perf_counter() - setup_start
+    ocr = NumberOCR(cache_size=args.ocr_cache, backend=args.ocr_backend)
+    detector = RegionDetector(args.buy_xp, scale=factory.resolution_scale) if factory.buy_xp is not None else None
+
+    timings = defaultdict(list)
+    counts = defaultdict(int)
+    synth_time = 0.0
+
+    for index in range(args.warmup + args.frames):
+        synth_start = time.perf_counter()
+        truth = factory.generate()
+        synth_time += time.perf_counter() - synth_start
+        measured = index >= args.warmup
+        stage_times = {}
+
+        # 截图替身：与mss一样拷贝区域并集得到新缓冲区
+        start = time.perf_counter()
+        frame = Frame(truth.image[rows, cols].copy(), origin=layout.origin, layout=layout)
+        stage_times["capture"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        slot_images = [frame.view(region) for region in fixed_regions]
+        level_image = frame.view(factory.level_region)
+        stage_image = frame.view(factory.stage_region)
+        buy_xp_image = frame.view(factory.buy_xp_region)
+        stage_times["crop"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        slot_hits = match_slots(bank, slot_images, args.threshold, mode=args.match_mode,
+                                early_exit_margin=args.early_exit_margin)
+        stage_times["score"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        level = ocr.recognize_number(level_image)
+        stage = ocr.recognize_stage(stage_image)
+        stage_times["ocr"] = time.perf_counter() - start
+
+        buy_xp_hit = None
+        start = time.perf_counter()
+        if detector is not None:
+            buy_xp_hit = detector.detect(buy_xp_image, threshold=factory.buy_xp_threshold,
+                                         offset=factory.buy_xp_region[:2])
+        stage_times["buy_xp"] = time.perf_counter() - start
+
+        # 与GUI相同的格式写入数据库
+        matches_data, match_details = [], []
+        for i, hits in enumerate(slot_hits):
+            if hits:
+                matches_data.append((i + 1, [hit["name"] for hit in hits]))
+                match_details.append({"score": max(hit["score"] for hit in hits), "level": level})
+        start = time.perf_counter()
+        if matches_data:
+            db.record_matches(session_id, matches_data, match_details, stage)
+        stage_times["db_write"] = time.perf_counter() - start
+        stage_times["total"] = sum(stage_times.values())
+
+        if not measured:
+            continue
+        for name, seconds in stage_times.items():
+            timings[name].append(seconds)
+
+        for expected, hits in zip(truth.shop, slot_hits):
+            predicted = best_hit(hits)
+            if expected is None:
+                counts["empty_slots"] += 1
+                counts["empty_correct"] += predicted is None
+            else:
+                counts["slots"] += 1
+                counts["slots_correct"] += predicted == expected
+        counts["level_correct"] += level == truth.level
+        counts["stage_correct"] += stage == truth.stage
+        if truth.buy_xp is not None:
+            counts["buy_xp_shown"] += 1
+            counts["buy_xp_found"] += buy_xp_hit is not None
+        else:
+            counts["buy_xp_hidden"] += 1
+            counts["buy_xp_false_positive"] += buy_xp_hit is not None
+
+    return {
+        "resolution": [width, height],
+        "slot_size": list(bank.template_size),
+        "templates": len(bank),
+        "template_bank_load_ms": round(setup_bank * 1000.0, 3),
+        "bank_loaded_from_cache": bool(getattr(bank, "loaded_from_cache", False)),
+        "synthesis_ms_per_frame": round(synth_time * 1000.0 / max(1, args.warmup + args.frames), 3),
+        "latency_ms": {name: summarize(timings[name]) for name in STAGES},
+        "accuracy": {
+            "shop_slots": ratio(counts["slots_correct"], counts["slots"]),
+            "empty_slots": ratio(counts["empty_correct"], counts["empty_slots"]),
+            "level": ratio(counts["level_correct"], args.frames),
+            "stage": ratio(counts["stage_correct"], args.frames),
+            "buy_xp_recall": ratio(counts["buy_xp_found"], counts["buy_xp_shown"]),
+            "buy_xp_false_positive_rate": ratio(counts["buy_xp_false_positive"], counts["buy_xp_hidden"]),
+        },
+        "ocr_cache": {"hits": ocr.cache_hits, "misses": ocr.cache_misses},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless end-to-end recognition benchmark on synthetic frames")
+    parser.add_argument("--frames", type=int, default=100, help="Measured frames per resolution")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured warm-up frames per resolution")
+    parser.add_argument("--resolutions", nargs="+", default=["2560x1440", "1920x1080"], help="Frame sizes, e.g. 2560x1440")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for shops, digits and noise")
+    parser.add_argument("--noise", type=float, default=0.0, help="Gaussian noise sigma (gray levels)")
+    parser.add_argument("--blur", type=int, default=0, help="Gaussian blur kernel size, 0 disables")
+    parser.add_argument("--jpeg", type=int, default=0, help="JPEG quality for compression artifacts, 0 disables")
+    parser.add_argument("--empty-rate", type=float, default=0.0, help="Probability that a shop slot is empty")
+    parser.add_argument("--slot-jitter", type=float, default=0.02, help="Max random scale and offset (fraction of the slot size) when pasting shop cards, 0 pastes exact copies")
+    parser.add_argument("--font", default=None, help="TrueType font for the level/stage digits (default: Arial/DejaVu Sans Bold, else PIL's built-in font)")
+    parser.add_argument("--buy-xp-rate", type=float, default=0.8, help="Probability that the Buy XP button is shown")
+    parser.add_argument("--threshold", type=float, default=0.68, help="Match threshold (0-1)")
+    parser.add_argument("--match-mode", choices=MATCH_MODES, default="best", help="Slot matching mode")
+    parser.add_argument("--early-exit-margin", type=float, default=None, help="Early exit margin in best mode")
+    parser.add_argument("--ocr-backend", choices=OCR_BACKENDS, default=DEFAULT_OCR_BACKEND, help="OCR backend (glyph runs without Tesseract)")
+    parser.add_argument("--ocr-cache", type=int, default=0, help="OCR fingerprint cache size (0 measures every read)")
+    parser.add_argument("--templates-dir", default=DEFAULT_TEMPLATES_DIR, help="Template directory")
+    parser.add_argument("--template-cache", default=None, help="Compiled template cache directory (default: disabled)")
+    parser.add_argument("--buy-xp", default=DEFAULT_BUY_XP_PATH, help="Buy XP button template")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="config.json providing the regions")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "recognition",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "frames": args.frames, "warmup": args.warmup, "seed": args.seed,
+            "noise": args.noise, "blur": args.blur, "jpeg": args.jpeg,
+            "empty_rate": args.empty_rate, "buy_xp_rate": args.buy_xp_rate,
+            "slot_jitter": args.slot_jitter, "font": args.font,
+            "threshold": args.threshold, "match_mode": args.match_mode,
+            "early_exit_margin": args.early_exit_margin,
+            "ocr_backend": args.ocr_backend, "ocr_cache": args.ocr_cache,
+        },
+        "runs": [],
+    }
+
+    # 数据库写入使用临时库，不影响tft_stats.db；运行日志转到stderr，stdout只输出JSON
+    with tempfile.TemporaryDirectory() as tmp_dir, contextlib.redirect_stdout(sys.stderr):
+        db = TFTStatsDatabase(os.path.join(tmp_dir, "bench.db"))
+        try:
+            session_id = db.start_session(args.templates_dir, args.threshold, 1)
+            for text in args.resolutions:
+                width, height = parse_resolution(text)
+                print(f"⏱️ {width}x{height}: {args.frames} 帧...")
+                report["runs"].append(run_resolution(args, width, height, db, session_id))
+        finally:
+            db.close()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"✅ 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+合成帧生成 - 把tft_units中的随机商店、Level/阶段数字和Buy XP按钮合成到整屏画面中
+
+区域坐标取自config.json的相对坐标，经capture.DisplayGeometry换算到目标分辨率，
+与GUI实际截图使用的坐标一致。可选叠加高斯噪声、模糊和JPEG压缩伪影。
+
+数字用TrueType字体（PIL）绘制，而不是OCR字形原型所用的Hershey字体，否则OCR准确率是循环论证；
+卡牌默认带少量随机缩放和偏移贴入区域，模板打分的准确率才有意义。
+"""
+
+import json
+import os
+import random
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'src'))
+
+from capture import DisplayGeometry  # noqa: E402
+from matching import load_template_bgr  # noqa: E402
+
+
+Region = Tuple[int, int, int, int]
+
+DEFAULT_CONFIG_PATH = os.path.join(REPO_DIR, 'config.json')
+DEFAULT_TEMPLATES_DIR = os.path.join(REPO_DIR, 'tft_units')
+DEFAULT_BUY_XP_PATH = os.path.join(REPO_DIR, 'tools', 'Buy_XP.png')
+# 依次尝试的数字字体（PIL在系统字体目录中查找），都不存在时使用PIL自带字体
+DEFAULT_FONTS = ('arialbd.ttf', 'Arial Bold.ttf', 'DejaVuSans-Bold.ttf', 'LiberationSans-Bold.ttf')
+
+
+@dataclass
+class Degradation:
+    """画面劣化参数"""
+    noise_sigma: float = 0.0     # 高斯噪声标准差（灰度级）
+    blur_ksize: int = 0          # 高斯模糊核大小，0表示不模糊
+    jpeg_quality: int = 0        # JPEG压缩质量，0表示不压缩
+
+    def apply(self, image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        if self.blur_ksize > 1:
+            ksize = self.blur_ksize | 1
+            image = cv2.GaussianBlur(image, (ksize, ksize), 0)
+        if self.noise_sigma > 0:
+            noise = rng.normal(0.0, self.noise_sigma, image.shape)
+            image = np.clip(image.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+        if 0 < self.jpeg_quality <= 100:
+            ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if ok:
+                image = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+        return image
+
+
+@dataclass
+class SyntheticFrame:
+    """一张合成的整屏画面及其真值"""
+    image: np.ndarray
+    shop: List[Optional[str]]            # 每个卡牌区域的模板文件名，None表示空位
+    level: int
+    stage: int                           # 如41表示4-1
+    buy_xp: Optional[Region] = None      # Buy XP按钮的屏幕位置，None表示未显示
+
+
+class SyntheticFrameFactory:
+    """按指定分辨率生成合成帧"""
+
+    def __init__(self, width: int, height: int, config_path: str = DEFAULT_CONFIG_PATH,
+                 templates_dir: str = DEFAULT_TEMPLATES_DIR, buy_xp_path: str = DEFAULT_BUY_XP_PATH,
+                 degradation: Optional[Degradation] = None, empty_rate: float = 0.0,
+                 buy_xp_rate: float = 1.0, slot_jitter: float = 0.02, font_path: Optional[str] = None,
+                 seed: int = 0):
+        """初始化生成器
+
+        Args:
+            width, height: 画面分辨率
+            config_path: 读取区域相对坐标和基准分辨率的配置文件
+            templates_dir: 商店卡牌模板目录
+            buy_xp_path: Buy XP按钮模板（基准分辨率下截取）
+            degradation: 画面劣化参数
+            empty_rate: 每个卡牌区域为空位（已购买）的概率
+            buy_xp_rate: 画面中显示Buy XP按钮的概率
+            slot_jitter: 卡牌贴入区域时的最大随机缩放比例和偏移（占区域宽高的比例），0为原样贴入
+            font_path: 绘制Level/阶段数字的TrueType字体，默认依次尝试DEFAULT_FONTS
+            seed: 随机种子
+        """
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        settings = config["matching_settings"]
+        base = settings.get("base_resolution", {"width": 2560, "height": 1440})
+
+        self.width, self.height = width, height
+        self.geometry = DisplayGeometry([{"left": 0, "top": 0, "width": width, "height": height}] * 2, 1)
+        self.resolution_scale = self.geometry.scale(base["width"], base["height"])
+
+        self.fixed_regions = [self._resolve(region) for region in settings["fixed_regions"]]
+        self.level_region = self._resolve(settings["ocr_regions"]["level_detection"])
+        self.stage_region = self._resolve(settings["ocr_regions"]["stage_detection"])
+        self.buy_xp_region = self._resolve(config["auto_identification"]["buy_xp_region"])
+        self.buy_xp_threshold = config["auto_identification"].get("buy_xp_threshold", 0.7)
+
+        self.template_names = sorted(
+            name for name in os.listdir(templates_dir) if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))
+        )
+        if not self.template_names:
+            raise ValueError(f"模板目录为空: {templates_dir}")
+        self.templates_dir = templates_dir
+        self._slot_cache: Dict[str, np.ndarray] = {}
+
+        self.buy_xp = None
+        if buy_xp_path and os.path.exists(buy_xp_path):
+            button = load_template_bgr(buy_xp_path)
+            sx, sy = self.resolution_scale
+            h, w = button.shape[:2]
+            self.buy_xp = cv2.resize(button, (max(1, round(w * sx)), max(1, round(h * sy))),
+                                     interpolation=cv2.INTER_AREA)
+
+        self.degradation = degradation or Degradation()
+        self.empty_rate = empty_rate
+        self.buy_xp_rate = buy_xp_rate
+        self.slot_jitter = slot_jitter
+        self.font_path = font_path
+        self._fonts: Dict[int, ImageFont.FreeTypeFont] = {}
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+
+    def _resolve(self, region: dict) -> Region:
+        if "relative_coordinates" in region:
+            return self.geometry.resolve(region["relative_coordinates"])
+        return tuple(region["coordinates"])
+
+    def _slot_image(self, name: str) -> np.ndarray:
+        """模板缩放到卡牌区域大小（缓存）"""
+        image = self._slot_cache.get(name)
+        if image is None:
+            _, _, w, h = self.fixed_regions[0]
+            image = cv2.resize(load_template_bgr(os.path.join(self.templates_dir, name)), (w, h),
+                               interpolation=cv2.INTER_AREA)
+            self._slot_cache[name] = image
+        return image
+
+    def _paste_slot(self, image: np.ndarray, region: Region, name: str):
+        """把卡牌贴入区域；slot_jitter大于0时随机缩放并偏移，露出的边缘保留背景"""
+        x, y, w, h = region
+        slot = self._slot_image(name)
+        if self.slot_jitter <= 0:
+            image[y:y + h, x:x + w] = slot
+            return
+
+        scale = 1.0 + self.random.uniform(-self.slot_jitter, self.slot_jitter)
+        sw, sh = max(1, round(w * scale)), max(1, round(h * scale))
+        scaled = cv2.resize(slot, (sw, sh), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        dx = (w - sw) // 2 + round(self.random.uniform(-self.slot_jitter, self.slot_jitter) * w)
+        dy = (h - sh) // 2 + round(self.random.uniform(-self.slot_jitter, self.slot_jitter) * h)
+        # 贴图在区域内可见的部分
+        x0, y0 = max(0, dx), max(0, dy)
+        x1, y1 = min(w, dx + sw), min(h, dy + sh)
+        if x0 < x1 and y0 < y1:
+            image[y + y0:y + y1, x + x0:x + x1] = scaled[y0 - dy:y1 - dy, x0 - dx:x1 - dx]
+
+    def _font(self, size: int) -> ImageFont.FreeTypeFont:
+        """按像素大小取数字字体（缓存）"""
+        font = self._fonts.get(size)
+        if font is None:
+            for path in ([self.font_path] if self.font_path else DEFAULT_FONTS):
+                try:
+                    font = ImageFont.truetype(path, size)
+                    break
+                except OSError:
+                    if self.font_path:
+                        raise
+            else:
+                font = ImageFont.load_default(size)
+            self._fonts[size] = font
+        return font
+
+    def _background(self) -> np.ndarray:
+        """深色渐变背景加少量纹理，避免大面积纯色"""
+        top = np.array(self.random.choices(range(20, 60), k=3), dtype=np.float32)
+        bottom = np.array(self.random.choices(range(10, 40), k=3), dtype=np.float32)
+        ramp = np.linspace(0.0, 1.0, self.height, dtype=np.float32)[:, None]
+        column = top * (1.0 - ramp) + bottom * ramp
+        image = np.repeat(column[:, None, :], self.width, axis=1)
+        texture = self.rng.integers(0, 8, (self.height // 8 + 1, self.width // 8 + 1), dtype=np.uint8)
+        texture = cv2.resize(texture, (self.width, self.height), interpolation=cv2.INTER_LINEAR)
+        return np.clip(image + texture[:, :, None], 0, 255).astype(np.uint8)
+
+    def _draw_text(self, image: np.ndarray, region: Region, text: str):
+        """在区域内居中绘制白色文字（TrueType字体），字号按区域大小自适应"""
+        x, y, w, h = region
+        canvas = Image.new('RGB', (w, h), (20, 22, 25))
+        draw = ImageDraw.Draw(canvas)
+        size = max(4, round(0.7 * h))
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=self._font(size))
+        if right - left > 0.85 * w:
+            size = max(4, int(size * 0.85 * w / (right - left)))
+            left, top, right, bottom = draw.textbbox((0, 0), text, font=self._font(size))
+        origin = ((w - (right - left)) / 2 - left, (h - (bottom - top)) / 2 - top)
+        draw.text(origin, text, font=self._font(size), fill=(235, 235, 235))
+        image[y:y + h, x:x + w] = np.asarray(canvas)[:, :, ::-1]
+
+    def generate(self) -> SyntheticFrame:
+        """生成一张合成帧"""
+        image = self._background()
+
+        shop = []
+        for x, y, w, h in self.fixed_regions:
+            if self.random.random() < self.empty_rate:
+                shop.append(None)
+                continue
+            name = self.random.choice(self.template_names)
+            self._paste_slot(image, (x, y, w, h), name)
+            shop.append(name)
+
+        level = self.random.randint(2, 9)
+        self._draw_text(image, self.level_region, str(level))
+
+        major, minor = self.random.randint(1, 7), self.random.randint(1, 7)
+        self._draw_text(image, self.stage_region, f"{major}-{minor}")
+
+        buy_xp = None
+        if self.buy_xp is not None and self.random.random() < self.buy_xp_rate:
+            bh, bw = self.buy_xp.shape[:2]
+            rx, ry, rw, rh = self.buy_xp_region
+            if bw <= rw and bh <= rh:
+                x = rx + self.random.randint(0, rw - bw)
+                y = ry + self.random.randint(0, rh - bh)
+                image[y:y + bh, x:x + bw] = self.buy_xp
+                buy_xp = (x, y, bw, bh)
+
+        image = self.degradation.apply(image, self.rng)
+        return SyntheticFrame(image=image, shop=shop, level=level, stage=major * 10 + minor, buy_xp=buy_xp)
@@ -4,53 +4,118 @@ TFT卡牌统计GUI启动器
 避免相对导入问题
 """
 
+import time
+# 启动计时起点，--startup-profile用
+STARTUP_T0 = time.perf_counter()
+
 import sys
 import os
+import argparse
+import importlib
 import tkinter as tk
 from tkinter import NONE, ttk, messagebox, filedialog
 import threading
-import time
+import queue
 import json
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-import sqlite3
 
-# 添加src目录到Python路径
+STDLIB_IMPORTED = time.perf_counter()
+
+# 识别模块作为src包导入（src内部使用包内相对导入），从其他目录启动时也能找到src
 current_dir = os.path.dirname(os.path.abspath(__file__))
-src_dir = os.path.join(current_dir, 'src')
-sys.path.insert(0, src_dir)
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
 
+# 启动时只导入轻量模块；cv2/numpy/mss、matplotlib和OCR在窗口显示后由后台线程预热
 try:
-    from capture import grab_fullscreen, grab_region
-    from matching import load_templates_from_dir, match_template
-    from database import TFTStatsDatabase
-    from ocr_module import NumberOCR
+    from src.database import TFTStatsDatabase
+    from src.aggregates import MatchAggregates
+    from src.charts import COST_COLORS, CostPieChart, UnitBarChart
+    from src.perf import PERF_STAGES, LatencyTracker, format_summary_line, stage_label
 except ImportError as e:
     print(f"导入错误: {e}")
     print("请确保已安装所有依赖包")
     print("运行: pip install -r requirements.txt")
     sys.exit(1)
 
-try:
-    import matplotlib.pyplot as plt
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-    from matplotlib.figure import Figure
-    import numpy as np
-except ImportError as e:
-    print(f"matplotlib导入错误: {e}")
-    print("请安装matplotlib: pip install matplotlib")
-    sys.exit(1)
+LOCAL_IMPORTED = time.perf_counter()
+
+
+# 日志框最多保留的行数
+MAX_LOG_LINES = 100
+# UI队列的排空间隔（毫秒）和每次最多执行的回调数
+UI_DRAIN_INTERVAL_MS = 50
+UI_DRAIN_BATCH = 200
+# 图表和触发次数的定时刷新间隔（毫秒）
+UI_REFRESH_INTERVAL_MS = 2000
+# 开始监控时等待预热完成的检查间隔（毫秒）
+WARMUP_POLL_INTERVAL_MS = 100
+# 后台预热导入的识别模块（依赖cv2、numpy、mss）
+RECOGNITION_MODULES = ("src.capture", "src.matching", "src.scheduler", "src.ocr_module")
+
+
+class StartupProfile:
+    """记录启动各阶段的耗时，启用时在预热完成后打印"""
+    
+    def __init__(self, t0, enabled=False):
+        self.t0 = t0
+        self.enabled = enabled
+        self.phases = []
+        self._lock = threading.Lock()
+    
+    def add(self, name, start, end=None):
+        """记录一个阶段；end为None时表示时间点"""
+        thread = threading.current_thread().name
+        with self._lock:
+            self.phases.append((name, start, end, thread))
+    
+    def mark(self, name):
+        """记录一个时间点（如窗口显示）"""
+        self.add(name, time.perf_counter())
+    
+    @contextmanager
+    def phase(self, name):
+        """记录with块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter())
+    
+    def report(self):
+        """打印各阶段的开始时间、耗时和所在线程"""
+        if not self.enabled:
+            return
+        print("⏱️ 启动耗时分析 (毫秒，从进程启动计)")
+        print(f"  {'开始':>6} {'耗时':>6}  {'线程':<10} 阶段")
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        for name, start, end, thread in phases:
+            duration = f"{(end - start) * 1000:8.1f}" if end is not None else f"{'-':>8}"
+            print(f"  {(start - self.t0) * 1000:8.1f} {duration}  {thread:<12} {name}")
 
 
 class TFTStatsGUI:
     """TFT卡牌统计GUI主类"""
     
-    def __init__(self, root):
+    def __init__(self, root, profile=None, profiling=None):
         self.root = root
+        self.profile = profile or StartupProfile(STARTUP_T0)
+        # 流水线性能剖析设置 {triggers, seconds, sampling}，None表示不剖析
+        self.profiling_settings = profiling
+        
+        # Tk控件只能在主线程操作，工作线程通过队列把更新交给主循环执行
+        self.ui_thread_id = threading.get_ident()
+        self.ui_queue = queue.SimpleQueue()
+        self.log_queue = queue.SimpleQueue()
+        self.log_line_count = 0
         self.root.title("TFT卡牌统计系统")
         self.root.geometry("1400x900")
         self.root.configure(bg='#2c3e50')
         # 加载配置文件
-        self.config = self.load_config()
+        with self.profile.phase("加载配置"):
+            self.config = self.load_config()
         
         # 初始化变量
         self.is_running = False
@@ -59,8 +124,11 @@ class TFTStatsGUI:
         self.current_session_id = None
         self.monitor_index = self.config["matching_settings"]["monitor_index"]
         self.threshold = self.config["matching_settings"]["threshold"]
+        self.match_mode = self.config["matching_settings"].get("match_mode", "all")
+        self.early_exit_margin = self.config["matching_settings"].get("early_exit_margin")
         self.templates_dir = "tft_units"
         self.enable_ocr = self.config["matching_settings"]["enable_ocr"]
+        self.ocr_backend = self.config["matching_settings"].get("ocr_backend", "tesseract")
         self.enable_auto_reset_db = True
         self.selected_level = None
         
@@ -71,27 +139,127 @@ class TFTStatsGUI:
         self.stage_ocr_running = False
         self.current_stage_num = 0
         self.stage_change_detected = False
-        self.stage_monitor_thread = None
-        self.buy_xp_search_thread = None
         self.buy_xp_found = False
+        self.buy_xp_search_count = 0
+        self.buy_xp_detector = None
+        
+        # 统一识别调度器：每个tick截一次屏，阶段OCR、Buy XP搜索和卡牌匹配共用同一帧
+        self.scheduler = None
+        # 帧日志录制器，启用时记录每次匹配的卡牌和Level区域，供回放复现
+        self.frame_recorder = None
+        # 自适应轮询节奏，未启用时按配置的固定间隔轮询
+        self.cadence = None
+        # 性能剖析器：按秒剖析时挂在调度器上，按触发次数剖析时只包住卡牌匹配
+        self.pipeline_profiler = None
+        self.match_profiler = None
         
         # 初始化组件
-        self.database = TFTStatsDatabase()
+        with self.profile.phase("打开数据库"):
+            self.database = TFTStatsDatabase()
+        
+        # 图表数据的内存汇总，匹配时增量更新，图表只读这里
+        self.aggregates = MatchAggregates()
+        self.drawn_chart_key = None
+        
+        # 识别流水线各阶段的耗时统计，性能面板和会话性能表读取这里
+        self.latency = LatencyTracker()
+        self.drawn_perf_version = None
+        # 当前图例按钮对应的费用集合
+        self.legend_costs = None
+        
+        # 模板库、OCR和图表在窗口显示后由后台预热创建，识别线程使用前先等待预热完成
+        self.template_banks = None
+        self.template_bank = None
         self.ocr = None
-        if self.enable_ocr:
-            try:
-                self.ocr = NumberOCR()
-            except Exception as e:
-                print(f"OCR初始化失败: {e}")
-                self.enable_ocr = False
+        self.pie_chart = None
+        self.bar_chart = None
+        self.warmup_done = threading.Event()
         
         # 创建界面
-        self.create_widgets()
-        self.setup_styles()
+        with self.profile.phase("创建界面"):
+            self.create_widgets()
+            self.setup_styles()
+        
+        # 在主循环中排空UI队列并定时刷新
+        self.root.after(UI_DRAIN_INTERVAL_MS, self.drain_ui_queue)
+        self.root.after(UI_REFRESH_INTERVAL_MS, self.update_loop)
+        # 窗口绘制完成后再开始预热
+        self.root.after_idle(self.start_warmup)
+    
+    def start_warmup(self):
+        """窗口已显示，启动后台预热线程"""
+        self.profile.mark("窗口显示")
+        threading.Thread(target=self.warmup, name="warmup", daemon=True).start()
+    
+    def warmup(self):
+        """后台预热：导入matplotlib和识别模块，加载模板库和OCR
+        
+        图表控件只能在主线程创建，导入完成后交给UI队列。
+        """
+        try:
+            with self.profile.phase("导入matplotlib"):
+                importlib.import_module("matplotlib.figure")
+                importlib.import_module("matplotlib.backends.backend_tkagg")
+            self.call_on_ui(self.create_charts)
+        except ImportError as e:
+            self.log_message(f"⚠️ matplotlib导入错误，图表不可用: {e}")
+            self.log_message("请安装matplotlib: pip install matplotlib")
         
-        # 启动更新线程
-        self.update_thread = threading.Thread(target=self.update_loop, daemon=True)
-        self.update_thread.start()
+        try:
+            with self.profile.phase("导入识别模块"):
+                for module_name in RECOGNITION_MODULES:
+                    importlib.import_module(module_name)
+        except ImportError as e:
+            self.log_message(f"❌ 导入错误: {e}")
+            self.log_message("请确保已安装所有依赖包，运行: pip install -r requirements.txt")
+            self.warmup_done.set()
+            return
+        
+        # 自动适配屏幕分辨率，模板按适配后的卡牌区域大小加载
+        with self.profile.phase("适配分辨率"):
+            self.config = self.adapt_resolution(self.config)
+        
+        with self.profile.phase("加载模板"):
+            self.load_template_bank()
+        
+        if self.enable_ocr:
+            with self.profile.phase("初始化OCR"):
+                self.init_ocr()
+        
+        self.warmup_done.set()
+        self.call_on_ui(self.on_warmup_done)
+    
+    def load_template_bank(self):
+        """按当前分辨率下的卡牌区域大小一次性加载并重采样所有模板，触发时只热更新有变化的文件"""
+        from src.matching import TemplateBankSet
+        try:
+            self.template_banks = TemplateBankSet(self.templates_dir)
+            self.template_bank = self.template_banks.for_regions(self.get_fixed_regions())
+            w, h = self.template_bank.template_size
+            print(f"✅ 已预加载 {len(self.template_bank)} 个模板 ({w}x{h})")
+        except Exception as e:
+            print(f"⚠️ 模板预加载失败: {e}")
+    
+    def init_ocr(self):
+        """创建OCR识别器，失败时关闭OCR"""
+        from src.ocr_module import NumberOCR
+        try:
+            self.ocr = NumberOCR(backend=self.ocr_backend)
+        except Exception as e:
+            print(f"OCR初始化失败: {e}")
+            self.enable_ocr = False
+    
+    def on_warmup_done(self):
+        """预热完成（主线程）"""
+        self.profile.mark("预热完成")
+        self.log_message("✅ 识别模块已就绪")
+        self.profile.report()
+    
+    def wait_for_warmup(self):
+        """等待后台预热完成（阻塞，只在后台线程中调用；主线程用start_scheduler中的轮询）"""
+        if not self.warmup_done.is_set():
+            self.log_message("⏳ 等待识别模块加载...")
+            self.warmup_done.wait()
     
     def load_config(self):
         """加载配置文件"""
@@ -102,9 +270,7 @@ class TFTStatsGUI:
                     config = json.load(f)
                 print("✅ 配置文件加载成功")
                 
-                # 自动适配屏幕分辨率
-                config = self.adapt_resolution(config)
-                
+                # 屏幕分辨率适配需要截图后端，在后台预热时进行
                 return config
             else:
                 print("⚠️ 配置文件不存在，使用默认配置")
@@ -115,54 +281,53 @@ class TFTStatsGUI:
             return self.get_default_config()
     
     def adapt_resolution(self, config):
-        """自动适配屏幕分辨率"""
+        """自动适配屏幕分辨率
+        
+        屏幕尺寸取自截图后端（mss）中要截取的显示器，区域坐标由显示几何服务
+        统一缩放、裁剪到显示器内并预先计算切片。
+        """
         try:
-            # 获取当前屏幕分辨率
-            import tkinter as tk
-            root = tk.Tk()
-            current_width = root.winfo_screenwidth()
-            current_height = root.winfo_screenheight()
-            root.destroy()
+            from src.capture import get_display_geometry
+            
+            # 获取当前屏幕分辨率（与截图使用同一个显示器矩形）
+            monitor_index = config.get("matching_settings", {}).get("monitor_index", 1)
+            geometry = get_display_geometry(monitor_index)
+            current_width, current_height = geometry.size
             
             # 获取基准分辨率
             base_width = config.get("matching_settings", {}).get("base_resolution", {}).get("width", 2560)
             base_height = config.get("matching_settings", {}).get("base_resolution", {}).get("height", 1440)
             
             # 计算缩放比例
-            scale_x = current_width / base_width
-            scale_y = current_height / base_height
+            scale_x, scale_y = geometry.scale(base_width, base_height)
+            # 基准分辨率下截取的模板（如Buy_XP.png）按同样比例缩放
+            self.resolution_scale = (scale_x, scale_y)
             
             print(f"🖥️ 当前屏幕分辨率: {current_width}x{current_height}")
             print(f"📏 基准分辨率: {base_width}x{base_height}")
             print(f"📐 缩放比例: X={scale_x:.3f}, Y={scale_y:.3f}")
             
+            # 有相对坐标的区域按当前分辨率换算，其余区域沿用配置的像素坐标
+            def register(name, region):
+                if "relative_coordinates" in region:
+                    coords = geometry.add_relative_region(name, region["relative_coordinates"])
+                else:
+                    coords = geometry.add_region(name, region["coordinates"])
+                region["coordinates"] = list(coords)
+                return region["coordinates"]
+            
             # 更新fixed_regions坐标
-            if "fixed_regions" in config["matching_settings"]:
-                for region in config["matching_settings"]["fixed_regions"]:
-                    if "relative_coordinates" in region:
-                        rel_x, rel_y, rel_w, rel_h = region["relative_coordinates"]
-                        # 使用相对坐标计算新坐标
-                        new_x = int(rel_x * current_width)
-                        new_y = int(rel_y * current_height)
-                        new_w = int(rel_w * current_width)
-                        new_h = int(rel_h * current_height)
-                        
-                        region["coordinates"] = [new_x, new_y, new_w, new_h]
-                        print(f"📍 {region['name']}: {region['coordinates']}")
+            for region in config["matching_settings"].get("fixed_regions", []):
+                print(f"📍 {region['name']}: {register(region['name'], region)}")
             
             # 更新ocr_regions坐标
-            if "ocr_regions" in config["matching_settings"]:
-                for region_name, region in config["matching_settings"]["ocr_regions"].items():
-                    if "relative_coordinates" in region:
-                        rel_x, rel_y, rel_w, rel_h = region["relative_coordinates"]
-                        # 使用相对坐标计算新坐标
-                        new_x = int(rel_x * current_width)
-                        new_y = int(rel_y * current_height)
-                        new_w = int(rel_w * current_width)
-                        new_h = int(rel_h * current_height)
-                        
-                        region["coordinates"] = [new_x, new_y, new_w, new_h]
-                        print(f"🔍 {region['name']}: {region['coordinates']}")
+            for region_name, region in config["matching_settings"].get("ocr_regions", {}).items():
+                print(f"🔍 {region['name']}: {register(region_name, region)}")
+            
+            # 更新Buy XP搜索区域坐标
+            buy_xp_region = config.get("auto_identification", {}).get("buy_xp_region")
+            if buy_xp_region and "coordinates" in buy_xp_region:
+                print(f"🔍 Buy XP搜索区域: {register('buy_xp_region', buy_xp_region)}")
             
             print("✅ 屏幕分辨率适配完成")
             return config
@@ -177,6 +342,8 @@ class TFTStatsGUI:
         return {
             "matching_settings": {
                 "threshold": 0.68,
+                "match_mode": "all",
+                "early_exit_margin": None,
                 "monitor_index": 1,
                 "enable_ocr": True,
                 "base_resolution": {
@@ -197,13 +364,17 @@ class TFTStatsGUI:
             },
             "auto_identification": {
                 "stage_monitor_interval": 0.5,
-                "buy_xp_search_interval": 2.0,
-                "max_buy_xp_search_attempts": 30,
-                "buy_xp_threshold": 0.7
+                "buy_xp_search_interval": 0.5,
+                "max_buy_xp_search_attempts": 120,
+                "buy_xp_threshold": 0.7,
+                "buy_xp_region": {
+                    "coordinates": [280, 1220, 420, 200]
+                }
             },
             "database": {
                 "auto_save_on_stop": True,
-                "log_directory": "log"
+                "log_directory": "log",
+                "frame_log": {"enabled": False, "path": "log/frames.tftlog", "capacity": 1000}
             },
             "keyboard_shortcuts": {
                 "trigger_key": "d",
@@ -294,6 +465,12 @@ class TFTStatsGUI:
                                           fg='#e74c3c', bg='#34495e')
         self.current_stage_label.pack(side='left', padx=5)
         
+        # 当前阶段轮询间隔
+        tk.Label(row2, text="轮询间隔:", font=('Arial', 10), fg='white', bg='#34495e').pack(side='left', padx=20)
+        self.poll_interval_label = tk.Label(row2, text="-", font=('Arial', 12, 'bold'), 
+                                          fg='#f1c40f', bg='#34495e')
+        self.poll_interval_label.pack(side='left', padx=5)
+        
         # 每次运行前清空数据库开关
         self.auto_reset_db_var = tk.BooleanVar(value=self.enable_auto_reset_db)
         auto_reset_db_check = tk.Checkbutton(row2, text="运行前清空旧数据", variable=self.auto_reset_db_var,
@@ -305,12 +482,12 @@ class TFTStatsGUI:
         try:
             latest_sequence = self.database.get_latest_capture_sequence()
             self.trigger_count = latest_sequence
-            self.trigger_count_label.config(text=str(latest_sequence))
+            self.call_on_ui(self.trigger_count_label.config, text=str(latest_sequence))
             print(f"✅ 从数据库更新触发次数: {latest_sequence}")
         except Exception as e:
             print(f"⚠️ 更新触发次数失败: {e}")
             self.trigger_count = 0
-            self.trigger_count_label.config(text="0")
+            self.call_on_ui(self.trigger_count_label.config, text="0")
     
     def create_data_table(self):
         """创建数据表格"""
@@ -414,6 +591,35 @@ class TFTStatsGUI:
         tk.Label(left_frame, text="棋子费用分布", font=('Arial', 12), 
                 fg='white', bg='#34495e').pack(pady=5)
         
+        # 右侧直方图
+        right_frame = tk.Frame(charts_frame, bg='#34495e', relief='raised', bd=2)
+        right_frame.pack(side='right', fill='both', expand=True, padx=(5, 0))
+        
+        tk.Label(right_frame, text="棋子出现次数统计", font=('Arial', 12), 
+                fg='white', bg='#34495e').pack(pady=5)
+        
+        # matplotlib导入完成前先显示与图表同样大小的占位
+        self.chart_frames = (left_frame, right_frame)
+        self.chart_placeholders = []
+        for frame, width in ((left_frame, 300), (right_frame, 700)):
+            placeholder = tk.Frame(frame, width=width, height=300, bg='#34495e')
+            placeholder.pack_propagate(False)
+            placeholder.pack(fill='both', expand=True, padx=5, pady=5)
+            tk.Label(placeholder, text="图表加载中...", font=('Arial', 10),
+                     fg='#bdc3c7', bg='#34495e').pack(expand=True)
+            self.chart_placeholders.append(placeholder)
+    
+    def create_charts(self):
+        """创建matplotlib图表（主线程，matplotlib已在后台导入）"""
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        
+        start = time.perf_counter()
+        for placeholder in self.chart_placeholders:
+            placeholder.destroy()
+        self.chart_placeholders = []
+        left_frame, right_frame = self.chart_frames
+        
         # 创建饼图
         self.fig_pie = Figure(figsize=(3, 3), facecolor='#34495e')
         self.ax_pie = self.fig_pie.add_subplot(111)
@@ -422,13 +628,6 @@ class TFTStatsGUI:
         self.canvas_pie = FigureCanvasTkAgg(self.fig_pie, left_frame)
         self.canvas_pie.get_tk_widget().pack(fill='both', expand=True, padx=5, pady=5)
         
-        # 右侧直方图
-        right_frame = tk.Frame(charts_frame, bg='#34495e', relief='raised', bd=2)
-        right_frame.pack(side='right', fill='both', expand=True, padx=(5, 0))
-        
-        tk.Label(right_frame, text="棋子出现次数统计", font=('Arial', 12), 
-                fg='white', bg='#34495e').pack(pady=5)
-        
         # 创建直方图
         self.fig_line = Figure(figsize=(7, 3), facecolor='#34495e')
         self.ax_line = self.fig_line.add_subplot(111)
@@ -440,8 +639,14 @@ class TFTStatsGUI:
         self.canvas_line = FigureCanvasTkAgg(self.fig_line, right_frame)
         self.canvas_line.get_tk_widget().pack(fill='both', expand=True, padx=5, pady=5)
         
-        # 初始化图表
+        # 持久化的图表渲染器，数据变化时原地更新artist
+        self.pie_chart = CostPieChart(self.ax_pie, self.canvas_pie)
+        self.bar_chart = UnitBarChart(self.ax_line, self.canvas_line)
+        
+        # 初始化图表，已有数据时立即绘制
         self.init_charts()
+        self.update_charts(force=True)
+        self.profile.add("创建图表", start, time.perf_counter())
     
     def create_log_area(self):
         """创建日志显示区域"""
@@ -460,6 +665,9 @@ class TFTStatsGUI:
                                  bg='#e74c3c', fg='white', font=('Arial', 10))
         clear_log_btn.pack(side='right', padx=5, pady=2)
         
+        # 右侧性能面板
+        self.create_perf_panel(log_frame)
+        
         # 日志文本框
         self.log_text = tk.Text(log_frame, height=8, bg='#2c3e50', fg='#ecf0f1',
                                font=('Consolas', 9), wrap='word')
@@ -479,63 +687,93 @@ class TFTStatsGUI:
         self.log_message("4. 支持实时统计图表显示")
         self.log_message("="*30)
     
+    def create_perf_panel(self, parent):
+        """创建性能面板：各阶段最近耗时的p50/p95/p99"""
+        perf_frame = tk.Frame(parent, bg='#34495e')
+        perf_frame.pack(side='right', fill='y', padx=(5, 0))
+        
+        tk.Label(perf_frame, text="性能 (最近, ms)", font=('Arial', 10, 'bold'),
+                 fg='white', bg='#34495e').grid(row=0, column=0, columnspan=5, pady=2)
+        for column, text in enumerate(("阶段", "p50", "p95", "p99", "次数")):
+            tk.Label(perf_frame, text=text, font=('Consolas', 9, 'bold'),
+                     fg='#bdc3c7', bg='#34495e').grid(row=1, column=column, padx=4, sticky='e' if column else 'w')
+        
+        # 每个阶段一行，数值列由refresh_perf_panel更新
+        self.perf_labels = {}
+        for row, stage in enumerate(PERF_STAGES, start=2):
+            tk.Label(perf_frame, text=stage_label(stage), font=('Consolas', 9),
+                     fg='#ecf0f1', bg='#34495e').grid(row=row, column=0, padx=4, sticky='w')
+            labels = []
+            for column in range(1, 5):
+                label = tk.Label(perf_frame, text="-", font=('Consolas', 9), fg='#f1c40f', bg='#34495e')
+                label.grid(row=row, column=column, padx=4, sticky='e')
+                labels.append(label)
+            self.perf_labels[stage] = labels
+    
+    def refresh_perf_panel(self):
+        """耗时统计有变化时刷新性能面板（主线程）"""
+        version = self.latency.version
+        if version == self.drawn_perf_version:
+            return
+        self.drawn_perf_version = version
+        recent = self.latency.recent()
+        for stage, labels in self.perf_labels.items():
+            summary = recent.get(stage)
+            if summary:
+                values = (f"{summary['p50']:.1f}", f"{summary['p95']:.1f}", f"{summary['p99']:.1f}",
+                          str(summary['count']))
+            else:
+                values = ("-",) * 4
+            for label, value in zip(labels, values):
+                label.config(text=value)
+    
+    def save_session_perf(self):
+        """把本次会话各阶段的耗时统计写入会话性能表并输出到日志"""
+        summary = self.latency.summary()
+        if not summary:
+            return
+        self.database.record_session_perf(self.current_session_id, summary)
+        self.log_message("⏱️ 各阶段耗时 (整个会话):")
+        for stage, stats in summary.items():
+            self.log_message(f"  {format_summary_line(stage, stats)}")
+    
     def init_charts(self):
         """初始化图表"""
         # 初始化饼图
-        self.ax_pie.clear()
-        self.ax_pie.set_facecolor('#34495e')
-
         if self.selected_level is not None:
             title = f'Level {self.selected_level} Units Cost Distribution'
         else:
             title = 'All Units Cost Distribution'
         
-        self.ax_pie.text(0.5, 0.5, 'No Data', ha='center', va='center', 
-                        transform=self.ax_pie.transAxes, color='white', fontsize=12)
-        self.ax_pie.set_title(title, color='white', fontsize=12)
-        self.canvas_pie.draw()
+        self.pie_chart.show_message('No Data', title)
         
         # 初始化折线图
-        self.ax_line.clear()
-        self.ax_line.set_facecolor('#34495e')
-
         if self.selected_level is not None:
             title = f'Level {self.selected_level} Units Appearence Statistics'
         else:
             title = 'All Units Appearence Statistics'
 
-        self.ax_line.text(0.5, 0.5, 'No Data', ha='center', va='center', 
-                         transform=self.ax_line.transAxes, color='white', fontsize=12)
-        self.ax_line.set_title(title, color='white', fontsize=12)
-        self.ax_line.set_xlabel('Units Name', color='white')
-        self.ax_line.set_ylabel('Count', color='white')
-        self.canvas_line.draw()
+        self.bar_chart.show_message('No Data', title)
     
     def reset_charts(self):
         """重置图表到初始状态"""
         try:
-            # 重置饼图
-            self.ax_pie.clear()
-            self.ax_pie.set_facecolor('#34495e')
-            self.ax_pie.text(0.5, 0.5, 'No Data', ha='center', va='center', 
-                            transform=self.ax_pie.transAxes, color='white', fontsize=12)
-            self.ax_pie.set_title('棋子费用分布', color='white', fontsize=12)
-            self.canvas_pie.draw()
-            
-            # 重置直方图
-            self.ax_line.clear()
-            self.ax_line.set_facecolor('#34495e')
-            self.ax_line.text(0.5, 0.5, 'No Data', ha='center', va='center', 
-                            transform=self.ax_line.transAxes, color='white', fontsize=12)
-            self.ax_line.set_title('棋子出现次数统计', color='white', fontsize=12)
-            self.ax_line.set_xlabel('Units Name', color='white')
-            self.ax_line.set_ylabel('Count', color='white')
-            self.canvas_line.draw()
+            # 图表尚未创建时，创建后会按当前数据绘制
+            if self.pie_chart is not None:
+                # 重置饼图
+                self.pie_chart.show_message('No Data', '棋子费用分布')
+                
+                # 重置直方图
+                self.bar_chart.show_message('No Data', '棋子出现次数统计')
             
             # 清除图例按钮（如果存在）
             if hasattr(self, 'legend_frame'):
                 self.legend_frame.destroy()
                 delattr(self, 'legend_frame')
+            self.legend_costs = None
+            
+            # 下次更新时按当前数据重新绘制
+            self.drawn_chart_key = None
             
             self.log_message("📊 图表已重置")
         
@@ -582,6 +820,9 @@ class TFTStatsGUI:
         if self.auto_reset_db_var.get():
             self.database.clear_all_data()
         
+        # 用数据库中已有的统计初始化内存汇总
+        self.aggregates.load(self.database.get_template_counts())
+        
         # 开始新的会话
         self.current_session_id = self.database.start_session(
             self.templates_dir, self.threshold, self.monitor_index
@@ -596,20 +837,22 @@ class TFTStatsGUI:
         # 重置图表显示
         self.reset_charts()
         
+        # 每个会话单独统计耗时
+        self.latency.reset()
+        
         self.log_message("开始监控...")
         self.log_message(f"会话ID: {self.current_session_id}")
         
-        # 启动监控线程
-        self.monitor_thread = threading.Thread(target=self.monitoring_loop, daemon=True)
-        self.monitor_thread.start()
+        # 启动识别调度器
+        self.start_scheduler()
     
     def stop_monitoring(self):
         """停止监控"""
         self.is_running = False
         self.start_stop_btn.config(text="开始监控", bg='#27ae60')
         
-        # 停止键盘监听器
-        self.stop_keyboard_listener()
+        # 停止识别调度器和键盘监听器
+        self.stop_scheduler()
 
         # 结束会话
         if self.current_session_id:
@@ -619,6 +862,11 @@ class TFTStatsGUI:
             self.log_message("="*30)
             self.print_session_summary()
             
+            try:
+                self.save_session_perf()
+            except Exception as e:
+                self.log_message(f"⚠️ 保存性能统计失败: {e}")
+            
             # 自动保存记录到log文件夹
             try:
                 self.auto_save_records_on_stop()
@@ -633,8 +881,8 @@ class TFTStatsGUI:
             if not self.current_session_id:
                 return
             
-            conn = sqlite3.connect(self.database.db_path)
-            cursor = conn.cursor()
+            # 复用数据库的只读连接，不阻塞触发时的写入
+            cursor = self.database.get_read_connection().cursor()
             
             # 获取总匹配数
             cursor.execute('''
@@ -654,8 +902,6 @@ class TFTStatsGUI:
             ''', (self.current_session_id,))
             cost_distribution = cursor.fetchall()
             
-            conn.close()
-            
             self.log_message(f"总匹配数: {total_matches}")
             if cost_distribution:
                 self.log_message("费用分布:")
@@ -665,50 +911,162 @@ class TFTStatsGUI:
         except Exception as e:
             self.log_message(f"获取统计信息错误: {e}")
     
-    def monitoring_loop(self):
-        """连续监控循环 - 集成原有的continuous模式功能"""
+    def start_scheduler(self):
+        """创建并启动识别调度器 - 集成原有的continuous模式功能"""
         self.log_message("连续监控模式已启动")
         self.log_message("快捷键说明:")
         trigger_key = self.config["keyboard_shortcuts"]["trigger_key"].upper()
         self.log_message(f"  {trigger_key}键     - 触发截图和模板匹配")
         self.log_message("程序将持续运行，等待快捷键输入...")
         
-        # 初始化OCR实例（如果启用）
-        ocr = None
-        if self.enable_ocr:
-            try:
-                ocr = NumberOCR()
-                self.log_message("✅ OCR识别器初始化成功")
-            except Exception as e:
-                self.log_message(f"⚠️ OCR识别器初始化失败: {e}")
-                self.log_message("将禁用OCR功能")
+        # 区域坐标在预热时按分辨率适配，需等待预热完成；不阻塞主线程，定时检查
+        if not self.warmup_done.is_set():
+            self.log_message("⏳ 等待识别模块加载...")
+        self.launch_scheduler_when_ready(self.current_session_id)
+    
+    def launch_scheduler_when_ready(self, session_id):
+        """预热完成后创建调度器；等待期间已停止或开始了新的会话时放弃"""
+        if not self.is_running or self.current_session_id != session_id or self.scheduler is not None:
+            return
+        if not self.warmup_done.is_set():
+            self.root.after(WARMUP_POLL_INTERVAL_MS, self.launch_scheduler_when_ready, session_id)
+            return
+        self.launch_scheduler()
+    
+    def launch_scheduler(self):
+        """创建调度器，注册阶段、Buy XP和卡牌匹配检测并启动（主线程，预热已完成）"""
+        from src.scheduler import AdaptiveCadence, RecognitionScheduler
+        
+        fixed_regions = self.get_fixed_regions()
+        level_region = tuple(self.config["matching_settings"]["ocr_regions"]["level_detection"]["coordinates"])
+        stage_region = tuple(self.config["matching_settings"]["ocr_regions"]["stage_detection"]["coordinates"])
+        auto_config = self.config["auto_identification"]
+        
+        # 阶段和Buy XP的轮询间隔：启用自适应时由节奏控制器决定，否则使用固定间隔
+        adaptive_config = auto_config.get("adaptive_polling", {})
+        stage_interval = auto_config["stage_monitor_interval"]
+        buy_xp_interval = auto_config["buy_xp_search_interval"]
+        if adaptive_config.get("enabled", False):
+            self.cadence = AdaptiveCadence.from_config(adaptive_config, base_interval=stage_interval,
+                                                       on_change=self.on_cadence_change)
+            stage_interval = self.cadence.stage_interval
+            buy_xp_interval = self.cadence.buy_xp_interval
+        else:
+            self.cadence = None
+        self.call_on_ui(self.poll_interval_label.config, text=f"{auto_config['stage_monitor_interval']:.2f}s")
+        
+        self.start_pipeline_profiler()
+        self.scheduler = RecognitionScheduler(
+            monitor_index=self.monitor_index,
+            on_error=lambda name, e: self.log_message(f"⚠️ {name}检测错误: {e}"),
+            latency=self.latency,
+            profiler=self.pipeline_profiler if self.match_profiler is None else None
+        )
+        # 注册顺序即同一帧上的执行顺序：阶段 -> Buy XP -> 卡牌匹配
+        self.scheduler.register(
+            "stage", self.detect_stage, [stage_region],
+            interval=stage_interval,
+            enabled=lambda: self.stage_ocr_running and self.enable_ocr and self.ocr is not None
+        )
+        # Buy XP找到后在同一帧上执行卡牌匹配，因此一并截取卡牌和Level区域
+        self.scheduler.register(
+            "buy_xp", self.search_buy_xp, [self.get_buy_xp_region(), level_region] + fixed_regions,
+            interval=buy_xp_interval,
+            enabled=lambda: self.stage_change_detected and not self.buy_xp_found
+        )
+        # 卡牌匹配只在快捷键或Buy XP触发时运行
+        self.scheduler.register("shop_match", self.run_shop_match, fixed_regions + [level_region], timed=True)
+        self.start_frame_recorder(fixed_regions, level_region)
+        self.scheduler.start()
         
         # 启动键盘监听器
         self.start_keyboard_listener()
-        
+    
+    def on_cadence_change(self, mode, interval):
+        """节奏控制器回调：显示当前轮询模式和间隔"""
+        mode_names = {
+            "unknown": "等待识别",
+            "waiting": "回合进行中",
+            "window": "即将转阶段",
+            "stable": "长时间无变化",
+        }
+        self.call_on_ui(self.poll_interval_label.config, text=f"{interval:.2f}s")
+        self.log_message(f"⏱️ 轮询模式: {mode_names.get(mode, mode)}，阶段识别间隔 {interval:.2f}s")
+    
+    def stop_scheduler(self):
+        """停止识别调度器和键盘监听器"""
+        self.stop_keyboard_listener()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.log_message(f"连续监控模式已停止（共截图 {self.scheduler.capture_count} 次）")
+            self.scheduler = None
+        self.stop_frame_recorder()
+        self.stop_pipeline_profiler()
+    
+    def start_pipeline_profiler(self):
+        """按 --profile/--profile-seconds 创建本次会话的性能剖析器"""
+        self.pipeline_profiler = self.match_profiler = None
+        settings = self.profiling_settings
+        if not settings:
+            return
+        from src.profiling import PipelineProfiler
+        log_dir = self.config.get("database", {}).get("log_directory", "log")
+        self.pipeline_profiler = PipelineProfiler(
+            log_dir, "gui", session_id=self.current_session_id,
+            on_dump=lambda paths: self.log_message(f"🔬 性能剖析结果已保存: {', '.join(paths)}"),
+            **settings
+        )
+        mode = "采样" if settings.get("sampling") else "cProfile"
+        if settings.get("seconds"):
+            self.log_message(f"🔬 性能剖析({mode}): 后台识别循环 {settings['seconds']:g} 秒")
+        else:
+            self.match_profiler = self.pipeline_profiler
+            self.log_message(f"🔬 性能剖析({mode}): 接下来 {settings['triggers']} 次卡牌匹配")
+    
+    def stop_pipeline_profiler(self):
+        """结束性能剖析，未达到次数或时长时保存已剖析的部分"""
+        profiler, self.pipeline_profiler, self.match_profiler = self.pipeline_profiler, None, None
+        if profiler is not None and not profiler.done:
+            if not profiler.finish():
+                self.log_message("🔬 性能剖析期间没有执行识别，未生成结果")
+    
+    def start_frame_recorder(self, fixed_regions, level_region):
+        """按配置创建帧日志录制器，同时记录哪些区域是卡牌、哪个是Level，回放时据此识别"""
+        frame_log_config = self.config.get("database", {}).get("frame_log", {})
+        if not frame_log_config.get("enabled", False):
+            return
+        from src.capture import FrameRecorder, ROLE_LEVEL, ROLE_SLOTS
         try:
-            while self.is_running:
-                # 等待触发事件或程序退出
-                if hasattr(self, 'trigger_event') and self.trigger_event.wait(timeout=0.1):
-                    self.trigger_event.clear()
-                    if self.is_running:  # 确保程序仍在运行
-                        # 执行匹配并记录结果
-                        trigger_key = self.config["keyboard_shortcuts"]["trigger_key"].upper()
-                        self.log_message(f"检测到{trigger_key}键触发，执行匹配...")
-                        self.perform_matching()
-                        
-                        # 显示当前会话统计
-                        self.log_message("="*30)
-                        self.log_message("📊 当前会话统计")
-                        self.log_message("="*30)
-                        
-                time.sleep(0.01)  # 减少CPU占用
-                
+            self.frame_recorder = FrameRecorder(frame_log_config.get("path", "log/frames.tftlog"),
+                                                fixed_regions + [level_region],
+                                                capacity=frame_log_config.get("capacity", 1000),
+                                                roles={ROLE_SLOTS: fixed_regions, ROLE_LEVEL: [level_region]})
+            self.log_message(f"🎞️ 帧日志录制中: {self.frame_recorder.path} "
+                             f"(已有 {len(self.frame_recorder)}/{self.frame_recorder.capacity} 帧)")
         except Exception as e:
-            self.log_message(f"监控循环错误: {e}")
-        finally:
-            self.stop_keyboard_listener()
-            self.log_message("连续监控模式已停止")
+            self.frame_recorder = None
+            self.log_message(f"⚠️ 帧日志创建失败: {e}")
+    
+    def stop_frame_recorder(self):
+        """关闭帧日志录制器"""
+        recorder, self.frame_recorder = self.frame_recorder, None
+        if recorder is not None:
+            count = len(recorder)
+            recorder.close()
+            self.log_message(f"🎞️ 帧日志已保存: {recorder.path} ({count} 帧)")
+    
+    def run_shop_match(self, frame):
+        """调度器回调：在当前帧上执行卡牌匹配"""
+        if not self.is_running:
+            return
+        profiler = self.match_profiler
+        with profiler.profile() if profiler is not None else nullcontext():
+            self.perform_matching(frame)
+        
+        # 显示当前会话统计
+        self.log_message("="*30)
+        self.log_message("📊 当前会话统计")
+        self.log_message("="*30)
     
     def start_keyboard_listener(self):
         """启动键盘监听器"""
@@ -720,12 +1078,10 @@ class TFTStatsGUI:
                 try:
                     # 从配置文件获取触发键
                     trigger_key = self.config["keyboard_shortcuts"]["trigger_key"]
-                    if key == keyboard.KeyCode.from_char(trigger_key):
-                        if hasattr(self, 'trigger_event'):
-                            self.trigger_event.set()
-                        else:
-                            # 如果没有trigger_event，直接执行匹配
-                            self.manual_trigger()
+                    if key == keyboard.KeyCode.from_char(trigger_key) and self.scheduler is not None:
+                        # 交给调度器在下一个tick截图并匹配
+                        self.log_message(f"检测到{trigger_key.upper()}键触发，执行匹配...")
+                        self.scheduler.trigger("shop_match")
                             
                 except AttributeError:
                     pass
@@ -734,9 +1090,6 @@ class TFTStatsGUI:
                 """键盘释放回调函数"""
                 pass
             
-            # 创建事件对象
-            self.trigger_event = threading.Event()
-            
             # 启动键盘监听器
             self.keyboard_listener = keyboard.Listener(
                 on_press=on_key_press,
@@ -767,14 +1120,11 @@ class TFTStatsGUI:
             if self.stage_ocr_running:
                 return
             
+            # 阶段OCR由调度器按stage_monitor_interval运行
             self.stage_ocr_running = True
             self.stage_change_detected = False
             self.buy_xp_found = False
             
-            # 启动阶段OCR监控线程
-            self.stage_monitor_thread = threading.Thread(target=self.stage_ocr_monitor_loop, daemon=True)
-            self.stage_monitor_thread.start()
-            
             stage_coords = self.config["matching_settings"]["ocr_regions"]["stage_detection"]["coordinates"]
             self.log_message(f"🚀 阶段识别已启动，监控区域 {tuple(stage_coords)}")
             
@@ -785,13 +1135,7 @@ class TFTStatsGUI:
         """停止阶段识别功能"""
         try:
             self.stage_ocr_running = False
-            
-            # 等待线程结束
-            if self.stage_monitor_thread and self.stage_monitor_thread.is_alive():
-                self.stage_monitor_thread.join(timeout=1)
-            
-            if self.buy_xp_search_thread and self.buy_xp_search_thread.is_alive():
-                self.buy_xp_search_thread.join(timeout=1)
+            self.stage_change_detected = False
             
             # 重置阶段显示
             self.update_stage_label("未检测")
@@ -803,6 +1147,9 @@ class TFTStatsGUI:
     
     def update_stage_label(self, stage_value):
         """更新阶段显示标签"""
+        if not self.on_ui_thread():
+            self.call_on_ui(self.update_stage_label, stage_value)
+            return
         try:
             if hasattr(self, 'current_stage_label'):
                 if isinstance(stage_value, int):
@@ -815,144 +1162,157 @@ class TFTStatsGUI:
         except Exception as e:
             self.log_message(f"⚠️ 更新阶段标签失败: {e}")
     
-    def stage_ocr_monitor_loop(self):
-        """阶段OCR监控循环"""
+    def detect_stage(self, frame):
+        """调度器回调：识别当前帧中的阶段"""
+        if not self.is_running:
+            return
+        
+        # 从配置文件获取阶段识别区域
+        stage_region = tuple(self.config["matching_settings"]["ocr_regions"]["stage_detection"]["coordinates"])
+        stage_number = None
         try:
-            while self.stage_ocr_running and self.is_running:
-                try:
-                    # 从配置文件获取阶段识别区域
-                    stage_region = tuple(self.config["matching_settings"]["ocr_regions"]["stage_detection"]["coordinates"])
-                    stage_number = None
-                    if self.enable_ocr and self.ocr:
-                        try:
-                            full_screen = grab_fullscreen(monitor_index=self.monitor_index)
-                            stage_number = self.ocr.recognize_number_from_region(full_screen, stage_region)
-                            # self.log_message(f"🔍 OCR识别结果: Stage {stage_number}")
-                        except Exception as e:
-                            self.log_message(f"⚠️ OCR识别失败: {e}")
-                        
-                        # 检查阶段文本是否发生变化
-                        if stage_number != self.current_stage_num and stage_number > self.current_stage_num:
-                            self.log_message(f"🔄 阶段变化检测: '{self.current_stage_num}' -> '{stage_number}'")
-                            self.current_stage_num = stage_number
-                            self.stage_change_detected = True
-                            
-                            # 更新阶段显示标签
-                            self.update_stage_label(stage_number)
-                            
-                            # 启动Buy XP搜索
-                            self.start_buy_xp_search()
-                    
-                    # 每500ms检查一次
-                    time.sleep(self.config["auto_identification"]["stage_monitor_interval"])
-                    
-                except Exception as e:
-                    self.log_message(f"⚠️ 阶段OCR监控错误: {e}")
-                    time.sleep(1)
-                    
+            stage_number = self.ocr.recognize_stage(frame.view(stage_region))
+            # self.log_message(f"🔍 OCR识别结果: Stage {stage_number}")
         except Exception as e:
-            self.log_message(f"⚠️ 阶段OCR监控循环异常: {e}")
+            self.log_message(f"⚠️ OCR识别失败: {e}")
+        
+        if self.cadence is not None:
+            self.cadence.observe_stage(stage_number)
+        
+        # 检查阶段文本是否发生变化
+        if stage_number is not None and stage_number > self.current_stage_num:
+            self.log_message(f"🔄 阶段变化检测: '{self.current_stage_num}' -> '{stage_number}'")
+            self.current_stage_num = stage_number
+            
+            # 更新阶段显示标签
+            self.update_stage_label(stage_number)
+            
+            # 启动Buy XP搜索
+            self.start_buy_xp_search()
     
     def start_buy_xp_search(self):
         """启动Buy XP搜索"""
         try:
-            if self.buy_xp_search_thread and self.buy_xp_search_thread.is_alive():
+            if self.stage_change_detected and not self.buy_xp_found:
                 return
             
-            self.buy_xp_found = False
+            if self.get_buy_xp_detector() is None:
+                # Buy_XP.png文件不存在，不触发图片匹配
+                self.log_message("⚠️ Buy_XP.png文件不存在，不触发图片匹配")
+                return
             
-            # 启动Buy XP搜索线程
-            self.buy_xp_search_thread = threading.Thread(target=self.buy_xp_search_loop, daemon=True)
-            self.buy_xp_search_thread.start()
+            # Buy XP搜索由调度器按buy_xp_search_interval运行，从下一个tick开始
+            self.buy_xp_found = False
+            self.buy_xp_search_count = 0
+            self.stage_change_detected = True
+            if self.cadence is not None:
+                self.cadence.start_buy_xp_search()
+            if self.scheduler is not None:
+                self.scheduler.reset_timer("buy_xp")
             
             self.log_message("🔍 开始搜索Buy XP按钮...")
             
         except Exception as e:
             self.log_message(f"⚠️ 启动Buy XP搜索失败: {e}")
     
-    def buy_xp_search_loop(self):
-        """Buy XP搜索循环"""
-        try:
-            search_count = 0
-            max_search_attempts = self.config["auto_identification"]["max_buy_xp_search_attempts"]
-            
-            while (self.stage_change_detected and 
-                   not self.buy_xp_found and 
-                   search_count < max_search_attempts and
-                   self.is_running):
-                
-                try:
-                    # 搜索Buy XP图片
-                    buy_xp_path = os.path.join("tools", "Buy_XP.png")
-                    if os.path.exists(buy_xp_path):
-                        # 截取全屏进行搜索
-                        full_screen = grab_fullscreen(monitor_index=self.monitor_index)
-                        
-                        # 加载Buy XP模板
-                        templates = load_templates_from_dir("tools")
-                        buy_xp_template = None
-                        for name, tmpl in templates:
-                            if "Buy_XP" in name:
-                                buy_xp_template = tmpl
-                                break
-                        
-                        if buy_xp_template is not None:
-                            # 在全屏中搜索Buy XP
-                            result = match_template(full_screen, buy_xp_template, threshold=self.config["auto_identification"]["buy_xp_threshold"])
-                            if result:
-                                self.buy_xp_found = True
-                                self.stage_change_detected = False
-                                self.log_message("✅ Buy XP按钮已找到，触发图片匹配")
-                                
-                                # 执行图片匹配
-                                self.perform_matching()
-                                break
-                    else:
-                        # Buy_XP.png文件不存在，直接触发图片匹配
-                        self.log_message("⚠️ Buy_XP.png文件不存在，不触发图片匹配")
-                        # self.buy_xp_found = True
-                        # self.stage_change_detected = False
-                        
-                        # # 执行图片匹配
-                        # self.perform_matching()
-                        break
-                    
-                    search_count += 1
-                    time.sleep(self.config["auto_identification"]["buy_xp_search_interval"])
-                    
-                except Exception as e:
-                    self.log_message(f"⚠️ Buy XP搜索错误: {e}")
-                    time.sleep(2)
+    def get_buy_xp_region(self):
+        """获取Buy XP搜索区域，未配置时搜索全屏"""
+        region = self.config["auto_identification"].get("buy_xp_region")
+        if region and "coordinates" in region:
+            return tuple(region["coordinates"])
+        # 整屏尺寸取自缓存的显示几何，不为此截一次全屏
+        from src.capture import get_display_geometry
+        width, height = get_display_geometry(self.monitor_index).size
+        return (0, 0, width, height)
+    
+    def get_buy_xp_detector(self):
+        """获取Buy XP检测器，模板只加载一次；模板文件不存在时返回None"""
+        if self.buy_xp_detector is None:
+            buy_xp_path = os.path.join("tools", "Buy_XP.png")
+            if not os.path.exists(buy_xp_path):
+                return None
+            from src.matching import RegionDetector
+            self.buy_xp_detector = RegionDetector(buy_xp_path, scale=getattr(self, 'resolution_scale', (1.0, 1.0)))
+        return self.buy_xp_detector
+    
+    def search_buy_xp(self, frame):
+        """调度器回调：在当前帧中搜索Buy XP按钮，找到后在同一帧上触发卡牌匹配"""
+        if not self.is_running:
+            return
+        
+        max_search_attempts = self.config["auto_identification"]["max_buy_xp_search_attempts"]
+        buy_xp_region = self.get_buy_xp_region()
+        
+        # 只在Buy XP按钮附近的区域进行搜索
+        result = self.get_buy_xp_detector().detect(frame.view(buy_xp_region),
+                                                   threshold=self.config["auto_identification"]["buy_xp_threshold"],
+                                                   offset=buy_xp_region[:2])
+        if result:
+            self.buy_xp_found = True
+            self.stage_change_detected = False
+            self.log_message("✅ Buy XP按钮已找到，触发图片匹配")
             
-            if not self.buy_xp_found:
-                self.log_message("⚠️ 未找到Buy XP按钮，重置转阶段标志")
-                self.stage_change_detected = False
-                
-        except Exception as e:
-            self.log_message(f"⚠️ Buy XP搜索循环异常: {e}")
+            # 执行图片匹配（同一tick、同一帧）
+            self.scheduler.trigger("shop_match")
+            return
+        
+        self.buy_xp_search_count += 1
+        if self.buy_xp_search_count >= max_search_attempts:
+            self.log_message("⚠️ 未找到Buy XP按钮，重置转阶段标志")
             self.stage_change_detected = False
     
-    def perform_matching(self):
-        """执行模板匹配"""
+    def perform_matching(self, frame=None):
+        """执行模板匹配
+        
+        Args:
+            frame: 调度器提供的当前帧，需覆盖卡牌和Level区域；为None时自行截图
+        """
+        self.wait_for_warmup()
         try:
+            from src.capture import grab_frame
+            from src.matching import full_slot_bbox, match_slots, TemplateBankSet
+            
             # 从配置文件获取固定的五个TFT卡牌区域
-            fixed_regions = []
-            for region in self.config["matching_settings"]["fixed_regions"]:
-                fixed_regions.append(tuple(region["coordinates"]))
+            fixed_regions = self.get_fixed_regions()
             
             # 从配置文件获取OCR识别区域
             ocr_region = tuple(self.config["matching_settings"]["ocr_regions"]["level_detection"]["coordinates"])
             
-            templates = load_templates_from_dir(self.templates_dir)
+            # 取与当前卡牌区域大小一致的模板库，分辨率变化后首次使用时才重新采样
+            if self.template_banks is None:
+                self.template_banks = TemplateBankSet(self.templates_dir)
+            bank = self.template_banks.for_regions(fixed_regions)
+            if bank is not self.template_bank:
+                self.template_bank = bank
+                w, h = bank.template_size
+                self.log_message(f"📐 模板已按卡牌区域大小 {w}x{h} 加载 ({len(bank)} 个)")
+            elif bank.refresh():
+                self.log_message(f"🔄 模板文件有变化，已重新加载 ({len(bank)} 个)")
             all_matches = []
             level_number = None
             ocr_confidence = None
             
+            # 一次截图覆盖五个卡牌区域和Level区域，所有结果来自同一帧
+            if frame is None:
+                with self.latency.time("capture"):
+                    frame = grab_frame(fixed_regions + [ocr_region], monitor_index=self.monitor_index)
+            
+            # 记录本次匹配的帧，供之后回放复现
+            recorder = self.frame_recorder
+            if recorder is not None and not recorder.record(frame):
+                self.log_message(f"⚠️ 帧日志已满 ({recorder.capacity} 帧)，不再记录")
+                self.stop_frame_recorder()
+            
+            # 五个卡牌区域和Level区域都是帧上的零拷贝视图
+            with self.latency.time("crop"):
+                region_imgs = [frame.view(region) for region in fixed_regions]
+                level_img = frame.view(ocr_region)
+            
             # 执行OCR识别（如果启用）
             if self.enable_ocr and self.ocr:
                 try:
-                    full_screen = grab_fullscreen(monitor_index=self.monitor_index)
-                    level_number = self.ocr.recognize_number_from_region(full_screen, ocr_region)
+                    with self.latency.time("ocr"):
+                        level_number = self.ocr.recognize_number(level_img)
                     ocr_confidence = 0.9  # 默认置信度
                     self.log_message(f"🔍 OCR识别结果: Level {level_number}")
                 except Exception as e:
@@ -967,44 +1327,48 @@ class TFTStatsGUI:
                         ocr_confidence = 0.3
                         self.log_message("使用默认Level值: 1")
             
-            self.log_message(f"开始匹配 {len(templates)} 个模板...")
+            self.log_message(f"开始匹配 {len(self.template_bank)} 个模板...")
+            
+            # 五个区域与全部模板一次矩阵乘法完成打分
+            with self.latency.time("score"):
+                slot_hits = match_slots(self.template_bank, region_imgs, self.threshold,
+                                        mode=self.match_mode, early_exit_margin=self.early_exit_margin)
             
             # 准备匹配数据，使用与main函数相同的格式
             matches_data = []
             match_details = []
             
-            for i, (x, y, w, h) in enumerate(fixed_regions):
-                region_img = grab_region((x, y, w, h), monitor_index=self.monitor_index)
+            for i, region_img in enumerate(region_imgs):
                 region_matched = False
                 region_templates = []
                 region_detail = {}
                 
-                for name, tmpl in templates:
-                    res = match_template(region_img, tmpl, threshold=self.threshold)
-                    if res is not None:
-                        # 解析卡牌信息
-                        unit_name, cost = self.parse_card_name(name)
-                        
-                        # 记录匹配详情
-                        if 'score' not in region_detail or res['score'] > region_detail.get('score', 0):
-                            region_detail = {
-                                'score': res['score'],
-                                'bbox': {
-                                    'top_left': res['top_left'],
-                                    'bottom_right': res['bottom_right'],
-                                    'center': res['center']
-                                }
-                            }
-                        
-                        region_templates.append(name)
-                        region_matched = True
-                        
-                        all_matches.append({
-                            'region': i+1,
-                            'name': unit_name,
-                            'cost': cost,
-                            'score': res['score']
-                        })
+                for hit in slot_hits[i]:
+                    name = hit['name']
+                    score = hit['score']
+                    # 解析卡牌信息
+                    unit_name, cost = self.parse_card_name(name)
+                    
+                    # 记录匹配详情
+                    if 'score' not in region_detail or score > region_detail.get('score', 0):
+                        region_detail = {
+                            'score': score,
+                            'bbox': full_slot_bbox(region_img)
+                        }
+                        # best模式下记录与次优模板的分差，作为置信度参考
+                        if 'margin' in hit:
+                            region_detail['margin'] = hit['margin']
+                    
+                    region_templates.append(name)
+                    region_matched = True
+                    
+                    all_matches.append({
+                        'region': i+1,
+                        'name': unit_name,
+                        'cost': cost,
+                        'score': score,
+                        'margin': hit.get('margin')
+                    })
                 
                 if region_matched:
                     matches_data.append((i+1, region_templates))
@@ -1019,16 +1383,18 @@ class TFTStatsGUI:
             # 记录到数据库，使用与main函数相同的方法
             if self.current_session_id and matches_data:
                 try:
-                    self.database.record_matches(self.current_session_id, matches_data, match_details, self.current_stage_num)
+                    with self.latency.time("db_write"):
+                        self.database.record_matches(self.current_session_id, matches_data, match_details,
+                                                     self.current_stage_num)
+                    # 同步更新内存汇总，图表无需再查询数据库
+                    self.aggregates.add((match['name'], match['cost'], level_number) for match in all_matches)
                     self.log_message(f"✅ 数据库记录成功，记录了 {len(matches_data)} 个区域的匹配结果，阶段: {self.current_stage_num}")
                 except Exception as db_error:
                     self.log_message(f"❌ 数据库记录失败: {db_error}")
             
             # 更新Level计数
             if level_number and level_number >= 2 and level_number <= 10:
-                current_count = int(self.count_labels[level_number]['text'])
-                self.count_labels[level_number].config(text=str(current_count + 1))
-                self.log_message(f"📊 Level {level_number} 计数更新: {current_count} → {current_count + 1}")
+                self.increment_level_count(level_number)
                 # 从数据库获取最新的capture_sequence值并更新触发次数
                 self.update_trigger_count_from_database()  
             
@@ -1038,7 +1404,10 @@ class TFTStatsGUI:
             if all_matches:
                 self.log_message("匹配结果摘要:")
                 for match in all_matches:
-                    self.log_message(f"  区域{match['region']}: {match['name']} (费用{match['cost']})")
+                    if match['margin'] is not None:
+                        self.log_message(f"  区域{match['region']}: {match['name']} (费用{match['cost']}, 分数{match['score']:.2f}, 领先{match['margin']:.2f})")
+                    else:
+                        self.log_message(f"  区域{match['region']}: {match['name']} (费用{match['cost']})")
             
             # 更新图表
             self.update_charts()
@@ -1048,6 +1417,19 @@ class TFTStatsGUI:
             import traceback
             self.log_message(f"错误详情: {traceback.format_exc()}")
     
+    def increment_level_count(self, level_number):
+        """Level计数加一"""
+        if not self.on_ui_thread():
+            self.call_on_ui(self.increment_level_count, level_number)
+            return
+        current_count = int(self.count_labels[level_number]['text'])
+        self.count_labels[level_number].config(text=str(current_count + 1))
+        self.log_message(f"📊 Level {level_number} 计数更新: {current_count} → {current_count + 1}")
+    
+    def get_fixed_regions(self):
+        """获取当前分辨率下的五个卡牌区域"""
+        return [tuple(region["coordinates"]) for region in self.config["matching_settings"]["fixed_regions"]]
+    
     def parse_card_name(self, template_name):
         """解析卡牌名称，提取单位名称和费用"""
         try:
@@ -1062,14 +1444,32 @@ class TFTStatsGUI:
         except:
             return template_name, 0
     
-    def update_charts(self):
-        """更新图表"""
+    def update_charts(self, force=False):
+        """更新图表
+        
+        只有统计数据版本或筛选条件变化时才重绘。
+        
+        Args:
+            force: 为True时无论数据是否变化都重绘
+        """
+        if not self.on_ui_thread():
+            self.call_on_ui(self.update_charts, force)
+            return
+        if self.pie_chart is None:
+            # 图表尚未创建
+            return
         try:
-            # 更新饼图
-            self.update_pie_chart()
+            chart_key = (self.aggregates.version, self.selected_level, self.selected_cost_filter)
+            if not force and chart_key == self.drawn_chart_key:
+                return
+            self.drawn_chart_key = chart_key
             
-            # 更新折线图
-            self.update_line_chart()
+            with self.latency.time("chart"):
+                # 更新饼图
+                self.update_pie_chart()
+                
+                # 更新折线图
+                self.update_line_chart()
             
         except Exception as e:
             self.log_message(f"图表更新错误: {e}")
@@ -1083,24 +1483,8 @@ class TFTStatsGUI:
             if not cost_data:
                 return
             
-            self.ax_pie.clear()
-            self.ax_pie.set_facecolor('#34495e')
-            
-            costs = list(cost_data.keys())
-            counts = list(cost_data.values())
-            colors = ['#677380', '#069926', '#09529c', '#b70cc2', '#c77712']
-            
-            wedges, texts, autotexts = self.ax_pie.pie(counts, labels=costs, autopct='%1.1f%%',
-                                                       colors=colors[:len(costs)])
-            
-            # 设置文本颜色
-            for text in texts:
-                text.set_color('white')
-            for autotext in autotexts:
-                autotext.set_color('white')
-            
-            # self.ax_pie.set_title('卡牌费用分布', color='white', fontsize=12)
-            self.canvas_pie.draw()
+            # 费用集合不变时只更新扇形角度，不重建artist
+            self.pie_chart.update(cost_data)
             
         except Exception as e:
             self.log_message(f"饼图更新错误: {e}")
@@ -1114,63 +1498,35 @@ class TFTStatsGUI:
             if not unit_data:
                 return
             
-            self.ax_line.clear()
-            self.ax_line.set_facecolor('#34495e')
-            
-            unit_name = list(unit_data.keys())
-            counts = [row[0] for row in unit_data.values()]
-            costs = [row[1] for row in unit_data.values()]
-
-            # 定义不同cost值的颜色映射
-            cost_colors = {
-                1: '#677380',    # 1费
-                2: '#069926',    # 2费
-                3: '#09529c',    # 3费
-                4: '#b70cc2',    # 4费
-                5: '#c77712',    # 5费
-            }
-            
             # 如果选择了特定费用筛选，只显示该费用的数据
             if hasattr(self, 'selected_cost_filter') and self.selected_cost_filter is not None:
-                filtered_data = [(name, count, cost) for name, count, cost in zip(unit_name, counts, costs) 
-                               if cost == self.selected_cost_filter]
-                if filtered_data:
-                    unit_name = [item[0] for item in filtered_data]
-                    counts = [item[1] for item in filtered_data]
-                    costs = [item[2] for item in filtered_data]
-                    colors = [cost_colors.get(cost, '#95a5a6') for cost in costs]
-                else:
+                unit_data = {name: row for name, row in unit_data.items()
+                             if row[1] == self.selected_cost_filter}
+                if not unit_data:
                     # 如果没有数据，显示"无数据"信息
-                    self.ax_line.text(0.5, 0.5, f'费用 {self.selected_cost_filter} 无数据', 
-                                    ha='center', va='center', transform=self.ax_line.transAxes, 
-                                    color='white', fontsize=12)
-                    self.canvas_line.draw()
+                    self.bar_chart.show_message(f'费用 {self.selected_cost_filter} 无数据')
                     return
-            else:
-                # 为每个条形设置对应的颜色
-                colors = [cost_colors.get(cost, '#95a5a6') for cost in costs]
             
-            # 创建条形图
-            bars = self.ax_line.bar(unit_name, counts, color=colors, alpha=0.8, edgecolor='white', linewidth=1)
+            # 棋子列表不变时只更新柱子高度，不重建artist
+            self.bar_chart.update(unit_data)
             
-            # 设置图表属性
-            self.ax_line.set_xlabel('Units Name', color='white')
-            self.ax_line.set_ylabel('Count', color='white')
-            self.ax_line.tick_params(colors='white')
-            self.ax_line.tick_params(axis='x', rotation=45)
-            self.ax_line.grid(True, alpha=0.2, color='white', axis='y')
-            
-            # 创建可点击的图例按钮
-            self.create_clickable_legend(cost_colors, costs)
-            
-            self.canvas_line.draw()
+            # 创建可点击的图例按钮（费用集合变化时才重建）
+            self.create_clickable_legend(COST_COLORS, [row[1] for row in unit_data.values()])
 
         except Exception as e:
             self.log_message(f"折线图更新错误: {e}")
     
     def create_clickable_legend(self, cost_colors, costs):
-        """创建可点击的费用图例按钮"""
+        """创建可点击的费用图例按钮
+        
+        费用集合与上次相同时保留现有按钮，只在集合变化时重建。
+        """
         try:
+            legend_costs = sorted(set(costs))
+            if legend_costs == self.legend_costs and hasattr(self, 'legend_frame'):
+                return
+            self.legend_costs = legend_costs
+            
             # 清除之前的图例按钮（如果存在）
             if hasattr(self, 'legend_frame'):
                 self.legend_frame.destroy()
@@ -1181,7 +1537,7 @@ class TFTStatsGUI:
             
             # 创建费用按钮
             self.cost_buttons = {}
-            for cost in sorted(set(costs)):
+            for cost in legend_costs:
                 if cost in cost_colors:
                     # 创建按钮
                     btn = tk.Button(self.legend_frame, text=f"{cost}Cost", 
@@ -1225,98 +1581,24 @@ class TFTStatsGUI:
             self.log_message(f"费用按钮点击错误: {e}")
     
     def get_cost_distribution(self):
-        """获取费用分布数据"""
+        """获取费用分布数据（来自内存汇总，不访问数据库）"""
         try:
             if not self.current_session_id:
                 return {}
             
-            conn = sqlite3.connect(self.database.db_path)
-            cursor = conn.cursor()
-            
-            # 构建查询条件
-            where_conditions = []
-            params = []
-            
-            if self.selected_level is not None:
-                where_conditions.append("level = ?")
-                params.append(self.selected_level)
-            
-            if self.selected_cost_filter is not None:
-                where_conditions.append("cost = ?")
-                params.append(self.selected_cost_filter)
-            
-            # 构建SQL查询
-            if where_conditions:
-                where_clause = " AND ".join(where_conditions)
-                sql = f'''
-                    SELECT cost, SUM(total_matches) as count
-                    FROM template_stats 
-                    WHERE {where_clause}
-                    GROUP BY cost
-                    ORDER BY cost
-                '''
-            else:
-                sql = '''
-                    SELECT cost, SUM(total_matches) as count
-                    FROM template_stats 
-                    GROUP BY cost
-                    ORDER BY cost
-                '''
-            
-            cursor.execute(sql, params)
-            result = dict(cursor.fetchall())
-            conn.close()
-            
-            return result
+            return self.aggregates.cost_distribution(level=self.selected_level, cost=self.selected_cost_filter)
             
         except Exception as e:
             self.log_message(f"获取费用分布错误: {e}")
             return {}
     
     def get_unit_statistics_data(self):
-        """获取棋子统计数据"""
+        """获取棋子统计数据（来自内存汇总，不访问数据库）"""
         try:
             if not self.current_session_id:
                 return {}
             
-            conn = sqlite3.connect(self.database.db_path)
-            cursor = conn.cursor()
-            
-            # 构建查询条件
-            where_conditions = []
-            params = []
-            
-            if self.selected_level is not None:
-                where_conditions.append("level = ?")
-                params.append(self.selected_level)
-            
-            if self.selected_cost_filter is not None:
-                where_conditions.append("cost = ?")
-                params.append(self.selected_cost_filter)
-            
-            # 构建SQL查询
-            if where_conditions:
-                where_clause = " AND ".join(where_conditions)
-                sql = f'''
-                    SELECT unit_name, SUM(total_matches) as total_matches, cost
-                    FROM template_stats 
-                    WHERE {where_clause}
-                    GROUP BY unit_name
-                    ORDER BY cost ASC
-                '''
-            else:
-                sql = '''
-                    SELECT unit_name, SUM(total_matches) as total_matches, cost
-                    FROM template_stats 
-                    GROUP BY unit_name
-                    ORDER BY cost ASC
-                '''
-            
-            cursor.execute(sql, params)
-            result = cursor.fetchall()
-            conn.close()
-            
-            return {row[0]: (row[1], row[2]) for row in result}
+            return self.aggregates.unit_statistics(level=self.selected_level, cost=self.selected_cost_filter)
             
         except Exception as e:
             self.log_message(f"获取棋子统计错误: {e}")
@@ -1363,10 +1645,8 @@ class TFTStatsGUI:
                 self.log_message("⚠️ 没有活动会话，无法导出数据")
                 return
             
-            conn = sqlite3.connect(self.database.db_path)
-            cursor = conn.cursor()
-            
-            try:
+            # 两次查询在同一个读事务中完成，导出的数据保持一致
+            with self.database.read_snapshot() as cursor:
                 # 查询matches表的指定字段
                 cursor.execute('''
                     SELECT capture_sequence, unit_name, cost, level, stage
@@ -1383,39 +1663,45 @@ class TFTStatsGUI:
                 ''')
                 template_stats_data = cursor.fetchall()
             
-                conn.close()
+            # 本次会话各阶段耗时，按流水线顺序
+            perf_data = sorted(
+                self.database.get_session_perf(self.current_session_id),
+                key=lambda row: PERF_STAGES.index(row[0]) if row[0] in PERF_STAGES else len(PERF_STAGES)
+            )
             
-                # 写入CSV文件
-                with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                    import csv
-                    writer = csv.writer(csvfile)
+            # 写入CSV文件
+            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+                import csv
+                writer = csv.writer(csvfile)
+            
+                # 写入matches表数据
+                writer.writerow(['=== MATCHES TABLE ==='])
+                writer.writerow(['capture_sequence', 'unit_name', 'cost', 'level', 'stage'])
+                for row in matches_data:
+                    writer.writerow(row)
+            
+                # 写入空行分隔
+                writer.writerow([])
+            
+                # 写入template_stats表数据
+                writer.writerow(['=== TEMPLATE_STATS TABLE ==='])
+                writer.writerow(['id', 'unit_name', 'cost', 'level', 'total_matches'])
+                for row in template_stats_data:
+                    writer.writerow(row)
                 
-                    # 写入matches表数据
-                    writer.writerow(['=== MATCHES TABLE ==='])
-                    writer.writerow(['capture_sequence', 'unit_name', 'cost', 'level', 'stage'])
-                    for row in matches_data:
-                        writer.writerow(row)
-                
-                    # 写入空行分隔
+                # 写入会话性能数据
+                if perf_data:
                     writer.writerow([])
-                
-                    # 写入template_stats表数据
-                    writer.writerow(['=== TEMPLATE_STATS TABLE ==='])
-                    writer.writerow(['id', 'unit_name', 'cost', 'level', 'total_matches'])
-                    for row in template_stats_data:
-                        writer.writerow(row)
-            
-                    print(f"✅ 新CSV格式数据已导出到: {filename}")
-                    print(f"  - matches表: {len(matches_data)} 条记录")
-                    print(f"  - template_stats表: {len(template_stats_data)} 条记录")
-            
-            # except Exception as e:
-            #     print(f"❌ 导出失败: {e}")
-            #     import traceback
-            #     traceback.print_exc()
-            finally:
-                if conn:
-                    conn.close()
+                    writer.writerow(['=== SESSION_PERF TABLE ==='])
+                    writer.writerow(['stage', 'samples', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'max_ms'])
+                    for stage, samples, *values in perf_data:
+                        writer.writerow([stage, samples] + [round(value, 3) if value is not None else None
+                                                            for value in values])
+        
+                print(f"✅ 新CSV格式数据已导出到: {filename}")
+                print(f"  - matches表: {len(matches_data)} 条记录")
+                print(f"  - template_stats表: {len(template_stats_data)} 条记录")
+                print(f"  - session_perf表: {len(perf_data)} 条记录")
 
         except Exception as e:
             self.log_message(f"❌ 导出CSV错误: {e}")
@@ -1549,43 +1835,105 @@ class TFTStatsGUI:
     def clear_log(self):
         """清空日志"""
         self.log_text.delete(1.0, tk.END)
+        self.log_line_count = 0
         self.log_message("日志已清空")
     
-    def log_message(self, message):
-        """添加日志消息"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
+    def on_ui_thread(self):
+        """当前是否在Tk主线程"""
+        return threading.get_ident() == self.ui_thread_id
+    
+    def call_on_ui(self, func, *args, **kwargs):
+        """在Tk主线程执行func；在主线程调用时直接执行，否则放入UI队列"""
+        if self.on_ui_thread():
+            func(*args, **kwargs)
+        else:
+            self.ui_queue.put((func, args, kwargs))
+    
+    def drain_ui_queue(self):
+        """在主循环中执行排队的UI更新，并批量写入日志"""
+        try:
+            for _ in range(UI_DRAIN_BATCH):
+                try:
+                    func, args, kwargs = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    func(*args, **kwargs)
+                except Exception as e:
+                    self.log_message(f"UI更新错误: {e}")
+            
+            self.flush_log()
+        finally:
+            self.root.after(UI_DRAIN_INTERVAL_MS, self.drain_ui_queue)
+    
+    def flush_log(self):
+        """把排队的日志一次性写入文本框，按行数计数裁剪旧日志"""
+        entries = []
+        while True:
+            try:
+                entries.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if not entries:
+            return
         
-        self.log_text.insert(tk.END, log_entry)
-        self.log_text.see(tk.END)
+        # 超出上限的部分写入后也会被裁掉，直接丢弃
+        entries = entries[-MAX_LOG_LINES:]
+        self.log_text.insert(tk.END, ''.join(entries))
+        self.log_line_count += sum(entry.count('\n') for entry in entries)
         
         # 限制日志行数
-        lines = self.log_text.get(1.0, tk.END).split('\n')
-        if len(lines) > 100:
-            self.log_text.delete(1.0, f"{len(lines) - 100}.0")
+        excess = self.log_line_count - MAX_LOG_LINES
+        if excess > 0:
+            self.log_text.delete(1.0, f"{excess + 1}.0")
+            self.log_line_count = MAX_LOG_LINES
+        self.log_text.see(tk.END)
+    
+    def log_message(self, message):
+        """添加日志消息（任意线程可调用，由主循环批量写入）"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.log_queue.put(f"[{timestamp}] {message}\n")
     
     def update_loop(self):
-        """更新循环"""
-        while True:
-            try:
-                # 更新触发次数显示
-                self.trigger_count_label.config(text=str(self.trigger_count))
-                
-                # 定期更新图表
-                if self.is_running and self.current_session_id:
-                    self.update_charts()
-                
-                time.sleep(2)  # 每2秒更新一次
+        """定时刷新触发次数和图表（在主循环中运行）"""
+        try:
+            # 更新触发次数显示
+            self.trigger_count_label.config(text=str(self.trigger_count))
+            
+            # 定期检查图表，数据版本未变化时update_charts直接返回
+            if self.is_running and self.current_session_id:
+                self.update_charts()
+            
+            self.refresh_perf_panel()
                 
-            except Exception as e:
-                print(f"更新循环错误: {e}")
-                time.sleep(5)
-
+        except Exception as e:
+            print(f"更新循环错误: {e}")
+        finally:
+            self.root.after(UI_REFRESH_INTERVAL_MS, self.update_loop)
 
 def main():
     """主函数"""
-    root = tk.Tk()
-    app = TFTStatsGUI(root)
+    parser = argparse.ArgumentParser(description="TFT卡牌统计GUI")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="打印启动各阶段的导入和初始化耗时")
+    parser.add_argument("--profile", type=int, default=None, metavar="N",
+                        help="用cProfile剖析接下来N次卡牌匹配，结果写入log_directory")
+    parser.add_argument("--profile-seconds", type=float, default=None, metavar="N",
+                        help="剖析后台识别循环（截图、阶段OCR、Buy XP搜索和卡牌匹配）N秒")
+    parser.add_argument("--profile-sampling", action="store_true",
+                        help="用低开销的调用栈采样代替cProfile")
+    args = parser.parse_args()
+    
+    profile = StartupProfile(STARTUP_T0, enabled=args.startup_profile)
+    profile.add("导入标准库和Tk", STARTUP_T0, STDLIB_IMPORTED)
+    profile.add("导入数据库和图表模块", STDLIB_IMPORTED, LOCAL_IMPORTED)
+    
+    with profile.phase("创建主窗口"):
+        root = tk.Tk()
+    profiling = None
+    if args.profile or args.profile_seconds:
+        profiling = {"triggers": args.profile, "seconds": args.profile_seconds, "sampling": args.profile_sampling}
+    app = TFTStatsGUI(root, profile, profiling=profiling)
     
     # 设置快捷键
     # root.bind('<Control-s>', lambda e: app.open_log_folder())
@@ -1593,7 +1941,10 @@ def main():
     # root.bind('<Control-c>', lambda e: app.clear_table())
     
     # 启动GUI
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        app.database.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+匹配计数汇总模块 - 在内存中维护按费用、棋子和等级的出现次数，供GUI图表读取
+"""
+
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class MatchAggregates:
+    """进程内的匹配计数汇总
+    
+    与template_stats表保持同样的粒度 (unit_name, cost, level) -> 次数。
+    每次写入都会递增version，读取方可以据此判断是否需要重绘。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, int, Optional[int]], int] = {}
+        self.version = 0
+    
+    def clear(self):
+        """清空所有计数"""
+        with self._lock:
+            self._counts.clear()
+            self.version += 1
+    
+    def load(self, rows: Iterable[Tuple[str, int, Optional[int], int]]):
+        """用已有统计数据替换当前计数
+        
+        Args:
+            rows: [(unit_name, cost, level, 次数), ...]，如TFTStatsDatabase.get_template_counts()的结果
+        """
+        with self._lock:
+            self._counts = {}
+            for unit_name, cost, level, count in rows:
+                key = (unit_name, cost, level)
+                self._counts[key] = self._counts.get(key, 0) + count
+            self.version += 1
+    
+    def add(self, records: Iterable[Tuple[str, int, Optional[int]]]):
+        """记录一次截图的匹配结果
+        
+        Args:
+            records: [(unit_name, cost, level), ...]，每个元素代表一次匹配
+        """
+        with self._lock:
+            changed = False
+            for key in records:
+                self._counts[key] = self._counts.get(key, 0) + 1
+                changed = True
+            if changed:
+                self.version += 1
+    
+    def _filtered(self, level: Optional[int], cost: Optional[int]):
+        """返回满足筛选条件的 (unit_name, cost, 次数) 列表"""
+        with self._lock:
+            return [
+                (unit_name, unit_cost, count)
+                for (unit_name, unit_cost, unit_level), count in self._counts.items()
+                if (level is None or unit_level == level) and (cost is None or unit_cost == cost)
+            ]
+    
+    def cost_distribution(self, level: Optional[int] = None, cost: Optional[int] = None) -> Dict[int, int]:
+        """按费用汇总出现次数
+        
+        Args:
+            level: 只统计该等级，None表示全部
+            cost: 只统计该费用，None表示全部
+            
+        Returns:
+            {费用: 次数}，按费用升序
+        """
+        totals: Dict[int, int] = {}
+        for _, unit_cost, count in self._filtered(level, cost):
+            totals[unit_cost] = totals.get(unit_cost, 0) + count
+        return dict(sorted(totals.items()))
+    
+    def unit_statistics(self, level: Optional[int] = None, cost: Optional[int] = None) -> Dict[str, Tuple[int, int]]:
+        """按棋子汇总出现次数
+        
+        Args:
+            level: 只统计该等级，None表示全部
+            cost: 只统计该费用，None表示全部
+            
+        Returns:
+            {unit_name: (次数, 费用)}，按费用升序
+        """
+        totals: Dict[str, list] = {}
+        for unit_name, unit_cost, count in self._filtered(level, cost):
+            entry = totals.setdefault(unit_name, [0, unit_cost])
+            entry[0] += count
+        ordered = sorted(totals.items(), key=lambda item: (item[1][1], item[0]))
+        return {unit_name: (count, unit_cost) for unit_name, (count, unit_cost) in ordered}
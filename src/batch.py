@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+批量分析模块 - 用进程池离线分析截图文件夹，结果分批写入统计数据库
+
+每个工作进程启动时加载自己的模板库（内存映射同一份编译缓存）和OCR识别器，
+按config.json中的fixed_regions/ocr_regions换算到截图的实际分辨率后识别。
+主进程按文件顺序收集结果，每commit_every张截图在一个事务中写入数据库。
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .capture import DisplayGeometry, Frame
+from .database import TFTStatsDatabase
+from .matching import TemplateBankSet, build_template_cache, full_slot_bbox, match_slots, slot_size_for_regions
+from .ocr_module import DEFAULT_OCR_BACKEND, NumberOCR
+
+
+Region = Tuple[int, int, int, int]
+
+SCREENSHOT_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+# BLAS/OpenMP线程数，每个工作进程单线程，避免与进程数相乘造成过度订阅
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+# 工作进程内的状态，由_init_worker填充
+_worker: Dict = {}
+
+
+def load_region_config(config_path: str = "config.json", fixed_regions: Optional[List[Region]] = None,
+                       ocr_region: Optional[Region] = None) -> dict:
+    """读取区域配置，配置文件不存在时使用传入的默认区域（只有Level区域，无阶段区域）"""
+    if config_path and os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)["matching_settings"]
+        ocr_regions = settings.get("ocr_regions", {})
+        return {
+            "fixed_regions": settings["fixed_regions"],
+            "level_region": ocr_regions.get("level_detection"),
+            "stage_region": ocr_regions.get("stage_detection"),
+        }
+    return {
+        "fixed_regions": [{"coordinates": list(region)} for region in fixed_regions or []],
+        "level_region": {"coordinates": list(ocr_region)} if ocr_region else None,
+        "stage_region": None,
+    }
+
+
+def regions_for_size(region_config: dict, width: int, height: int) -> dict:
+    """把区域配置换算到 width x height 的截图；有相对坐标时按相对坐标，否则使用像素坐标"""
+    geometry = DisplayGeometry([{"left": 0, "top": 0, "width": width, "height": height}] * 2, 1)
+
+    def resolve(region):
+        if region is None:
+            return None
+        if "relative_coordinates" in region:
+            return geometry.resolve(region["relative_coordinates"])
+        return tuple(region["coordinates"])
+
+    return {
+        "fixed_regions": [resolve(region) for region in region_config["fixed_regions"]],
+        "level_region": resolve(region_config["level_region"]),
+        "stage_region": resolve(region_config["stage_region"]),
+    }
+
+
+def iter_screenshots(batch_dir: str, recursive: bool = False) -> Iterator[str]:
+    """按文件名顺序逐个产出截图路径，不预先列出整个目录树"""
+    for root, dirs, files in os.walk(batch_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(SCREENSHOT_EXTS):
+                yield os.path.join(root, name)
+        if not recursive:
+            break
+
+
+def read_image(path: str) -> Optional[np.ndarray]:
+    """读取BGR图片；通过imdecode读取，支持非ASCII路径"""
+    data = np.fromfile(path, dtype=np.uint8)
+    if data.size == 0:
+        return None
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+def _init_worker(templates_dir: str, ocr_backend: str, enable_ocr: bool, region_config: dict,
+                 threshold: float, match_mode: str, early_exit_margin: Optional[float]):
+    """工作进程初始化：加载模板库和OCR识别器"""
+    cv2.setNumThreads(1)
+    ocr = None
+    if enable_ocr:
+        try:
+            ocr = NumberOCR(backend=ocr_backend)
+        except Exception as e:
+            print(f"⚠️ 工作进程 {os.getpid()} OCR初始化失败: {e}")
+    _worker.update(
+        bank_set=TemplateBankSet(templates_dir),
+        ocr=ocr,
+        region_config=region_config,
+        regions_by_size={},
+        threshold=threshold,
+        match_mode=match_mode,
+        early_exit_margin=early_exit_margin,
+    )
+
+
+def recognize_image(image: np.ndarray) -> dict:
+    """在工作进程中识别一张整屏BGR画面，返回与run_fixed_regions_matching相同格式的结果"""
+    height, width = image.shape[:2]
+    regions = _worker["regions_by_size"].get((width, height))
+    if regions is None:
+        regions = regions_for_size(_worker["region_config"], width, height)
+        _worker["regions_by_size"][(width, height)] = regions
+
+    frame = Frame.from_image(image)
+    fixed_regions = regions["fixed_regions"]
+    region_imgs = [frame.view(region) for region in fixed_regions]
+    bank = _worker["bank_set"].for_regions(fixed_regions)
+    slot_hits = match_slots(bank, region_imgs, _worker["threshold"], mode=_worker["match_mode"],
+                            early_exit_margin=_worker["early_exit_margin"])
+
+    ocr = _worker["ocr"]
+    level_number = None
+    stage = None
+    if ocr is not None:
+        if regions["level_region"] is not None:
+            level_number = ocr.recognize_number(frame.view(regions["level_region"]))
+        if regions["stage_region"] is not None:
+            stage = ocr.recognize_stage(frame.view(regions["stage_region"]))
+
+    matches = []
+    match_details = []
+    for i, hits in enumerate(slot_hits):
+        if not hits:
+            continue
+        best = max(hits, key=lambda hit: hit["score"])
+        detail = {"score": best["score"], "bbox": full_slot_bbox(region_imgs[i])}
+        if "margin" in best:
+            detail["margin"] = best["margin"]
+        if level_number is not None:
+            detail["level"] = level_number
+            detail["ocr_confidence"] = 0.9  # 默认置信度
+        matches.append((i + 1, [hit["name"] for hit in hits]))
+        match_details.append(detail)
+
+    return {"matches": matches, "match_details": match_details, "stage": stage, "level": level_number}
+
+
+def prepare_template_cache(templates_dir: str, region_config: dict, width: int, height: int):
+    """按画面分辨率预先编译模板缓存，各工作进程直接内存映射，不必各自预处理模板"""
+    slot_size = slot_size_for_regions(regions_for_size(region_config, width, height)["fixed_regions"])
+    if slot_size is not None:
+        build_template_cache(templates_dir, slot_size)
+
+
+@contextmanager
+def worker_pool(workers: int, templates_dir: str, ocr_backend: str, enable_ocr: bool, region_config: dict,
+                threshold: float, match_mode: str, early_exit_margin: Optional[float]):
+    """创建已加载模板库和OCR的工作进程池，退出时等待进程结束"""
+    # 子进程以spawn方式启动，在导入numpy之前限制BLAS线程数（不影响主进程已加载的numpy）
+    saved_env = {name: os.environ.get(name) for name in _THREAD_ENV_VARS}
+    for name in _THREAD_ENV_VARS:
+        os.environ.setdefault(name, "1")
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(templates_dir, ocr_backend, enable_ocr, region_config, threshold, match_mode, early_exit_margin),
+    )
+    try:
+        yield pool
+    finally:
+        pool.shutdown(wait=True)
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def analyze_screenshot(path: str) -> dict:
+    """在工作进程中识别一张截图，返回可序列化的结果"""
+    try:
+        image = read_image(path)
+        if image is None:
+            return {"path": path, "error": "无法读取图片"}
+        result = recognize_image(image)
+        result.update(path=path, mtime=os.path.getmtime(path))
+        return result
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+
+def batch_mode(batch_dir: str, templates_dir: str = "tft_units", threshold: float = 0.68, match_mode: str = "all",
+               early_exit_margin: Optional[float] = None, ocr_backend: str = DEFAULT_OCR_BACKEND, enable_ocr: bool = True,
+               workers: Optional[int] = None, commit_every: int = 1000, config_path: str = "config.json",
+               recursive: bool = False, fixed_regions: Optional[List[Region]] = None,
+               ocr_region: Optional[Region] = None, db_path: str = "tft_stats.db"):
+    """批量分析截图文件夹并写入统计数据库
+
+    Args:
+        batch_dir: 截图文件夹
+        workers: 工作进程数，默认使用全部CPU核心
+        commit_every: 每多少张截图在一个事务中写入一次数据库
+        config_path: 提供fixed_regions和ocr_regions的配置文件
+        recursive: 是否包含子文件夹
+        fixed_regions, ocr_region: 配置文件不存在时使用的区域
+        db_path: 统计数据库路径
+    """
+    if not os.path.isdir(batch_dir):
+        raise SystemExit(f"截图文件夹不存在: {batch_dir}")
+
+    workers = workers or os.cpu_count() or 1
+    region_config = load_region_config(config_path, fixed_regions, ocr_region)
+
+    print(f"=== 批量分析: {batch_dir} ===")
+    print(f"工作进程: {workers}, 每 {commit_every} 张截图提交一次")
+
+    # 按第一张截图的分辨率预先编译模板缓存，各工作进程直接内存映射
+    first = next(iter_screenshots(batch_dir, recursive), None)
+    if first is None:
+        print("⚠️ 文件夹中没有截图")
+        return
+    first_image = read_image(first)
+    if first_image is not None:
+        height, width = first_image.shape[:2]
+        prepare_template_cache(templates_dir, region_config, width, height)
+    del first_image
+
+    db = TFTStatsDatabase(db_path)
+    session_id = db.start_session(templates_dir, threshold, 0)
+    buffer = []
+    processed = errors = recorded = 0
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal recorded
+        if buffer:
+            recorded += db.record_matches_batch(session_id, buffer)
+            buffer.clear()
+
+    def handle(result):
+        nonlocal processed, errors
+        processed += 1
+        if "error" in result:
+            errors += 1
+            print(f"⚠️ {result['path']}: {result['error']}")
+        else:
+            buffer.append((result["matches"], result["match_details"], result["stage"],
+                           datetime.fromtimestamp(result["mtime"])))
+            if len(buffer) >= commit_every:
+                flush()
+                elapsed = time.perf_counter() - start
+                print(f"📊 已处理 {processed} 张 ({processed / elapsed:.1f} 张/秒)")
+
+    try:
+        with worker_pool(workers, templates_dir, ocr_backend, enable_ocr, region_config,
+                         threshold, match_mode, early_exit_margin) as pool:
+            try:
+                # 按顺序收集结果；同时在途的任务数有上限，文件列表和结果都不会整体堆积在内存中
+                pending = deque()
+                max_in_flight = workers * 4
+                for path in iter_screenshots(batch_dir, recursive):
+                    pending.append(pool.submit(analyze_screenshot, path))
+                    if len(pending) >= max_in_flight:
+                        handle(pending.popleft().result())
+                while pending:
+                    handle(pending.popleft().result())
+            except KeyboardInterrupt:
+                print("\n检测到中断信号，保存已完成的结果...")
+                pool.shutdown(wait=False, cancel_futures=True)
+    finally:
+        flush()
+        db.end_session(session_id)
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"✅ 批量分析完成: {processed} 张截图, 失败 {errors} 张, 写入 {recorded} 个区域结果, "
+          f"用时 {elapsed:.1f}s ({rate:.1f} 张/秒)")
@@ -1,10 +1,205 @@
-from typing import Tuple, Optional
+import json
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Tuple, Optional, Iterable
 
 import numpy as np
 from mss import mss
 from PIL import Image
 
 
+Region = Tuple[int, int, int, int]
+
+
+# mss handles are bound to the thread that created them (GDI DCs on Windows),
+# so each worker thread keeps its own instance instead of opening a new one per grab.
+_thread_local = threading.local()
+
+
+def _get_sct():
+    """Return the calling thread's cached mss instance, creating it on first use."""
+    sct = getattr(_thread_local, "sct", None)
+    if sct is None:
+        sct = mss()
+        _thread_local.sct = sct
+    return sct
+
+
+class RegionSlice(NamedTuple):
+    """Precomputed (rows, cols) slices of a region inside an image; index with image[rs.rows, rs.cols]."""
+    rows: slice
+    cols: slice
+
+
+EMPTY_SLICE = RegionSlice(slice(0, 0), slice(0, 0))
+
+
+def union_bbox(regions: Iterable[Region]) -> Optional[Region]:
+    """
+    Return the (x, y, width, height) bounding box covering all regions, or None if empty.
+    """
+    regions = list(regions)
+    if not regions:
+        return None
+    x1 = min(r[0] for r in regions)
+    y1 = min(r[1] for r in regions)
+    x2 = max(r[0] + r[2] for r in regions)
+    y2 = max(r[1] + r[3] for r in regions)
+    return (x1, y1, x2 - x1, y2 - y1)
+
+
+def clip_region(region_xywh: Region, width: int, height: int) -> Optional[Region]:
+    """
+    Clip a region to a width x height area anchored at (0, 0); None if nothing is left.
+    """
+    x, y, w, h = region_xywh
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(width, x + w), min(height, y + h)
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return (x1, y1, x2 - x1, y2 - y1)
+
+
+def region_slice(region_xywh: Optional[Region], origin: Tuple[int, int] = (0, 0)) -> RegionSlice:
+    """
+    Slices of an already clipped monitor-relative region inside an image whose [0, 0] is at origin.
+    """
+    if region_xywh is None:
+        return EMPTY_SLICE
+    x, y, w, h = region_xywh
+    ox, oy = origin
+    return RegionSlice(slice(y - oy, y - oy + h), slice(x - ox, x - ox + w))
+
+
+class CaptureLayout:
+    """
+    Capture area and per-region slices for one fixed set of regions.
+
+    Built once per distinct region set by DisplayGeometry.layout(); every later
+    capture of the same regions reuses the mss area dict and the slices, so no
+    coordinate math or clamping happens per trigger.
+    """
+
+    def __init__(self, monitor: dict, regions: Optional[Iterable[Region]]):
+        regions = [tuple(region) for region in (regions or [])]
+        clipped = {region: clip_region(region, monitor["width"], monitor["height"]) for region in regions}
+
+        if not regions:
+            # Whole monitor
+            bbox = (0, 0, monitor["width"], monitor["height"])
+        else:
+            bbox = union_bbox(region for region in clipped.values() if region is not None)
+
+        if bbox is None:
+            # Every region lies outside the monitor
+            self.area = None
+            self.origin = regions[0][:2]
+        else:
+            x, y, w, h = bbox
+            self.area = {"left": monitor["left"] + x, "top": monitor["top"] + y, "width": w, "height": h}
+            self.origin = (x, y)
+        self.slices: Dict[Region, RegionSlice] = {
+            region: region_slice(clip, self.origin) for region, clip in clipped.items()
+        }
+
+
+class DisplayGeometry:
+    """
+    Monitor rectangles read once from the capture backend (mss), and the
+    configured regions scaled to the monitor in pixels.
+
+    Screen size, region coordinates and capture slices all come from the same
+    monitor rectangle that Frame.capture() grabs, so they cannot disagree on
+    multi-monitor or DPI-scaled setups.
+    """
+
+    # Distinct region sets whose layouts are cached
+    MAX_LAYOUTS = 64
+
+    def __init__(self, monitors: List[dict], monitor_index: int = 1):
+        """
+        monitors: mss-style monitor dicts (left, top, width, height); index 0 is the virtual screen
+        monitor_index: which monitor regions are relative to
+        """
+        self.monitors = [dict(monitor) for monitor in monitors]
+        self.monitor_index = monitor_index
+        self.monitor = self.monitors[monitor_index]
+        self.width = self.monitor["width"]
+        self.height = self.monitor["height"]
+        # name -> clipped monitor-relative region / slices into a full-monitor image
+        self.regions: Dict[str, Region] = {}
+        self.slices: Dict[str, RegionSlice] = {}
+        self._layouts: Dict[Tuple[Region, ...], CaptureLayout] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def scale(self, base_width: int, base_height: int) -> Tuple[float, float]:
+        """(scale_x, scale_y) from a base resolution to this monitor."""
+        return self.width / base_width, self.height / base_height
+
+    def resolve(self, relative_xywh: Iterable[float]) -> Region:
+        """
+        Convert (x, y, width, height) fractions of the monitor into pixels, clipped to the monitor.
+        Regions falling entirely outside keep their unclipped size so callers still see a box.
+        """
+        rel_x, rel_y, rel_w, rel_h = relative_xywh
+        region = (int(rel_x * self.width), int(rel_y * self.height),
+                  int(rel_w * self.width), int(rel_h * self.height))
+        return clip_region(region, self.width, self.height) or region
+
+    def add_region(self, name: str, region_xywh: Iterable[int]) -> Region:
+        """Register a monitor-relative region under name and precompute its slices."""
+        region = tuple(region_xywh)
+        clipped = clip_region(region, self.width, self.height)
+        with self._lock:
+            self.regions[name] = clipped or region
+            self.slices[name] = region_slice(clipped)
+        return self.regions[name]
+
+    def add_relative_region(self, name: str, relative_xywh: Iterable[float]) -> Region:
+        """Scale a relative region to the monitor and register it."""
+        return self.add_region(name, self.resolve(relative_xywh))
+
+    def slice_for(self, region_xywh: Region) -> RegionSlice:
+        """Slices of an arbitrary monitor-relative region inside a full-monitor image."""
+        region = tuple(region_xywh)
+        return region_slice(clip_region(region, self.width, self.height))
+
+    def layout(self, regions: Optional[Iterable[Region]] = None) -> CaptureLayout:
+        """Cached capture layout for a set of regions (None/empty means the whole monitor)."""
+        key = tuple(tuple(region) for region in (regions or []))
+        layout = self._layouts.get(key)
+        if layout is None:
+            layout = CaptureLayout(self.monitor, key)
+            with self._lock:
+                if len(self._layouts) >= self.MAX_LAYOUTS:
+                    self._layouts.clear()
+                self._layouts[key] = layout
+        return layout
+
+
+_geometries: Dict[int, DisplayGeometry] = {}
+_geometry_lock = threading.Lock()
+
+
+def get_display_geometry(monitor_index: int = 1, refresh: bool = False) -> DisplayGeometry:
+    """
+    Return the shared DisplayGeometry for a monitor, reading the monitor list from mss only once.
+
+    refresh=True re-reads the monitors (e.g. after the resolution changed).
+    """
+    with _geometry_lock:
+        geometry = _geometries.get(monitor_index)
+        if geometry is None or refresh:
+            geometry = DisplayGeometry(_get_sct().monitors, monitor_index)
+            _geometries[monitor_index] = geometry
+        return geometry
+
+
 def grab_fullscreen(monitor_index: int = 1) -> np.ndarray:
     """
     Capture a full-screen screenshot as a NumPy array in BGR order compatible with OpenCV.
@@ -12,39 +207,345 @@ def grab_fullscreen(monitor_index: int = 1) -> np.ndarray:
     On Windows with mss, monitor indexes usually start at 1. Index 1 is the primary display.
     Returns an array shaped (H, W, 3), dtype=uint8.
     """
-    with mss() as sct:
-        monitor = sct.monitors[monitor_index]
-        img = sct.grab(monitor)
-        # mss returns BGRA
-        arr = np.asarray(img, dtype=np.uint8)
-        # Drop alpha channel -> BGR
-        bgr = arr[:, :, :3]
-        return bgr.copy()
+    sct = _get_sct()
+    img = sct.grab(get_display_geometry(monitor_index).monitor)
+    # mss returns BGRA
+    arr = np.asarray(img, dtype=np.uint8)
+    # Drop alpha channel -> BGR
+    bgr = arr[:, :, :3]
+    return bgr.copy()
 
 
-def crop_region(image_bgr: np.ndarray, region_xywh: Tuple[int, int, int, int]) -> np.ndarray:
+def crop_region(image_bgr: np.ndarray, region: RegionSlice) -> np.ndarray:
     """
-    Crop a rectangular region from a BGR image.
+    Crop a region from a full-monitor BGR image using precomputed slices
+    (DisplayGeometry.slices[name] or DisplayGeometry.slice_for()).
 
-    region_xywh: (x, y, width, height)
-    Returns a new array view copy of the region in BGR order.
+    Returns a copy of the region in BGR order.
     """
-    x, y, w, h = region_xywh
-    x2, y2 = x + w, y + h
-    x = max(0, x)
-    y = max(0, y)
-    x2 = min(image_bgr.shape[1], x2)
-    y2 = min(image_bgr.shape[0], y2)
-    if x >= x2 or y >= y2:
-        return image_bgr[0:0, 0:0, :]
-    return image_bgr[y:y2, x:x2, :].copy()
+    return image_bgr[region.rows, region.cols, :].copy()
 
 
-def grab_region(region_xywh: Tuple[int, int, int, int], monitor_index: int = 1) -> np.ndarray:
+def grab_region(region_xywh: Region, monitor_index: int = 1) -> np.ndarray:
     """
     Convenience method: capture full screen then crop the region.
     """
     screen = grab_fullscreen(monitor_index=monitor_index)
-    return crop_region(screen, region_xywh)
+    return crop_region(screen, get_display_geometry(monitor_index).slice_for(region_xywh))
+
+
+class Frame:
+    """
+    A single screen capture shared by every region read during one trigger.
+
+    Coordinates passed to view() are monitor-relative, exactly like the ones in
+    config.json; the frame may hold only a sub-rectangle of the monitor (origin
+    tells where it starts), so all card slots and OCR boxes come from the same
+    game frame without grabbing the whole screen several times.
+    """
+
+    def __init__(self, image_bgr: np.ndarray, origin: Tuple[int, int] = (0, 0), timestamp: Optional[float] = None,
+                 layout: Optional[CaptureLayout] = None):
+        """
+        image_bgr: (H, W, 3) BGR pixels, may be a non-contiguous view of a BGRA buffer
+        origin: monitor-relative (x, y) of image_bgr[0, 0]
+        timestamp: capture time (time.time()), defaults to now
+        layout: the CaptureLayout the frame was grabbed with; its precomputed slices serve view()
+        """
+        self.image = image_bgr
+        self.origin = origin
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.layout = layout
+
+    @classmethod
+    def capture(cls, regions: Optional[Iterable[Region]] = None, monitor_index: int = 1) -> "Frame":
+        """
+        Grab the union bounding box of regions (or the whole monitor if regions is None/empty)
+        with a single screenshot.
+        """
+        layout = get_display_geometry(monitor_index).layout(regions)
+        if layout.area is None:
+            return cls(np.zeros((0, 0, 3), dtype=np.uint8), origin=layout.origin, layout=layout)
+
+        timestamp = time.time()
+        shot = _get_sct().grab(layout.area)
+        # mss returns BGRA; drop alpha without copying
+        bgra = np.asarray(shot, dtype=np.uint8)
+        return cls(bgra[:, :, :3], origin=layout.origin, timestamp=timestamp, layout=layout)
+
+    @classmethod
+    def from_image(cls, image_bgr: np.ndarray) -> "Frame":
+        """Wrap an existing full-screen BGR image (e.g. a loaded screenshot) as a Frame."""
+        return cls(image_bgr, origin=(0, 0))
+
+    def view(self, region_xywh: Region) -> np.ndarray:
+        """
+        Return a zero-copy view of a monitor-relative region, clipped to the captured area.
+
+        Regions the frame was captured for use the layout's precomputed slices;
+        other regions are clipped here. Returns an empty (0, 0, 3) array if the
+        region lies outside the frame.
+        """
+        if self.layout is not None:
+            rs = self.layout.slices.get(tuple(region_xywh))
+            if rs is not None:
+                return self.image[rs.rows, rs.cols, :]
+        x, y, w, h = region_xywh
+        ox, oy = self.origin
+        x1 = max(0, x - ox)
+        y1 = max(0, y - oy)
+        x2 = min(self.image.shape[1], x - ox + w)
+        y2 = min(self.image.shape[0], y - oy + h)
+        if x1 >= x2 or y1 >= y2:
+            return self.image[0:0, 0:0, :]
+        return self.image[y1:y2, x1:x2, :]
+
+
+def grab_frame(regions: Optional[Iterable[Region]] = None, monitor_index: int = 1) -> Frame:
+    """
+    Convenience method: capture one Frame covering all given regions.
+    """
+    return Frame.capture(regions, monitor_index=monitor_index)
+
+
+# ---------------------------------------------------------------------------
+# Record and replay
+#
+# A frame log is one preallocated file: a fixed-size header followed by
+# `capacity` fixed-size records. Each record holds a float64 timestamp and the
+# BGR crop of every logged region at its configured size, so the records map
+# onto a structured NumPy dtype and are read and written through np.memmap
+# without any per-frame (de)serialization.
+# ---------------------------------------------------------------------------
+
+FRAME_LOG_MAGIC = b"TFTFLOG1"
+FRAME_LOG_HEADER_SIZE = 4096
+# magic (8 bytes) | record count, int64 (8 bytes) | header JSON length, uint32 (4 bytes) | header JSON
+_FRAME_LOG_COUNT_OFFSET = 8
+_FRAME_LOG_JSON_OFFSET = 20
+
+# Region roles stored in the header, so replay knows which crops are card slots
+# and which one is the Level box regardless of how the recorder's config scaled them.
+ROLE_SLOTS = "slots"
+ROLE_LEVEL = "level"
+
+
+def _frame_log_dtype(regions: List[Region]) -> np.dtype:
+    fields = [("timestamp", "<f8")]
+    fields += [(f"r{i}", np.uint8, (h, w, 3)) for i, (_, _, w, h) in enumerate(regions)]
+    return np.dtype(fields)
+
+
+def _read_frame_log_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        head = f.read(FRAME_LOG_HEADER_SIZE)
+    if head[:8] != FRAME_LOG_MAGIC:
+        raise ValueError(f"Not a frame log: {path}")
+    length = int(np.frombuffer(head, dtype="<u4", count=1, offset=16)[0])
+    header = json.loads(head[_FRAME_LOG_JSON_OFFSET:_FRAME_LOG_JSON_OFFSET + length].decode("utf-8"))
+    header["regions"] = [tuple(region) for region in header["regions"]]
+    header["roles"] = {role: [tuple(region) for region in regions]
+                       for role, regions in header.get("roles", {}).items()}
+    return header
+
+
+class FrameRecorder:
+    """
+    Append the crops of fixed regions from captured frames to a memory-mapped frame log.
+
+    The file is preallocated for `capacity` records when created; record() only
+    copies the crops into the mapped record and bumps the count, so recording
+    costs a few memcpy's per trigger. When the log is full, record() returns False.
+    """
+
+    def __init__(self, path: str, regions: Iterable[Region], capacity: int = 1000, append: bool = True,
+                 roles: Optional[Dict[str, Iterable[Region]]] = None):
+        """
+        path: log file; an existing log with the same regions and roles is appended to when append
+        is True, anything else at path is replaced
+        regions: monitor-relative (x, y, width, height) regions stored for every frame
+        capacity: number of records preallocated for a new log
+        roles: which of the regions play which part, e.g. {ROLE_SLOTS: [...], ROLE_LEVEL: [level_region]}
+        """
+        self.path = path
+        self.regions: List[Region] = [tuple(region) for region in regions]
+        self.roles: Dict[str, List[Region]] = {
+            role: [tuple(region) for region in role_regions] for role, role_regions in (roles or {}).items()
+        }
+        for role, role_regions in self.roles.items():
+            missing = [region for region in role_regions if region not in self.regions]
+            if missing:
+                raise ValueError(f"Role {role!r} refers to regions that are not logged: {missing}")
+        self._lock = threading.Lock()
+
+        header = None
+        if append and os.path.exists(path):
+            try:
+                header = _read_frame_log_header(path)
+            except (OSError, ValueError):
+                header = None
+            if header is not None and (header["regions"] != self.regions or header["roles"] != self.roles):
+                header = None
+
+        if header is None:
+            self._create(capacity)
+            header = _read_frame_log_header(path)
+        self.capacity = header["capacity"]
+        self.dtype = _frame_log_dtype(self.regions)
+        self._count = np.memmap(path, dtype="<i8", mode="r+", offset=_FRAME_LOG_COUNT_OFFSET, shape=(1,))
+        self._records = np.memmap(path, dtype=self.dtype, mode="r+", offset=FRAME_LOG_HEADER_SIZE,
+                                  shape=(self.capacity,))
+
+    def _create(self, capacity: int):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        dtype = _frame_log_dtype(self.regions)
+        payload = json.dumps({
+            "version": 2,
+            "capacity": int(capacity),
+            "regions": [list(region) for region in self.regions],
+            "roles": {role: [list(region) for region in regions] for role, regions in self.roles.items()},
+            "created": time.time(),
+        }).encode("utf-8")
+        if _FRAME_LOG_JSON_OFFSET + len(payload) > FRAME_LOG_HEADER_SIZE:
+            raise ValueError("Too many regions for the frame log header")
+        with open(self.path, "wb") as f:
+            f.write(FRAME_LOG_MAGIC)
+            f.write(np.array([0], dtype="<i8").tobytes())
+            f.write(np.array([len(payload)], dtype="<u4").tobytes())
+            f.write(payload)
+            # Preallocate (sparse where the filesystem supports it)
+            f.truncate(FRAME_LOG_HEADER_SIZE + capacity * dtype.itemsize)
+
+    def __len__(self) -> int:
+        return int(self._count[0])
+
+    @property
+    def full(self) -> bool:
+        return len(self) >= self.capacity
+
+    def record(self, frame: Frame, timestamp: Optional[float] = None) -> bool:
+        """Append the frame's crops of the logged regions; False if the log is full."""
+        with self._lock:
+            index = int(self._count[0])
+            if index >= self.capacity:
+                return False
+            record = self._records[index]
+            record["timestamp"] = frame.timestamp if timestamp is None else timestamp
+            for i, region in enumerate(self.regions):
+                target = record[f"r{i}"]
+                crop = frame.view(region)
+                if crop.shape == target.shape:
+                    target[...] = crop
+                else:
+                    # Clipped at the screen edge: keep the visible part, zero the rest
+                    target[...] = 0
+                    h, w = min(crop.shape[0], target.shape[0]), min(crop.shape[1], target.shape[1])
+                    target[:h, :w] = crop[:h, :w]
+            # Publish the record only after its pixels are written
+            self._count[0] = index + 1
+            return True
+
+    def flush(self):
+        with self._lock:
+            self._records.flush()
+            self._count.flush()
+
+    def close(self):
+        """Flush and unmap the log."""
+        self.flush()
+        self._records = None
+        self._count = None
+
+
+class LoggedFrame(Frame):
+    """A Frame replayed from a frame log; view() returns the logged crop of a region (zero-copy)."""
+
+    def __init__(self, crops: Dict[Region, np.ndarray], timestamp: float):
+        super().__init__(np.zeros((0, 0, 3), dtype=np.uint8), origin=(0, 0), timestamp=timestamp)
+        self.crops = crops
+
+    def view(self, region_xywh: Region) -> np.ndarray:
+        """Return the logged crop of region_xywh, or an empty (0, 0, 3) array if it was not logged."""
+        crop = self.crops.get(tuple(region_xywh))
+        if crop is None:
+            return self.image
+        return crop
+
+
+class FrameLog:
+    """Read-only, memory-mapped view of a frame log written by FrameRecorder."""
+
+    def __init__(self, path: str):
+        header = _read_frame_log_header(path)
+        self.path = path
+        self.regions: List[Region] = header["regions"]
+        self.roles: Dict[str, List[Region]] = header["roles"]
+        self.capacity = header["capacity"]
+        count = np.fromfile(path, dtype="<i8", count=1, offset=_FRAME_LOG_COUNT_OFFSET)[0]
+        self.count = int(min(count, self.capacity))
+        self.dtype = _frame_log_dtype(self.regions)
+        self._records = np.memmap(path, dtype=self.dtype, mode="r", offset=FRAME_LOG_HEADER_SIZE,
+                                  shape=(self.capacity,))[:self.count]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> LoggedFrame:
+        record = self._records[index]
+        crops = {region: record[f"r{i}"] for i, region in enumerate(self.regions)}
+        return LoggedFrame(crops, float(record["timestamp"]))
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    @property
+    def slot_regions(self) -> List[Region]:
+        """
+        The logged card slot regions. Logs written without roles (format version 1) stored the
+        slots followed by the Level box, so all regions but the last are taken as slots.
+        """
+        if ROLE_SLOTS in self.roles:
+            return list(self.roles[ROLE_SLOTS])
+        return self.regions[:-1] if len(self.regions) > 1 else list(self.regions)
+
+    @property
+    def level_region(self) -> Optional[Region]:
+        """The logged Level OCR region, or None if the log has none."""
+        if ROLE_LEVEL in self.roles:
+            return self.roles[ROLE_LEVEL][0] if self.roles[ROLE_LEVEL] else None
+        if ROLE_SLOTS in self.roles or len(self.regions) < 2:
+            return None
+        return self.regions[-1]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return np.asarray(self._records["timestamp"])
+
+
+class ReplayCapture:
+    """
+    Capture backend that returns logged frames in order instead of grabbing the screen.
+
+    Has grab_frame's signature, so it can be passed wherever a capture function is
+    expected (e.g. RecognitionScheduler(capture=...)). The requested regions are
+    ignored; regions missing from the log view as empty arrays.
+    """
+
+    def __init__(self, log: FrameLog, loop: bool = False):
+        self.log = log
+        self.loop = loop
+        self.position = 0
 
+    @property
+    def exhausted(self) -> bool:
+        return not self.loop and self.position >= len(self.log)
 
+    def __call__(self, regions: Optional[Iterable[Region]] = None, monitor_index: int = 1) -> Frame:
+        if len(self.log) == 0 or self.exhausted:
+            raise EOFError(f"Frame log exhausted: {self.log.path}")
+        frame = self.log[self.position % len(self.log)]
+        self.position += 1
+        return frame
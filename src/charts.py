@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+图表渲染模块 - 复用matplotlib artist并通过blit增量重绘GUI中的饼图和柱状图
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# 各费用对应的颜色
+COST_COLORS = {
+    1: '#677380',    # 1费
+    2: '#069926',    # 2费
+    3: '#09529c',    # 3费
+    4: '#b70cc2',    # 4费
+    5: '#c77712',    # 5费
+}
+DEFAULT_COLOR = '#95a5a6'
+
+
+class BlitManager:
+    """缓存画布背景，只重绘animated artist
+
+    每次完整绘制（draw_event）后保存不含animated artist的背景，
+    数据变化时恢复背景、重绘这些artist并blit到屏幕，无需重新渲染坐标轴和文字。
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.artists: List = []
+        self._background = None
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def set_artists(self, artists):
+        """设置需要增量重绘的artist"""
+        self.artists = list(artists)
+        for artist in self.artists:
+            artist.set_animated(True)
+
+    def _on_draw(self, event):
+        """完整绘制后缓存背景并画上animated artist"""
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        figure = self.canvas.figure
+        for artist in self.artists:
+            figure.draw_artist(artist)
+
+    def full_redraw(self):
+        """坐标轴或布局变化时请求一次完整绘制"""
+        self._background = None
+        self.canvas.draw_idle()
+
+    def blit(self):
+        """只重绘animated artist；尚无背景缓存时退回完整绘制"""
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+
+class CostPieChart:
+    """费用分布饼图
+
+    费用集合不变时只更新扇形角度和文字位置，费用集合变化时才重建。
+    """
+
+    def __init__(self, ax, canvas, facecolor: str = '#34495e'):
+        self.ax = ax
+        self.facecolor = facecolor
+        self.blitter = BlitManager(canvas)
+        self._costs: Optional[List[int]] = None
+        self._wedges = []
+        self._texts = []
+        self._autotexts = []
+
+    def show_message(self, message: str, title: Optional[str] = None):
+        """清空饼图并显示提示文字"""
+        self.ax.clear()
+        self.ax.set_facecolor(self.facecolor)
+        self.ax.text(0.5, 0.5, message, ha='center', va='center',
+                     transform=self.ax.transAxes, color='white', fontsize=12)
+        if title:
+            self.ax.set_title(title, color='white', fontsize=12)
+        self._costs = None
+        self._wedges, self._texts, self._autotexts = [], [], []
+        self.blitter.set_artists([])
+        self.blitter.full_redraw()
+
+    def update(self, cost_data: Dict[int, int]):
+        """按 {费用: 次数} 更新饼图"""
+        costs = list(cost_data.keys())
+        counts = list(cost_data.values())
+        total = sum(counts)
+        if not costs or total <= 0:
+            return
+
+        if costs != self._costs:
+            self._rebuild(costs, counts)
+            return
+
+        # 与Axes.pie相同的布局：从0度开始逆时针排列，标签在1.1倍半径处，百分比在0.6倍半径处
+        theta1 = 0.0
+        for wedge, text, autotext, count in zip(self._wedges, self._texts, self._autotexts, counts):
+            frac = count / total
+            theta2 = theta1 + 360.0 * frac
+            wedge.set_theta1(theta1)
+            wedge.set_theta2(theta2)
+
+            thetam = math.radians((theta1 + theta2) / 2.0)
+            xt, yt = 1.1 * math.cos(thetam), 1.1 * math.sin(thetam)
+            text.set_position((xt, yt))
+            text.set_horizontalalignment('left' if xt > 0 else 'right')
+            autotext.set_position((0.6 * math.cos(thetam), 0.6 * math.sin(thetam)))
+            autotext.set_text('%1.1f%%' % (100.0 * frac))
+            theta1 = theta2
+
+        self.blitter.blit()
+
+    def _rebuild(self, costs: Sequence[int], counts: Sequence[int]):
+        self.ax.clear()
+        self.ax.set_facecolor(self.facecolor)
+        colors = [COST_COLORS.get(cost, DEFAULT_COLOR) for cost in costs]
+        wedges, texts, autotexts = self.ax.pie(counts, labels=costs, autopct='%1.1f%%', colors=colors)
+
+        # 设置文本颜色
+        for text in texts:
+            text.set_color('white')
+        for autotext in autotexts:
+            autotext.set_color('white')
+
+        self._costs = list(costs)
+        self._wedges, self._texts, self._autotexts = wedges, texts, autotexts
+        self.blitter.set_artists(list(wedges) + list(texts) + list(autotexts))
+        self.blitter.full_redraw()
+
+
+class UnitBarChart:
+    """棋子出现次数柱状图
+
+    棋子列表不变时只修改柱子高度；纵轴留有余量，超出时才完整重绘。
+    """
+
+    def __init__(self, ax, canvas, facecolor: str = '#34495e', headroom: float = 1.25):
+        self.ax = ax
+        self.facecolor = facecolor
+        self.headroom = headroom
+        self.blitter = BlitManager(canvas)
+        self._names: Optional[List[str]] = None
+        self._bars = []
+
+    def show_message(self, message: str, title: Optional[str] = None):
+        """清空柱状图并显示提示文字"""
+        self.ax.clear()
+        self.ax.set_facecolor(self.facecolor)
+        self.ax.text(0.5, 0.5, message, ha='center', va='center',
+                     transform=self.ax.transAxes, color='white', fontsize=12)
+        if title:
+            self.ax.set_title(title, color='white', fontsize=12)
+        self.ax.set_xlabel('Units Name', color='white')
+        self.ax.set_ylabel('Count', color='white')
+        self._names = None
+        self._bars = []
+        self.blitter.set_artists([])
+        self.blitter.full_redraw()
+
+    def update(self, unit_data: Dict[str, Tuple[int, int]]):
+        """按 {unit_name: (次数, 费用)} 更新柱状图"""
+        names = list(unit_data.keys())
+        counts = [row[0] for row in unit_data.values()]
+        costs = [row[1] for row in unit_data.values()]
+        if not names:
+            return
+
+        if names != self._names:
+            self._rebuild(names, counts, costs)
+            return
+
+        for bar, count in zip(self._bars, counts):
+            bar.set_height(count)
+
+        if max(counts) > self.ax.get_ylim()[1]:
+            # 超出纵轴范围，需要重新绘制刻度
+            self._set_ylim(counts)
+            self.blitter.full_redraw()
+        else:
+            self.blitter.blit()
+
+    def _set_ylim(self, counts: Sequence[int]):
+        self.ax.set_ylim(0, max(1, math.ceil(max(counts) * self.headroom)))
+
+    def _rebuild(self, names: Sequence[str], counts: Sequence[int], costs: Sequence[int]):
+        self.ax.clear()
+        self.ax.set_facecolor(self.facecolor)
+
+        # 为每个条形设置对应的颜色
+        colors = [COST_COLORS.get(cost, DEFAULT_COLOR) for cost in costs]
+        bars = self.ax.bar(names, counts, color=colors, alpha=0.8, edgecolor='white', linewidth=1)
+
+        # 设置图表属性
+        self.ax.set_xlabel('Units Name', color='white')
+        self.ax.set_ylabel('Count', color='white')
+        self.ax.tick_params(colors='white')
+        self.ax.tick_params(axis='x', rotation=45)
+        self.ax.grid(True, alpha=0.2, color='white', axis='y')
+        self._set_ylim(counts)
+
+        self._names = list(names)
+        self._bars = list(bars)
+        self.blitter.set_artists(self._bars)
+        self.blitter.full_redraw()
@@ -8,6 +8,7 @@ import os
 import json
 from datetime import datetime
 from typing import List, Tuple, Dict, Any
+from contextlib import contextmanager
 import threading
 
 class TFTStatsDatabase:
@@ -20,15 +21,100 @@ class TFTStatsDatabase:
             db_path: 数据库文件路径
         """
         self.db_path = db_path
-        self.lock = threading.Lock()  # 线程安全锁
+        self.lock = threading.Lock()  # 写连接的线程安全锁
+        
+        # 长期持有的写连接（WAL模式），所有写操作在self.lock下串行执行
+        self._conn = self._open_writer()
+        
+        # 每个线程各自的只读连接，WAL模式下读不会阻塞写
+        self._local = threading.local()
+        self._read_connections = []
+        self._read_lock = threading.Lock()
+        
         self._init_database()
     
+    def _open_writer(self) -> sqlite3.Connection:
+        """打开写连接并设置性能相关的PRAGMA"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL下NORMAL只在检查点时fsync，断电最多丢失最近的事务，不会损坏数据库
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=-16000')  # 约16MB页缓存
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    def get_read_connection(self) -> sqlite3.Connection:
+        """获取当前线程的只读连接（首次调用时创建并缓存）
+        
+        供图表、摘要等查询使用，不需要持有self.lock。
+        
+        Returns:
+            只读的sqlite3连接
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # urllib.request导入较慢，只在首次打开只读连接时导入
+            from urllib.request import pathname2url
+            uri = 'file:' + pathname2url(os.path.abspath(self.db_path)) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=128)
+            conn.execute('PRAGMA cache_size=-8000')
+            self._local.conn = conn
+            with self._read_lock:
+                self._read_connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def _write_transaction(self):
+        """持有写锁执行一个事务，正常结束时提交，异常时回滚
+        
+        Yields:
+            写连接上的cursor
+        """
+        with self.lock:
+            try:
+                yield self._conn.cursor()
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+    
+    @contextmanager
+    def read_snapshot(self):
+        """在当前线程的只读连接上开启读事务
+        
+        块内的多条查询看到同一份一致的数据，且不会阻塞写连接。
+        
+        Yields:
+            只读连接上的cursor
+        """
+        conn = self.get_read_connection()
+        conn.execute('BEGIN')
+        try:
+            yield conn.cursor()
+        finally:
+            conn.rollback()
+    
+    def close(self):
+        """关闭写连接和所有只读连接"""
+        with self._read_lock:
+            for conn in self._read_connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._read_connections.clear()
+        self._local = threading.local()
+        
+        with self.lock:
+            if self._conn is not None:
+                # 让SQLite根据本次运行的查询情况更新统计信息
+                self._conn.execute('PRAGMA optimize')
+                self._conn.close()
+                self._conn = None
+    
     def _init_database(self):
         """初始化数据库表结构"""
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
+        with self._write_transaction() as cursor:
             # 创建会话表 - 记录每次运行程序的信息
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS sessions (
@@ -55,6 +141,7 @@ class TFTStatsDatabase:
                     unit_name TEXT NOT NULL,  -- 单位名称（不含费用和扩展名）
                     cost INTEGER NOT NULL,    -- 费用
                     match_score REAL NOT NULL,
+                    match_margin REAL,  -- 与次优模板的分差（best匹配模式）
                     match_bbox TEXT,  -- JSON格式的边界框信息
                     level INTEGER,  -- 当前等级
                     ocr_confidence REAL,  -- OCR识别置信度
@@ -75,7 +162,7 @@ class TFTStatsDatabase:
                     first_seen TIMESTAMP,
                     last_seen TIMESTAMP,
                     avg_score REAL DEFAULT 0.0,
-                    region_distribution TEXT  -- JSON格式的区域分布统计
+                    region_distribution TEXT  -- 已弃用：版本2起区域分布存于template_region_stats，只在升级旧库时读取一次
                 )
             ''')
             
@@ -85,19 +172,121 @@ class TFTStatsDatabase:
                 ON template_stats (unit_name, cost, level)
             ''')
             
-            conn.commit()
-            conn.close()
+            # 按PRAGMA user_version逐级升级已有数据库
+            migrations = [
+                self._migrate_v1_match_margin,
+                self._migrate_v2_region_stats,
+                self._migrate_v3_match_indexes,
+                self._migrate_v4_session_perf,
+                self._migrate_v5_drop_match_indexes,
+            ]
+            cursor.execute('PRAGMA user_version')
+            version = cursor.fetchone()[0]
+            for migrate in migrations[version:]:
+                migrate(cursor)
+            if version < len(migrations):
+                cursor.execute(f'PRAGMA user_version = {len(migrations)}')
+                print(f"📊 数据库结构已升级: 版本 {version} -> {len(migrations)}")
+    
+    def _migrate_v1_match_margin(self, cursor):
+        """版本1: matches表增加match_margin列"""
+        cursor.execute('PRAGMA table_info(matches)')
+        match_columns = {row[1] for row in cursor.fetchall()}
+        if 'match_margin' not in match_columns:
+            cursor.execute('ALTER TABLE matches ADD COLUMN match_margin REAL')
+    
+    def _migrate_v2_region_stats(self, cursor):
+        """版本2: 创建区域分布表，取代template_stats.region_distribution中的JSON，递增时无需解析"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'template_region_stats'")
+        region_table_exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS template_region_stats (
+                unit_name TEXT NOT NULL,
+                cost INTEGER NOT NULL,
+                level INTEGER NOT NULL,   -- 当前等级，0 表示未识别
+                region_number INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (unit_name, cost, level, region_number)
+            ) WITHOUT ROWID
+        ''')
+        if not region_table_exists:
+            self._migrate_region_distribution(cursor)
+    
+    def _migrate_v3_match_indexes(self, cursor):
+        """版本3: 为matches表的会话查询和触发次数查询创建索引"""
+        # 会话摘要、GUI会话摘要按session_id过滤；截图序列分布和去重计数直接用索引顺序
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_matches_session_sequence
+            ON matches (session_id, capture_sequence)
+        ''')
+        # get_latest_capture_sequence 的MAX() 和 CSV导出的排序扫描
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_matches_sequence_unit
+            ON matches (capture_sequence, unit_name, cost, level, stage)
+        ''')
+        cursor.execute('ANALYZE matches')
+    
+    def _migrate_v4_session_perf(self, cursor):
+        """版本4: 创建会话性能表，记录每个会话各流水线阶段的耗时分位数"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS session_perf (
+                session_id INTEGER NOT NULL,
+                stage TEXT NOT NULL,      -- 流水线阶段: capture, crop, score, ocr, db_write, chart
+                samples INTEGER NOT NULL,
+                p50_ms REAL,
+                p95_ms REAL,
+                p99_ms REAL,
+                mean_ms REAL,
+                max_ms REAL,
+                PRIMARY KEY (session_id, stage),
+                FOREIGN KEY (session_id) REFERENCES sessions (id)
+            ) WITHOUT ROWID
+        ''')
+    
+    def _migrate_v5_drop_match_indexes(self, cursor):
+        """版本5: 删除旧版本3创建、查询计划中可由idx_matches_session_sequence代替的索引
+        
+        按区域、模板、费用分组的摘要查询只涉及单个会话的行，临时B树分组的开销
+        小于每次写入多维护三个索引。
+        """
+        for name in ('idx_matches_session_region', 'idx_matches_session_template', 'idx_matches_session_cost'):
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+    
+    def _migrate_region_distribution(self, cursor):
+        """把旧数据库template_stats.region_distribution中的JSON迁移到template_region_stats"""
+        cursor.execute('''
+            SELECT unit_name, cost, level, region_distribution
+            FROM template_stats
+            WHERE region_distribution IS NOT NULL
+        ''')
+        rows = []
+        for unit_name, cost, level, region_dist in cursor.fetchall():
+            try:
+                dist = json.loads(region_dist)
+            except (TypeError, ValueError):
+                continue
+            for region_num, count in dist.items():
+                rows.append((unit_name, cost, level or 0, int(region_num), count))
+        
+        cursor.executemany('''
+            INSERT INTO template_region_stats (unit_name, cost, level, region_number, count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(unit_name, cost, level, region_number) DO UPDATE SET
+                count = count + excluded.count
+        ''', rows)
     
     def clear_all_data(self):
         """清除所有表的数据但保留表结构"""
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._conn
             cursor = conn.cursor()
             
             try:
                 # 清除所有表的数据
                 cursor.execute('DELETE FROM matches')
                 cursor.execute('DELETE FROM template_stats')
+                cursor.execute('DELETE FROM template_region_stats')
+                cursor.execute('DELETE FROM session_perf')
                 cursor.execute('DELETE FROM sessions')
                 
                 # 重置自增ID
@@ -110,8 +299,6 @@ class TFTStatsDatabase:
             except Exception as e:
                 print(f"❌ 清除数据失败: {e}")
                 conn.rollback()
-            finally:
-                conn.close()
 
     def start_session(self, templates_dir: str, threshold: float, monitor_index: int) -> int:
         """开始一个新的统计会话
@@ -124,21 +311,16 @@ class TFTStatsDatabase:
         Returns:
             会话ID
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
+        with self._write_transaction() as cursor:
             cursor.execute('''
                 INSERT INTO sessions (start_time, templates_dir, threshold, monitor_index)
                 VALUES (?, ?, ?, ?)
             ''', (datetime.now(), templates_dir, threshold, monitor_index))
             
             session_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            print(f"📊 Started new statistics session (ID: {session_id})")
-            return session_id
+        
+        print(f"📊 Started new statistics session (ID: {session_id})")
+        return session_id
     
     def end_session(self, session_id: int):
         """结束统计会话
@@ -146,20 +328,14 @@ class TFTStatsDatabase:
         Args:
             session_id: 会话ID
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
+        with self._write_transaction() as cursor:
             cursor.execute('''
                 UPDATE sessions 
                 SET end_time = ?, status = 'completed'
                 WHERE id = ?
             ''', (datetime.now(), session_id))
-            
-            conn.commit()
-            conn.close()
-            
-            print(f"📊 Statistics session {session_id} ended")
+        
+        print(f"📊 Statistics session {session_id} ended")
     
     def record_matches(self, session_id: int, matches: List[Tuple[int, List[str]]], 
                        match_details: List[Dict[str, Any]] = None, stage: int = None):
@@ -173,59 +349,106 @@ class TFTStatsDatabase:
         if not matches:
             return
         
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 更新会话的截图次数
-            cursor.execute('''
-                UPDATE sessions 
-                SET total_captures = total_captures + 1
-                WHERE id = ?
-            ''', (session_id,))
-            
-            # 获取当前会话的截图次数，用于设置capture_sequence
-            cursor.execute('''
-                SELECT total_captures FROM sessions WHERE id = ?
-            ''', (session_id,))
-            current_capture_count = cursor.fetchone()[0]
+        with self._write_transaction() as cursor:
+            self._write_captures(cursor, session_id, [(matches, match_details, stage, None)])
+        
+        print(f"📊 Recorded {len(matches)} region match results with OCR data")
+    
+    def record_matches_batch(self, session_id: int, captures: List[Tuple[Any, ...]]) -> int:
+        """在一个事务中记录多次截图的匹配结果（批量导入用）
+        
+        Args:
+            session_id: 会话ID
+            captures: [(matches, match_details, stage, capture_time), ...]，前三项同record_matches；
+                      capture_time为None时使用当前时间
             
-            # 记录每次匹配
+        Returns:
+            写入的区域结果数
+        """
+        with self._write_transaction() as cursor:
+            return self._write_captures(cursor, session_id, captures)
+    
+    def _write_captures(self, cursor, session_id: int, captures: List[Tuple[Any, ...]]) -> int:
+        """把若干次截图的匹配结果写入当前事务，没有匹配的截图不计数"""
+        captures = [capture for capture in captures if capture[0]]
+        if not captures:
+            return 0
+        
+        # 更新会话的截图次数
+        cursor.execute('''
+            UPDATE sessions 
+            SET total_captures = total_captures + ?
+            WHERE id = ?
+        ''', (len(captures), session_id))
+        
+        # 获取当前会话的截图次数，用于设置capture_sequence
+        cursor.execute('''
+            SELECT total_captures FROM sessions WHERE id = ?
+        ''', (session_id,))
+        first_sequence = cursor.fetchone()[0] - len(captures) + 1
+        
+        # 先在内存中汇总全部截图的结果，再批量写入
+        now = datetime.now()
+        match_rows = []
+        stats = {}           # (unit_name, cost, level) -> [template_name, 次数, 分数和]
+        region_counts = {}   # (unit_name, cost, level, region_num) -> 次数
+        region_results = 0
+        
+        for sequence, (matches, match_details, stage, capture_time) in enumerate(captures, first_sequence):
+            capture_time = capture_time or now
+            region_results += len(matches)
             for i, (region_num, template_names) in enumerate(matches):
+                # 获取匹配详情
+                score = 1.0  # 默认分数
+                margin = None  # 与次优模板的分差
+                bbox = "{}"  # 默认边界框
+                level_number = None  # 默认OCR结果
+                ocr_confidence = None  # 默认OCR置信度
+                
+                if match_details and i < len(match_details):
+                    detail = match_details[i]
+                    if 'score' in detail:
+                        score = detail['score']
+                    if 'margin' in detail:
+                        margin = detail['margin']
+                    if 'bbox' in detail:
+                        bbox = json.dumps(detail['bbox'])
+                    if 'level' in detail:
+                        level_number = detail['level']
+                    if 'ocr_confidence' in detail:
+                        ocr_confidence = detail['ocr_confidence']
+                
                 for template_name in template_names:
                     # 解析模板名称，提取费用和单位名称
                     unit_name, cost = self._parse_template_name(template_name)
                     
-                    # 获取匹配详情
-                    score = 1.0  # 默认分数
-                    bbox = "{}"  # 默认边界框
-                    level_number = None  # 默认OCR结果
-                    ocr_confidence = None  # 默认OCR置信度
-                    
-                    if match_details and i < len(match_details):
-                        detail = match_details[i]
-                        if 'score' in detail:
-                            score = detail['score']
-                        if 'bbox' in detail:
-                            bbox = json.dumps(detail['bbox'])
-                        if 'level' in detail:
-                            level_number = detail['level']
-                        if 'ocr_confidence' in detail:
-                            ocr_confidence = detail['ocr_confidence']
+                    match_rows.append((session_id, capture_time, sequence, region_num, template_name, unit_name, cost,
+                                       score, margin, bbox, level_number, ocr_confidence, stage))
                     
-                    cursor.execute('''
-                        INSERT INTO matches (session_id, capture_time, capture_sequence, region_number, 
-                                          template_name, unit_name, cost, match_score, match_bbox, level, ocr_confidence, stage)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (session_id, datetime.now(), current_capture_count, region_num, template_name, unit_name, cost, score, bbox, level_number, ocr_confidence, stage))
+                    entry = stats.setdefault((unit_name, cost, level_number), [template_name, 0, 0.0])
+                    entry[1] += 1
+                    entry[2] += score
                     
-                    # 更新模板统计
-                    self._update_template_stats(cursor, template_name, unit_name, cost, region_num, score, level_number)
-            
-            conn.commit()
-            conn.close()
-            
-            print(f"📊 Recorded {len(matches)} region match results with OCR data")
+                    region_key = (unit_name, cost, level_number or 0, region_num)
+                    region_counts[region_key] = region_counts.get(region_key, 0) + 1
+        
+        cursor.executemany('''
+            INSERT INTO matches (session_id, capture_time, capture_sequence, region_number, 
+                              template_name, unit_name, cost, match_score, match_margin, match_bbox, level, ocr_confidence, stage)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', match_rows)
+        
+        # 更新模板统计
+        self._upsert_template_stats(cursor, stats, now)
+        
+        # 更新区域分布
+        cursor.executemany('''
+            INSERT INTO template_region_stats (unit_name, cost, level, region_number, count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(unit_name, cost, level, region_number) DO UPDATE SET
+                count = count + excluded.count
+        ''', [key + (count,) for key, count in region_counts.items()])
+        return region_results
     
     def _parse_template_name(self, template_name: str) -> Tuple[str, int]:
         """解析模板名称，提取单位名称和费用
@@ -262,76 +485,80 @@ class TFTStatsDatabase:
             print(f"⚠️ 解析模板名称 '{template_name}' 时出错: {e}")
             return template_name, 0
     
-    def _update_template_stats(self, cursor, template_name: str, unit_name: str, cost: int, region_num: int, score: float, level_number: int = None):
-        """更新模板统计信息"""
-        # 根据unit_name、cost和level_number的组合来查找记录
-        if level_number is not None:
-            cursor.execute('''
-                SELECT * FROM template_stats 
-                WHERE unit_name = ? AND cost = ? AND level = ?
-            ''', (unit_name, cost, level_number))
-        else:
-            # 如果没有OCR数字，仍然使用template_name查找（向后兼容）
-            cursor.execute('SELECT * FROM template_stats WHERE template_name = ?', (template_name,))
-        
-        existing = cursor.fetchone()
+    def _upsert_template_stats(self, cursor, stats: Dict[Tuple[str, int, Any], List[Any]], now: datetime):
+        """批量更新模板统计信息
         
-        if existing:
-            # 更新现有记录
+        Args:
+            cursor: 写连接上的cursor
+            stats: {(unit_name, cost, level): [template_name, 本次次数, 本次分数和]}
+            now: 本次记录时间
+        """
+        leveled = []
+        unleveled = []
+        for (unit_name, cost, level_number), (template_name, count, score_sum) in stats.items():
+            row = (template_name, unit_name, cost, level_number, count, now, now, score_sum / count)
             if level_number is not None:
-                cursor.execute('''
-                    UPDATE template_stats 
-                    SET total_matches = total_matches + 1,
-                        last_seen = ?,
-                        avg_score = (avg_score * total_matches + ?) / (total_matches + 1)
-                    WHERE unit_name = ? AND cost = ? AND level = ?
-                ''', (datetime.now(), score, unit_name, cost, level_number))
+                leveled.append(row)
             else:
+                unleveled.append(row)
+        
+        # 有Level的记录由唯一索引(unit_name, cost, level)直接UPSERT
+        cursor.executemany('''
+            INSERT INTO template_stats (template_name, unit_name, cost, level, total_matches,
+                                        first_seen, last_seen, avg_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(unit_name, cost, level) DO UPDATE SET
+                total_matches = total_matches + excluded.total_matches,
+                last_seen = excluded.last_seen,
+                avg_score = (avg_score * total_matches + excluded.avg_score * excluded.total_matches)
+                            / (total_matches + excluded.total_matches)
+        ''', leveled)
+        
+        # 唯一索引中NULL互不冲突，没有Level的记录只累加到该模板level为NULL的行，不存在时再插入；
+        # 已有Level的行不受影响（旧版本会把未识别Level的匹配累加到该模板的所有行）
+        for template_name, unit_name, cost, level_number, count, first_seen, last_seen, avg_score in unleveled:
+            cursor.execute('''
+                UPDATE template_stats 
+                SET avg_score = (avg_score * total_matches + ?) / (total_matches + ?),
+                    total_matches = total_matches + ?,
+                    last_seen = ?
+                WHERE template_name = ? AND level IS NULL
+            ''', (avg_score * count, count, count, last_seen, template_name))
+            if cursor.rowcount == 0:
                 cursor.execute('''
-                    UPDATE template_stats 
-                    SET total_matches = total_matches + 1,
-                        last_seen = ?,
-                        avg_score = (avg_score * total_matches + ?) / (total_matches + 1)
-                    WHERE template_name = ?
-                ''', (datetime.now(), score, template_name))
-            
-            # 更新区域分布
-            if level_number is not None:
-                cursor.execute('''
-                    SELECT region_distribution FROM template_stats 
-                    WHERE unit_name = ? AND cost = ? AND level = ?
-                ''', (unit_name, cost, level_number))
-            else:
-                cursor.execute('SELECT region_distribution FROM template_stats WHERE template_name = ?', (template_name,))
-            
-            region_dist = cursor.fetchone()[0]
-            if region_dist:
-                dist = json.loads(region_dist)
-            else:
-                dist = {}
-            
-            dist[str(region_num)] = dist.get(str(region_num), 0) + 1
+                    INSERT INTO template_stats (template_name, unit_name, cost, level, total_matches,
+                                                first_seen, last_seen, avg_score)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (template_name, unit_name, cost, level_number, count, first_seen, last_seen, avg_score))
+    
+    def get_region_distribution(self, unit_name: str, cost: int, level: int = None) -> Dict[int, int]:
+        """获取某个棋子在各区域出现的次数
+        
+        Args:
+            unit_name: 单位名称
+            cost: 费用
+            level: 等级，None表示汇总所有等级
             
-            if level_number is not None:
-                cursor.execute('''
-                    UPDATE template_stats 
-                    SET region_distribution = ?
-                    WHERE unit_name = ? AND cost = ? AND level = ?
-                ''', (json.dumps(dist), unit_name, cost, level_number))
-            else:
-                cursor.execute('''
-                    UPDATE template_stats 
-                    SET region_distribution = ?
-                    WHERE template_name = ?
-                ''', (json.dumps(dist), template_name))
+        Returns:
+            {区域号: 次数}
+        """
+        cursor = self.get_read_connection().cursor()
+        if level is None:
+            cursor.execute('''
+                SELECT region_number, SUM(count)
+                FROM template_region_stats
+                WHERE unit_name = ? AND cost = ?
+                GROUP BY region_number
+                ORDER BY region_number
+            ''', (unit_name, cost))
         else:
-            # 创建新记录
-            region_dist = {str(region_num): 1}
             cursor.execute('''
-                INSERT INTO template_stats (template_name, unit_name, cost, level, total_matches, first_seen, 
-                                         last_seen, avg_score, region_distribution)
-                VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
-            ''', (template_name, unit_name, cost, level_number, datetime.now(), datetime.now(), score, json.dumps(region_dist)))
+                SELECT region_number, count
+                FROM template_region_stats
+                WHERE unit_name = ? AND cost = ? AND level = ?
+                ORDER BY region_number
+            ''', (unit_name, cost, level))
+        return dict(cursor.fetchall())
     
     def get_session_summary(self, session_id: int) -> Dict[str, Any]:
         """获取会话统计摘要
@@ -342,10 +569,7 @@ class TFTStatsDatabase:
         Returns:
             会话统计信息字典
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
+        with self.read_snapshot() as cursor:
             # 获取会话基本信息
             cursor.execute('''
                 SELECT start_time, end_time, templates_dir, threshold, 
@@ -355,7 +579,6 @@ class TFTStatsDatabase:
             
             session_info = cursor.fetchone()
             if not session_info:
-                conn.close()
                 return {}
             
             # 获取匹配统计
@@ -409,8 +632,6 @@ class TFTStatsDatabase:
             
             capture_sequence_stats = dict(cursor.fetchall())
             
-            conn.close()
-            
             return {
                 'session_id': session_id,
                 'start_time': session_info[0],
@@ -435,10 +656,7 @@ class TFTStatsDatabase:
         Returns:
             总体统计信息字典
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
+        with self.read_snapshot() as cursor:
             # 总会话数
             cursor.execute('SELECT COUNT(*) FROM sessions')
             total_sessions = cursor.fetchone()[0]
@@ -469,8 +687,6 @@ class TFTStatsDatabase:
             ''')
             recent_activity = cursor.fetchall()
             
-            conn.close()
-            
             return {
                 'total_sessions': total_sessions,
                 'total_matches': total_matches,
@@ -540,6 +756,54 @@ class TFTStatsDatabase:
             for template, unit_name, cost, last_seen, total_matches in stats['recent_activity']:
                 print(f"  {template} (费用{cost}: {unit_name}): Last matched {last_seen}, Total {total_matches} times")
     
+    def record_session_perf(self, session_id: int, summary: Dict[str, Dict[str, float]]):
+        """保存会话各阶段的耗时统计，同一会话重复保存时覆盖
+        
+        Args:
+            session_id: 会话ID
+            summary: LatencyTracker.summary()的结果 {阶段: {count, p50, p95, p99, mean, max}}
+        """
+        rows = [
+            (session_id, stage, stats["count"], stats.get("p50"), stats.get("p95"), stats.get("p99"),
+             stats.get("mean"), stats.get("max"))
+            for stage, stats in summary.items() if stats
+        ]
+        if not rows:
+            return
+        with self._write_transaction() as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO session_perf
+                    (session_id, stage, samples, p50_ms, p95_ms, p99_ms, mean_ms, max_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+    
+    def get_session_perf(self, session_id: int) -> List[Tuple[Any, ...]]:
+        """获取会话各阶段的耗时统计
+        
+        Returns:
+            [(stage, samples, p50_ms, p95_ms, p99_ms, mean_ms, max_ms), ...]
+        """
+        cursor = self.get_read_connection().cursor()
+        cursor.execute('''
+            SELECT stage, samples, p50_ms, p95_ms, p99_ms, mean_ms, max_ms
+            FROM session_perf
+            WHERE session_id = ?
+        ''', (session_id,))
+        return cursor.fetchall()
+    
+    def get_template_counts(self) -> List[Tuple[str, int, Any, int]]:
+        """获取template_stats中每个 (棋子, 费用, 等级) 的累计匹配次数
+        
+        Returns:
+            [(unit_name, cost, level, total_matches), ...]
+        """
+        cursor = self.get_read_connection().cursor()
+        cursor.execute('''
+            SELECT unit_name, cost, level, total_matches
+            FROM template_stats
+        ''')
+        return cursor.fetchall()
+    
     def get_latest_capture_sequence(self) -> int:
         """获取数据库中最新的capture_sequence值
         
@@ -547,27 +811,24 @@ class TFTStatsDatabase:
             int: 最新的capture_sequence值，如果没有记录则返回0
         """
         try:
-            with self.lock:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
-                # 查询最新的capture_sequence值
-                cursor.execute('''
-                    SELECT MAX(capture_sequence) FROM matches
-                ''')
-                
-                result = cursor.fetchone()
-                conn.close()
+            cursor = self.get_read_connection().cursor()
+            
+            # 查询最新的capture_sequence值
+            cursor.execute('''
+                SELECT MAX(capture_sequence) FROM matches
+            ''')
+            
+            result = cursor.fetchone()
+            
+            if result and result[0] is not None:
+                return result[0]
+            else:
+                return 0
                 
-                if result and result[0] is not None:
-                    return result[0]
-                else:
-                    return 0
-                    
         except Exception as e:
             print(f"⚠️ 获取最新capture_sequence时出错: {e}")
             return 0
 
     def _get_connection(self):
-        """获取数据库连接（内部使用）"""
-        return sqlite3.connect(self.db_path)
+        """获取写连接（内部使用，调用方需持有self.lock）"""
+        return self._conn
@@ -1,20 +1,28 @@
 import argparse
+import json
+import logging
 import os
 import time
 import threading
+from contextlib import nullcontext
 from typing import Tuple
 
 import cv2
-from pynput import keyboard
 
-from .capture import grab_fullscreen, grab_region
+from .capture import FrameLog, FrameRecorder, ROLE_LEVEL, ROLE_SLOTS, grab_frame
 from .matching import (
-    match_template,
-    load_templates_from_dir,
+    build_template_cache,
     draw_match_bbox,
+    full_slot_bbox,
+    match_slots,
+    slot_size_for_regions,
+    TemplateBank,
+    DEFAULT_TEMPLATE_CACHE_DIR,
+    MATCH_MODES,
 )
 from .database import TFTStatsDatabase
-from .ocr_module import NumberOCR
+from .profiling import PipelineProfiler, log_directory_from_config
+from .ocr_module import DEFAULT_OCR_BACKEND, NumberOCR, OCR_BACKENDS
 
 
 # 固定的五个TFT卡牌区域
@@ -26,6 +34,18 @@ FIXED_REGIONS = [
     (1721, 1240, 250, 185),  # 区域5
 ]
 
+# Level数字的OCR识别区域
+OCR_REGION = (360, 1173, 27, 36)
+
+# 模板按卡牌区域大小存储，并使用编译后的模板缓存
+SLOT_SIZE = slot_size_for_regions(FIXED_REGIONS)
+
+
+def load_template_bank(templates_dir, template_size=SLOT_SIZE):
+    """加载模板库，优先内存映射编译缓存；template_size为卡牌区域的 (宽, 高)"""
+    return TemplateBank(templates_dir, template_size=template_size, cache_dir=DEFAULT_TEMPLATE_CACHE_DIR)
+
+
 # 全局变量用于控制程序运行
 running = True
 trigger_event = threading.Event()
@@ -33,6 +53,7 @@ trigger_event = threading.Event()
 def on_key_press(key):
     """键盘按键回调函数"""
     global running, trigger_event
+    from pynput import keyboard
     
     try:
         # Ctrl+F1 退出程序
@@ -53,63 +74,99 @@ def on_key_release(key):
     """键盘释放回调函数"""
     pass
 
-def run_fixed_regions_matching(templates_dir="tft_units", monitor_index=1, threshold=0.85, show=False, enable_ocr=True, ocr_instance=None):
-    """运行固定区域模板匹配的核心函数"""
-    print("=== 执行固定区域模板匹配 ===")
-    print(f"使用模板目录: {templates_dir}")
-    print(f"匹配阈值: {threshold}")
-    print(f"OCR识别: {'启用' if enable_ocr else '禁用'}")
+def _quiet(*args, **kwargs):
+    """verbose=False时替代print"""
+    pass
+
+def run_fixed_regions_matching(templates_dir="tft_units", monitor_index=1, threshold=0.85, show=False, enable_ocr=True, ocr_instance=None, template_bank=None,
+                               match_mode="all", early_exit_margin=None, frame=None, recorder=None, refresh_templates=True, verbose=True,
+                               fixed_regions=None, ocr_region=OCR_REGION):
+    """运行固定区域模板匹配的核心函数
+    
+    template_bank: 预加载的TemplateBank，传入时只检查文件变化而不重新解码全部模板
+    match_mode: "all" 记录所有超过阈值的模板，"best" 每个区域只保留得分最高的模板
+    early_exit_margin: best模式下，候选分数超过 阈值+该值 后停止对该区域继续打分
+    frame: 要匹配的帧（如帧日志回放），为None时截图
+    recorder: FrameRecorder，传入时把本次截图的卡牌和OCR区域追加到帧日志
+    refresh_templates: 是否检查模板文件变化（回放时关闭）
+    verbose: 为False时不打印过程信息
+    fixed_regions: 卡牌区域，默认FIXED_REGIONS（回放时使用帧日志中记录的区域）
+    ocr_region: Level OCR区域，默认OCR_REGION；为None时不做OCR（如帧日志中没有Level区域）
+    """
+    fixed_regions = FIXED_REGIONS if fixed_regions is None else fixed_regions
+    if ocr_region is None:
+        enable_ocr = False
+    log = print if verbose else _quiet
+    log("=== 执行固定区域模板匹配 ===")
+    log(f"使用模板目录: {templates_dir}")
+    log(f"匹配阈值: {threshold}")
+    log(f"匹配模式: {match_mode}")
+    log(f"OCR识别: {'启用' if enable_ocr else '禁用'}")
     
     # 使用传入的OCR实例，如果没有则创建新的
     ocr = ocr_instance
     if enable_ocr and ocr is None:
         try:
             ocr = NumberOCR()
-            print("✅ OCR识别器初始化成功")
+            log("✅ OCR识别器初始化成功")
         except Exception as e:
-            print(f"⚠️ OCR识别器初始化失败: {e}")
-            print("将禁用OCR功能")
+            log(f"⚠️ OCR识别器初始化失败: {e}")
+            log("将禁用OCR功能")
             enable_ocr = False
             ocr = None  # 确保OCR为None
     
-    # 定义OCR识别区域 (360, 1173, 27, 36)
-    OCR_REGION = (360, 1173, 27, 36)
+    # 使用预加载的模板库，只重新加载有变化的文件
+    if template_bank is None:
+        template_bank = load_template_bank(templates_dir)
+    elif refresh_templates:
+        template_bank.refresh()
+    
+    # 一次截图覆盖全部卡牌区域和OCR区域，保证结果来自同一帧
+    if frame is None:
+        frame = grab_frame(fixed_regions + ([ocr_region] if ocr_region is not None else []), monitor_index=monitor_index)
+    
+    # 记录本次截图，供之后回放复现
+    if recorder is not None and not recorder.record(frame):
+        log(f"⚠️ 帧日志已满 ({recorder.capacity} 帧)，不再记录: {recorder.path}")
+    
+    # 五个区域与全部模板一次矩阵乘法完成打分
+    region_imgs = [frame.view(region) for region in fixed_regions]
+    slot_hits = match_slots(template_bank, region_imgs, threshold, mode=match_mode, early_exit_margin=early_exit_margin)
     
     # 对每个固定区域进行模板匹配
     all_matches = []
     match_details = []  # 存储详细的匹配信息
     
-    for i, (x, y, w, h) in enumerate(FIXED_REGIONS):
-        print(f"\n--- 区域{i+1} ({x},{y},{w},{h}) ---")
-        region_img = grab_region((x, y, w, h), monitor_index=monitor_index)
+    for i, (x, y, w, h) in enumerate(fixed_regions):
+        log(f"\n--- 区域{i+1} ({x},{y},{w},{h}) ---")
+        region_img = region_imgs[i]
         
-        templates = load_templates_from_dir(templates_dir)
         matched_names = []
         region_detail = {}  # 存储当前区域的匹配详情
         
-        for name, tmpl in templates:
-            res = match_template(region_img, tmpl, threshold=threshold)
-            if res is not None:
-                matched_names.append(name)
-                # 记录匹配详情
-                if 'score' not in region_detail or res['score'] > region_detail.get('score', 0):
-                    region_detail = {
-                        'score': res['score'],
-                        'bbox': {
-                            'top_left': res['top_left'],
-                            'bottom_right': res['bottom_right'],
-                            'center': res['center']
-                        }
-                    }
-                if show:
-                    region_img = draw_match_bbox(region_img, res["top_left"], res["bottom_right"])
+        for hit in slot_hits[i]:
+            matched_names.append(hit['name'])
+            # 记录匹配详情
+            if 'score' not in region_detail or hit['score'] > region_detail.get('score', 0):
+                region_detail = {
+                    'score': hit['score'],
+                    'bbox': full_slot_bbox(region_img)
+                }
+                if 'margin' in hit:
+                    region_detail['margin'] = hit['margin']
+        if show and matched_names:
+            bbox = full_slot_bbox(region_img)
+            region_img = draw_match_bbox(region_img, bbox["top_left"], bbox["bottom_right"])
         
         if matched_names:
-            print(f"区域{i+1} 匹配到的模板: {', '.join(matched_names)}")
+            if 'margin' in region_detail:
+                log(f"区域{i+1} 匹配到的模板: {', '.join(matched_names)} (领先次优 {region_detail['margin']:.3f})")
+            else:
+                log(f"区域{i+1} 匹配到的模板: {', '.join(matched_names)}")
             all_matches.append((i+1, matched_names))
             match_details.append(region_detail)
         else:
-            print(f"区域{i+1} 未匹配到任何模板")
+            log(f"区域{i+1} 未匹配到任何模板")
             match_details.append({})
         
         # 显示匹配结果
@@ -119,52 +176,57 @@ def run_fixed_regions_matching(templates_dir="tft_units", monitor_index=1, thres
     # OCR识别数字
     if enable_ocr and ocr:
         try:
-            print(f"\n--- OCR识别区域 {OCR_REGION} ---")
-            # 截取完整屏幕进行OCR识别
-            full_screen = grab_fullscreen(monitor_index=monitor_index)
-            level_number = ocr.recognize_number_from_region(full_screen, OCR_REGION)
+            log(f"\n--- OCR识别区域 {ocr_region} ---")
+            # 复用同一帧进行OCR识别
+            level_number = ocr.recognize_number(frame.view(ocr_region))
             
             # 现在OCR总是返回一个数字（成功识别或回退值）
-            print(f"✅ OCR识别结果: 数字 {level_number}")
+            log(f"✅ OCR识别结果: 数字 {level_number}")
             # 将OCR结果添加到所有匹配详情中
             for detail in match_details:
                 detail['level'] = level_number
                 detail['ocr_confidence'] = 0.9  # 默认置信度
                 
         except Exception as e:
-            print(f"❌ OCR识别出错: {e}")
+            log(f"❌ OCR识别出错: {e}")
             # 使用OCR模块的回退机制，而不是硬编码的默认值
             level_number = ocr._get_fallback_number()
-            print(f"使用OCR回退值: {level_number}")
+            log(f"使用OCR回退值: {level_number}")
             for detail in match_details:
                 detail['level'] = level_number
                 detail['ocr_confidence'] = 0.5  # 低置信度
     
     if show and all_matches:
-        print("\n按任意键关闭所有结果窗口...")
+        log("\n按任意键关闭所有结果窗口...")
         cv2.waitKey(0)
         cv2.destroyAllWindows()
     
     # 输出总结
-    print(f"\n=== 匹配结果总结 ===")
+    log(f"\n=== 匹配结果总结 ===")
     if all_matches:
         for region_num, templates in all_matches:
-            print(f"区域{region_num}: {', '.join(templates)}")
+            log(f"区域{region_num}: {', '.join(templates)}")
     else:
-        print("所有区域都未匹配到模板")
+        log("所有区域都未匹配到模板")
     
     # 显示OCR结果
     if enable_ocr and ocr:
         ocr_result = next((detail.get('level') for detail in match_details if detail.get('level')), None)
         if ocr_result is not None:
-            print(f"OCR识别数字: {ocr_result}")
+            log(f"OCR识别数字: {ocr_result}")
     
-    print("\n等待下一次触发... (D: 截图匹配, Ctrl+F1: 退出)")
     return all_matches, match_details
 
-def continuous_monitoring_mode(templates_dir="tft_units", monitor_index=1, threshold=0.68, show=False):
-    """持续监控模式"""
+def continuous_monitoring_mode(templates_dir="tft_units", monitor_index=1, threshold=0.68, show=False, match_mode="all", early_exit_margin=None, ocr_backend=DEFAULT_OCR_BACKEND,
+                               record_path=None, record_capacity=1000, profiler=None):
+    """持续监控模式
+    
+    record_path: 帧日志路径，指定时把每次触发的卡牌和OCR区域追加到该日志，可用 --replay 回放
+    profiler: 指定时对触发的匹配和记录过程做性能剖析
+    """
     global running, trigger_event
+    # pynput需要图形环境，只在持续监控模式导入，--help/--replay/--batch/--video等不依赖它
+    from pynput import keyboard
     
     print("=== 持续监控模式已启动 ===")
     print("快捷键说明:")
@@ -176,7 +238,7 @@ def continuous_monitoring_mode(templates_dir="tft_units", monitor_index=1, thres
     
     # 初始化OCR实例
     try:
-        ocr = NumberOCR()
+        ocr = NumberOCR(backend=ocr_backend)
         print("✅ OCR识别器初始化成功")
         enable_ocr = True
     except Exception as e:
@@ -187,7 +249,19 @@ def continuous_monitoring_mode(templates_dir="tft_units", monitor_index=1, thres
     
     db = TFTStatsDatabase()
     
+    # 启动时一次性加载模板
+    template_bank = load_template_bank(templates_dir)
+    print(f"✅ 已预加载 {len(template_bank)} 个模板{'（缓存）' if template_bank.loaded_from_cache else ''}")
+    
     session_id = db.start_session(templates_dir, threshold, monitor_index)
+    if profiler is not None:
+        profiler.session_id = session_id
+    
+    recorder = None
+    if record_path:
+        recorder = FrameRecorder(record_path, FIXED_REGIONS + [OCR_REGION], capacity=record_capacity,
+                                 roles={ROLE_SLOTS: FIXED_REGIONS, ROLE_LEVEL: [OCR_REGION]})
+        print(f"🎞️ 帧日志: {record_path} (已有 {len(recorder)}/{recorder.capacity} 帧)")
     
     # 启动键盘监听器
     global keyboard_listener
@@ -203,17 +277,20 @@ def continuous_monitoring_mode(templates_dir="tft_units", monitor_index=1, thres
             if trigger_event.wait(timeout=0.1):
                 trigger_event.clear()
                 if running:  # 确保程序仍在运行
-                    # 执行匹配并记录结果
-                    matches, match_details = run_fixed_regions_matching(templates_dir, monitor_index, threshold, show, enable_ocr=enable_ocr, ocr_instance=ocr)
-                    
-                    # 记录到数据库
-                    if matches:
-                        db.record_matches(session_id, matches, match_details)
+                    with profiler.profile() if profiler is not None else nullcontext():
+                        # 执行匹配并记录结果
+                        matches, match_details = run_fixed_regions_matching(templates_dir, monitor_index, threshold, show, enable_ocr=enable_ocr, ocr_instance=ocr, template_bank=template_bank,
+                                                                             match_mode=match_mode, early_exit_margin=early_exit_margin, recorder=recorder)
+                        
+                        # 记录到数据库
+                        if matches:
+                            db.record_matches(session_id, matches, match_details)
                     
                     # Show current session statistics
                     print("\n" + "="*50)
                     db.print_session_summary(session_id)
                     print("="*50)
+                    print("\n等待下一次触发... (D: 截图匹配, Ctrl+F1: 退出)")
             
             time.sleep(0.01)  # 减少CPU占用
             
@@ -232,6 +309,11 @@ def continuous_monitoring_mode(templates_dir="tft_units", monitor_index=1, thres
         db.print_overall_stats()
         
         keyboard_listener.stop()
+        if recorder is not None:
+            recorder.close()
+        if profiler is not None:
+            profiler.finish()
+        db.close()
         cv2.destroyAllWindows()
         print("Program exited")
 
@@ -239,6 +321,67 @@ def continuous_monitoring_mode(templates_dir="tft_units", monitor_index=1, thres
 
 
 
+def replay_mode(log_path, templates_dir="tft_units", threshold=0.68, match_mode="all", early_exit_margin=None, ocr_backend=DEFAULT_OCR_BACKEND, output=None,
+                profiler=None):
+    """回放帧日志：不截图、不显示，尽可能快地把每一帧送入run_fixed_regions_matching
+    
+    output: 指定时把每帧的匹配结果按JSON Lines写入该文件，便于比较不同引擎的结果
+    profiler: 指定时把每一帧当作一次触发做性能剖析
+    """
+    frame_log = FrameLog(log_path)
+    print(f"=== 回放帧日志: {log_path} ({len(frame_log)} 帧) ===")
+    # 使用录制时的区域（GUI按配置和分辨率换算过），而不是本模块的固定区域
+    slot_regions = frame_log.slot_regions
+    level_region = frame_log.level_region
+    slot_size = slot_size_for_regions(slot_regions)
+    if slot_size is None:
+        raise SystemExit(f"帧日志中没有卡牌区域，无法回放: {log_path}")
+    print(f"卡牌区域: {len(slot_regions)} 个 ({slot_size[0]}x{slot_size[1]}), Level区域: {level_region or '无（不做OCR）'}")
+    
+    # 没有Level区域时不做OCR，避免对空图识别后写入回退值
+    ocr = None
+    if level_region is not None:
+        try:
+            ocr = NumberOCR(backend=ocr_backend)
+        except Exception as e:
+            print(f"⚠️ OCR识别器初始化失败: {e}")
+    template_bank = load_template_bank(templates_dir, slot_size)
+    
+    out = open(output, 'w', encoding='utf-8') if output else None
+    matched_frames = 0
+    start = time.perf_counter()
+    try:
+        for index, frame in enumerate(frame_log):
+            with profiler.profile() if profiler is not None else nullcontext():
+                matches, match_details = run_fixed_regions_matching(
+                    templates_dir, threshold=threshold, enable_ocr=ocr is not None, ocr_instance=ocr,
+                    template_bank=template_bank, match_mode=match_mode, early_exit_margin=early_exit_margin,
+                    frame=frame, refresh_templates=False, verbose=False,
+                    fixed_regions=slot_regions, ocr_region=level_region
+                )
+            matched_frames += bool(matches)
+            if out is not None:
+                level = next((detail.get('level') for detail in match_details if detail.get('level')), None)
+                out.write(json.dumps({
+                    "index": index,
+                    "timestamp": frame.timestamp,
+                    "matches": matches,
+                    "scores": [detail.get('score') for detail in match_details],
+                    "level": level,
+                }, ensure_ascii=False) + "\n")
+    finally:
+        if out is not None:
+            out.close()
+        if profiler is not None:
+            profiler.finish()
+    elapsed = time.perf_counter() - start
+    
+    fps = len(frame_log) / elapsed if elapsed > 0 else 0.0
+    print(f"✅ 回放完成: {len(frame_log)} 帧, 有匹配 {matched_frames} 帧, 用时 {elapsed:.2f}s ({fps:.0f} 帧/秒)")
+    if output:
+        print(f"匹配结果已写入 {output}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="TFT Card Statistics - Fixed region capture and template match")
     parser.add_argument("--templates_dir", required=False, default="tft_units", help="Directory containing multiple templates")
@@ -247,12 +390,99 @@ def main():
     parser.add_argument("--show", action="store_true", help="Show visualization window")
     parser.add_argument("--continuous", action="store_true", help="Continuous monitoring mode with hotkey triggers (D: capture, Ctrl+F1: exit)")
     parser.add_argument("--enable-stats", action="store_true", help="Enable statistics recording for non-continuous modes")
+    parser.add_argument("--match-mode", choices=MATCH_MODES, default="all", help="all: keep every template above threshold; best: keep only the top template per region")
+    parser.add_argument("--early-exit-margin", type=float, default=None, help="In best mode, stop scoring a region once a candidate beats threshold by this margin")
+    parser.add_argument("--ocr-backend", choices=OCR_BACKENDS, default=DEFAULT_OCR_BACKEND, help="tesseract: Tesseract only; auto: game-font glyphs from ocr_glyphs/ (or learned from Tesseract) with Tesseract fallback; glyph: glyph classifier with synthetic prototypes, no Tesseract needed")
+    parser.add_argument("--build-template-cache", action="store_true", help=f"Compile the template bank into {DEFAULT_TEMPLATE_CACHE_DIR}/ and exit")
+    parser.add_argument("--record", default=None, metavar="LOG", help="In continuous mode, append every trigger's slot and OCR crops to this memory-mapped frame log")
+    parser.add_argument("--record-capacity", type=int, default=1000, help="Frames preallocated when --record creates a new log")
+    parser.add_argument("--replay", default=None, metavar="LOG", help="Replay a frame log through the matcher as fast as possible (no capture, no display) and exit")
+    parser.add_argument("--replay-output", default=None, help="With --replay, write per-frame results as JSON Lines to this file")
+    parser.add_argument("--batch", default=None, metavar="DIR", help="Analyze every PNG/JPG screenshot in DIR with a process pool, record the results and exit")
+    parser.add_argument("--video", default=None, metavar="FILE", help="Decode a recorded game, recognize the shop each time it rerolls, record the results and exit")
+    parser.add_argument("--sample-fps", type=float, default=4.0, help="With --video, frames per second checked for shop changes")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0, help="With --video, seconds of footage per worker task")
+    parser.add_argument("--workers", type=int, default=None, help="With --batch/--video, number of worker processes (default: all cores)")
+    parser.add_argument("--commit-every", type=int, default=1000, help="With --batch, screenshots written per database transaction")
+    parser.add_argument("--recursive", action="store_true", help="With --batch, include subdirectories")
+    parser.add_argument("--config", default="config.json", help="Config file providing fixed_regions and ocr_regions (--batch/--video) and log_directory (--profile)")
+    parser.add_argument("--profile", type=int, default=None, metavar="N", help="In continuous or replay mode, run the next N triggers under cProfile and write .prof and text reports to log_directory")
+    parser.add_argument("--profile-seconds", type=float, default=None, metavar="N", help="Profile triggers for N seconds from the first one instead of a fixed count")
+    parser.add_argument("--profile-sampling", action="store_true", help="Use the low-overhead stack sampler instead of cProfile")
 
 
 
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
 
+    # 编译模板缓存后退出
+    if args.build_template_cache:
+        start = time.time()
+        bank = build_template_cache(args.templates_dir, SLOT_SIZE)
+        status = "已是最新" if bank.loaded_from_cache else "已重新编译"
+        print(f"✅ 模板缓存{status}: {len(bank)} 个模板, {SLOT_SIZE[0]}x{SLOT_SIZE[1]}, 用时 {time.time() - start:.2f}s")
+        return
 
+    # 批量分析截图文件夹后退出
+    if args.batch:
+        from .batch import batch_mode
+        batch_mode(
+            args.batch,
+            templates_dir=args.templates_dir,
+            threshold=args.threshold,
+            match_mode=args.match_mode,
+            early_exit_margin=args.early_exit_margin,
+            ocr_backend=args.ocr_backend,
+            workers=args.workers,
+            commit_every=args.commit_every,
+            config_path=args.config,
+            recursive=args.recursive,
+            fixed_regions=FIXED_REGIONS,
+            ocr_region=OCR_REGION
+        )
+        return
+    
+    # 分析录像后退出
+    if args.video:
+        from .video import video_mode
+        video_mode(
+            args.video,
+            templates_dir=args.templates_dir,
+            threshold=args.threshold,
+            match_mode=args.match_mode,
+            early_exit_margin=args.early_exit_margin,
+            ocr_backend=args.ocr_backend,
+            workers=args.workers,
+            sample_fps=args.sample_fps,
+            chunk_seconds=args.chunk_seconds,
+            config_path=args.config,
+            fixed_regions=FIXED_REGIONS,
+            ocr_region=OCR_REGION
+        )
+        return
+    
+    # 性能剖析：在持续监控和回放模式中剖析触发
+    profiler = None
+    if args.profile or args.profile_seconds:
+        profiler = PipelineProfiler(
+            log_directory_from_config(args.config), "replay" if args.replay else "continuous",
+            triggers=args.profile, seconds=args.profile_seconds, sampling=args.profile_sampling,
+            on_dump=lambda paths: print(f"🔬 性能剖析结果已保存: {', '.join(paths)}")
+        )
+    
+    # 回放帧日志后退出
+    if args.replay:
+        replay_mode(
+            args.replay,
+            templates_dir=args.templates_dir,
+            threshold=args.threshold,
+            match_mode=args.match_mode,
+            early_exit_margin=args.early_exit_margin,
+            ocr_backend=args.ocr_backend,
+            output=args.replay_output,
+            profiler=profiler
+        )
+        return
     
     # 持续监控模式：程序持续运行，等待快捷键触发
     if args.continuous:
@@ -261,7 +491,13 @@ def main():
             templates_dir=args.templates_dir,
             monitor_index=args.monitor,
             threshold=args.threshold,
-            show=args.show
+            show=args.show,
+            match_mode=args.match_mode,
+            early_exit_margin=args.early_exit_margin,
+            ocr_backend=args.ocr_backend,
+            record_path=args.record,
+            record_capacity=args.record_capacity,
+            profiler=profiler
         )
         return
 
@@ -272,116 +508,31 @@ def main():
     if not args.templates_dir:
         raise SystemExit("请提供 --templates_dir 参数")
     
-    print(f"使用模板目录: {args.templates_dir}")
-    
-    # 对每个固定区域进行模板匹配
-    all_matches = []
-    match_details = []  # 存储匹配详情，包括OCR结果
-    
     # 初始化OCR识别器
     ocr = None
     try:
-        ocr = NumberOCR()
+        ocr = NumberOCR(backend=args.ocr_backend)
         print("✅ OCR识别器初始化成功")
     except Exception as e:
         print(f"⚠️ OCR识别器初始化失败: {e}")
         print("将禁用OCR功能")
     
-    # 定义OCR识别区域 (360, 1173, 27, 36)
-    OCR_REGION = (360, 1173, 27, 36)
+    # 截图、匹配和OCR与持续监控模式的单次触发相同
+    all_matches, match_details = run_fixed_regions_matching(
+        args.templates_dir, args.monitor, args.threshold, args.show, enable_ocr=ocr is not None, ocr_instance=ocr,
+        match_mode=args.match_mode, early_exit_margin=args.early_exit_margin
+    )
     
-    for i, (x, y, w, h) in enumerate(FIXED_REGIONS):
-        print(f"\n--- 区域{i+1} ({x},{y},{w},{h}) ---")
-        region_img = grab_region((x, y, w, h), monitor_index=args.monitor)
-        
-        region_detail = {}  # 存储当前区域的匹配详情
-        
-        templates = load_templates_from_dir(args.templates_dir)
-        matched_names = []
-        for name, tmpl in templates:
-            res = match_template(region_img, tmpl, threshold=args.threshold)
-            if res is not None:
-                matched_names.append(name)
-                # 记录匹配详情
-                if 'score' not in region_detail or res['score'] > region_detail.get('score', 0):
-                    region_detail = {
-                        'score': res['score'],
-                        'bbox': {
-                            'top_left': res['top_left'],
-                            'bottom_right': res['bottom_right'],
-                            'center': res['center']
-                        }
-                    }
-                if args.show:
-                    region_img = draw_match_bbox(region_img, res["top_left"], res["bottom_right"])
-        
-        if matched_names:
-            print(f"区域{i+1} 匹配到的模板: {', '.join(matched_names)}")
-            all_matches.append((i+1, matched_names))
-            match_details.append(region_detail)
-        else:
-            print(f"区域{i+1} 未匹配到任何模板")
-            match_details.append({})
-        
-        # 显示匹配结果
-        if args.show:
-            cv2.imshow(f"Region {i+1} Result", region_img)
-        
-        # OCR识别数字
-        if ocr:
-            try:
-                print(f"\n--- OCR识别区域 {OCR_REGION} ---")
-                # 截取完整屏幕进行OCR识别
-                full_screen = grab_fullscreen(monitor_index=args.monitor)
-                level_number = ocr.recognize_number_from_region(full_screen, OCR_REGION)
-                
-                # 现在OCR总是返回一个数字（成功识别或回退值）
-                print(f"✅ OCR识别结果: 数字 {level_number}")
-                # 将OCR结果添加到所有匹配详情中
-                for detail in match_details:
-                    detail['level'] = level_number
-                    detail['ocr_confidence'] = 0.9  # 默认置信度
-                    
-            except Exception as e:
-                print(f"❌ OCR识别出错: {e}")
-                # 使用OCR模块的回退机制，而不是硬编码的默认值
-                level_number = ocr._get_fallback_number()
-                print(f"使用OCR回退值: {level_number}")
-                for detail in match_details:
-                    detail['level'] = level_number
-                    detail['ocr_confidence'] = 0.5  # 低置信度
-        
-        if args.show and all_matches:
-            print("\n按任意键关闭所有结果窗口...")
-            cv2.waitKey(0)
-            cv2.destroyAllWindows()
-        
-        # 输出总结
-        print(f"\n=== 匹配结果总结 ===")
+    # 如果启用了统计功能，记录结果到数据库
+    if hasattr(args, 'enable_stats') and args.enable_stats:
+        db = TFTStatsDatabase()
+        session_id = db.start_session(args.templates_dir or "unknown", args.threshold, args.monitor)
         if all_matches:
-            for region_num, templates in all_matches:
-                print(f"区域{region_num}: {', '.join(templates)}")
-        else:
-            print("所有区域都未匹配到模板")
-        
-        # 显示OCR结果
-        if ocr:
-            ocr_result = next((detail.get('level') for detail in match_details if detail.get('level')), None)
-            if ocr_result is not None:
-                print(f"OCR识别数字: {ocr_result}")
-        
-        # 如果启用了统计功能，记录结果到数据库
-        if hasattr(args, 'enable_stats') and args.enable_stats:
-            db = TFTStatsDatabase()
-            session_id = db.start_session(args.templates_dir or "unknown", args.threshold, args.monitor)
-            if all_matches:
-                db.record_matches(session_id, all_matches, match_details)
-            db.end_session(session_id)
-            db.print_session_summary(session_id)
-        
-        return
-    
+            db.record_matches(session_id, all_matches, match_details)
+        db.end_session(session_id)
+        db.print_session_summary(session_id)
+        db.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,27 @@
-from typing import Tuple, Optional, Dict, Any, List
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Tuple, Optional, Dict, Any, List, NamedTuple
 
 import cv2
 import numpy as np
 
 
+DEFAULT_TEMPLATE_EXTS: Tuple[str, ...] = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+# Compiled template banks (see TemplateBank cache_dir) are written here by default
+DEFAULT_TEMPLATE_CACHE_DIR = ".template_cache"
+TEMPLATE_CACHE_VERSION = 2
+
+# Slot matching modes:
+#   "all"  - every template scoring above threshold is reported for a slot
+#   "best" - only the argmax template per slot, with its margin over the runner-up
+MATCH_MODES: Tuple[str, ...] = ("all", "best")
+
+
 def load_template_bgr(path: str) -> np.ndarray:
     """
     Load an image from disk as BGR (for OpenCV).
@@ -15,6 +33,15 @@ def load_template_bgr(path: str) -> np.ndarray:
     return img
 
 
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """
+    Return a single-channel version of image. Already-gray inputs are returned as-is.
+    """
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
 def match_template(
     scene_bgr: np.ndarray,
     template_bgr: np.ndarray,
@@ -24,6 +51,8 @@ def match_template(
     """
     Perform template matching and return best match if above threshold.
 
+    Both inputs may be BGR or already grayscale (e.g. from TemplateBank).
+
     Returns None if no match is found.
     Otherwise returns dict with keys:
       - score: float
@@ -34,8 +63,8 @@ def match_template(
     if scene_bgr.size == 0 or template_bgr.size == 0:
         return None
 
-    scene_gray = cv2.cvtColor(scene_bgr, cv2.COLOR_BGR2GRAY)
-    template_gray = cv2.cvtColor(template_bgr, cv2.COLOR_BGR2GRAY)
+    scene_gray = to_gray(scene_bgr)
+    template_gray = to_gray(template_bgr)
 
     result = cv2.matchTemplate(scene_gray, template_gray, method)
     min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
@@ -59,6 +88,19 @@ def match_template(
     }
 
 
+def full_slot_bbox(slot_image: np.ndarray) -> Dict[str, Tuple[int, int]]:
+    """
+    Bounding box of a template that fills the whole slot (the only placement possible when
+    crop and template have the same size), in the same format as match_template results.
+    """
+    h, w = slot_image.shape[:2]
+    return {
+        "top_left": (0, 0),
+        "bottom_right": (w, h),
+        "center": (w // 2, h // 2),
+    }
+
+
 def draw_match_bbox(image_bgr: np.ndarray, top_left: Tuple[int, int], bottom_right: Tuple[int, int]) -> np.ndarray:
     """
     Draw a rectangle on a copy of image and return it.
@@ -74,10 +116,8 @@ def load_templates_from_dir(template_dir: str, valid_exts: Optional[Tuple[str, .
 
     Returns list of (filename, image_bgr). Skips files that cannot be read.
     """
-    import os
-
     if valid_exts is None:
-        valid_exts = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+        valid_exts = DEFAULT_TEMPLATE_EXTS
 
     if not os.path.isdir(template_dir):
         raise FileNotFoundError(f"Template directory does not exist: {template_dir}")
@@ -97,3 +137,633 @@ def load_templates_from_dir(template_dir: str, valid_exts: Optional[Tuple[str, .
     return loaded
 
 
+def resize_gray(gray: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Resize a grayscale image to size (width, height): INTER_AREA when shrinking, INTER_LINEAR
+    when enlarging. Images already at size are returned as-is.
+    """
+    w, h = size
+    if gray.shape[:2] == (h, w):
+        return gray
+    shrinking = w * h < gray.shape[0] * gray.shape[1]
+    return cv2.resize(gray, (w, h), interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+
+
+def slot_size_for_regions(regions: List[Tuple[int, int, int, int]]) -> Optional[Tuple[int, int]]:
+    """
+    Slot size (width, height) for a set of (x, y, w, h) regions: the most common region size,
+    or None if there are no regions.
+    """
+    sizes = Counter((int(w), int(h)) for _, _, w, h in regions)
+    if not sizes:
+        return None
+    return sizes.most_common(1)[0][0]
+
+
+def normalize_rows(gray_stack: np.ndarray) -> np.ndarray:
+    """
+    Flatten a (N, H, W) grayscale stack into a contiguous (N, H*W) float32 matrix
+    whose rows are mean-centered and L2-normalized.
+
+    The dot product of two such rows equals cv2.TM_CCOEFF_NORMED for equally sized images.
+    Constant images become all-zero rows (score 0 against anything).
+    """
+    flat = gray_stack.reshape(len(gray_stack), -1).astype(np.float32)
+    flat -= flat.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(flat, axis=1, keepdims=True)
+    np.divide(flat, norms, out=flat, where=norms > 0)
+    return np.ascontiguousarray(flat)
+
+
+class TemplateArrays(NamedTuple):
+    """One consistent version of a TemplateBank's contents; row i of each array is names[i]."""
+
+    names: List[str]
+    gray: np.ndarray
+    normalized: np.ndarray
+
+
+_EMPTY_ARRAYS = TemplateArrays([], np.empty((0, 0, 0), dtype=np.uint8), np.empty((0, 0), dtype=np.float32))
+
+
+class TemplateBank:
+    """
+    Preloaded, preprocessed set of same-sized templates.
+
+    Templates are decoded once and kept as:
+      - gray: (N, H, W) uint8 stack
+      - normalized: (N, H*W) float32 matrix of mean-centered, L2-normalized rows
+    Templates whose size differs from template_size are resized to it.
+    refresh() only re-decodes files whose mtime changed, so it is cheap to call per trigger.
+
+    With cache_dir (and an explicit template_size) the preprocessed arrays are also written to
+    a compiled cache: templates_<W>x<H>_<key>.npy (normalized), templates_<W>x<H>_<key>_gray.npy and
+    a templates_<W>x<H>.json manifest of names, costs, source hashes and the two array file names,
+    where <key> hashes the cache contents. A later bank for the same directory and size memory-maps
+    those files instead of decoding the PNGs; the cache is rebuilt automatically when a source file
+    is added, removed or its content changes.
+
+    refresh() may run on another thread while slots are being scored: the three arrays are
+    published together as one TemplateArrays tuple, and scoring reads a single snapshot of it.
+    """
+
+    def __init__(
+        self,
+        template_dir: str,
+        valid_exts: Optional[Tuple[str, ...]] = None,
+        template_size: Optional[Tuple[int, int]] = None,
+        cache_dir: Optional[str] = None,
+    ):
+        """
+        template_dir: directory of template images
+        valid_exts: accepted file extensions (lowercase, with dot)
+        template_size: (width, height) all templates are stored at; None -> most common size on disk
+        cache_dir: directory of the compiled cache; None disables it (also when template_size is None)
+        """
+        if not os.path.isdir(template_dir):
+            raise FileNotFoundError(f"Template directory does not exist: {template_dir}")
+
+        self.template_dir = template_dir
+        self.valid_exts = valid_exts or DEFAULT_TEMPLATE_EXTS
+        self.template_size = template_size
+        self.arrays: TemplateArrays = _EMPTY_ARRAYS
+
+        # name -> (mtime_ns, bgr image as decoded from disk)
+        self._sources: Dict[str, Tuple[int, np.ndarray]] = {}
+        # {name: mtime_ns} of the sources behind arrays memory-mapped from the cache,
+        # and the (name, sha1) pairs recorded in its manifest
+        self._cached_mtimes: Optional[Dict[str, int]] = None
+        self._cached_signature: Tuple[Tuple[str, str], ...] = ()
+        self.cache_dir = cache_dir if template_size is not None else None
+        self.loaded_from_cache = False
+        self._lock = threading.Lock()
+        if not (self.cache_dir and self._load_cache()):
+            self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.arrays.names)
+
+    @property
+    def names(self) -> List[str]:
+        return self.arrays.names
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self.arrays.gray
+
+    @property
+    def normalized(self) -> np.ndarray:
+        return self.arrays.normalized
+
+    def _scan(self) -> Dict[str, int]:
+        """Return {filename: mtime_ns} for all template files in the directory."""
+        found: Dict[str, int] = {}
+        with os.scandir(self.template_dir) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                _, ext = os.path.splitext(entry.name.lower())
+                if ext in self.valid_exts:
+                    found[entry.name] = entry.stat().st_mtime_ns
+        return found
+
+    def refresh(self) -> bool:
+        """
+        Re-decode only templates that were added or modified since the last call
+        and drop those that were removed.
+
+        Returns True if the bank contents changed.
+        """
+        with self._lock:
+            on_disk = self._scan()
+            changed = False
+
+            if self._cached_mtimes is not None:
+                if on_disk == self._cached_mtimes:
+                    return False
+                # Timestamps moved: the content may be unchanged, or another process may
+                # already have rebuilt the cache
+                signature = self._cached_signature
+                if self._load_cache():
+                    return self._cached_signature != signature
+                # Sources changed since the cache was mapped: decode everything below
+                self._cached_mtimes = None
+                self.loaded_from_cache = False
+                changed = True
+
+            for name in list(self._sources):
+                if name not in on_disk:
+                    del self._sources[name]
+                    changed = True
+
+            for name, mtime in on_disk.items():
+                cached = self._sources.get(name)
+                if cached is not None and cached[0] == mtime:
+                    continue
+                img = cv2.imread(os.path.join(self.template_dir, name), cv2.IMREAD_COLOR)
+                if img is None or img.size == 0:
+                    if self._sources.pop(name, None) is not None:
+                        changed = True
+                    continue
+                self._sources[name] = (mtime, img)
+                changed = True
+
+            if changed:
+                self._rebuild()
+                if self.cache_dir:
+                    self._write_cache()
+            return changed
+
+    def _rebuild(self) -> None:
+        """Rebuild the gray stack and normalized matrix from the decoded sources."""
+        names = sorted(self._sources)
+        if not names:
+            self.arrays = _EMPTY_ARRAYS
+            return
+
+        grays = [to_gray(self._sources[name][1]) for name in names]
+        if self.template_size is None:
+            h, w = Counter(g.shape for g in grays).most_common(1)[0][0]
+            self.template_size = (w, h)
+        w, h = self.template_size
+
+        stack = np.empty((len(grays), h, w), dtype=np.uint8)
+        for i, g in enumerate(grays):
+            stack[i] = resize_gray(g, (w, h))
+
+        self.arrays = TemplateArrays(names, stack, normalize_rows(stack))
+
+    def _cache_base(self) -> str:
+        """Path prefix of the cache files for this bank's template_size."""
+        w, h = self.template_size
+        return os.path.join(self.cache_dir, f"templates_{w}x{h}")
+
+    def _file_sha1(self, name: str) -> str:
+        with open(os.path.join(self.template_dir, name), "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _load_cache(self) -> bool:
+        """
+        Memory-map the compiled cache if it matches the current sources and template_size.
+
+        Files whose mtime differs from the manifest are re-hashed, so touching a file without
+        changing it does not invalidate the cache. Returns True on success.
+        """
+        try:
+            with open(self._cache_base() + ".json", "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if manifest.get("version") != TEMPLATE_CACHE_VERSION:
+            return False
+        if tuple(manifest.get("template_size", ())) != tuple(self.template_size):
+            return False
+
+        entries = {entry["name"]: entry for entry in manifest.get("templates", [])}
+        on_disk = self._scan()
+        if set(entries) != set(on_disk):
+            return False
+        for name, mtime in on_disk.items():
+            if entries[name]["mtime_ns"] != mtime and entries[name]["sha1"] != self._file_sha1(name):
+                return False
+
+        try:
+            # The array files are named after their contents, so a manifest never pairs with
+            # arrays written for another template set
+            normalized = np.load(os.path.join(self.cache_dir, os.path.basename(manifest["normalized_file"])),
+                                 mmap_mode="r")
+            gray = np.load(os.path.join(self.cache_dir, os.path.basename(manifest["gray_file"])), mmap_mode="r")
+        except (KeyError, TypeError, OSError, ValueError):
+            return False
+        w, h = self.template_size
+        names = [entry["name"] for entry in manifest["templates"]]
+        if normalized.shape != (len(names), w * h) or gray.shape != (len(names), h, w):
+            return False
+
+        self.arrays = TemplateArrays(names, gray, normalized)
+        self._cached_mtimes = on_disk
+        self._cached_signature = tuple((entry["name"], entry["sha1"]) for entry in manifest["templates"])
+        self.loaded_from_cache = True
+        return True
+
+    def _write_cache(self) -> None:
+        """
+        Write the current arrays and manifest to cache_dir (best effort).
+
+        The arrays go to files named after a hash of the cache contents and the manifest that
+        references them is swapped in last, so a concurrent reader sees either the old manifest
+        with the old arrays or the new manifest with the new arrays.
+        """
+        base = self._cache_base()
+        manifest_path = base + ".json"
+        arrays = self.arrays
+        templates = []
+        for name in arrays.names:
+            path = os.path.join(self.template_dir, name)
+            match = re.match(r"(\d+)c_", name)
+            templates.append({
+                "name": name,
+                "cost": int(match.group(1)) if match else None,
+                "sha1": self._file_sha1(name),
+                "mtime_ns": os.stat(path).st_mtime_ns,
+            })
+        key = hashlib.sha1(json.dumps(
+            [TEMPLATE_CACHE_VERSION, list(self.template_size), [(t["name"], t["sha1"]) for t in templates]]
+        ).encode("utf-8")).hexdigest()[:16]
+        normalized_path = f"{base}_{key}.npy"
+        gray_path = f"{base}_{key}_gray.npy"
+        manifest = {
+            "version": TEMPLATE_CACHE_VERSION,
+            "template_dir": os.path.abspath(self.template_dir),
+            "template_size": list(self.template_size),
+            "templates": templates,
+            "normalized_file": os.path.basename(normalized_path),
+            "gray_file": os.path.basename(gray_path),
+        }
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to temporary files and swap them in, so readers never see a partial file;
+            # per-process names keep concurrent writers (batch workers) from clobbering each other.
+            # Arrays already written under the same key have the same contents and are kept.
+            suffix = f".{os.getpid()}.tmp"
+            for path, array in ((normalized_path, arrays.normalized), (gray_path, arrays.gray)):
+                if os.path.exists(path):
+                    continue
+                tmp = path + suffix
+                with open(tmp, "wb") as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(tmp, path)
+            tmp = manifest_path + suffix
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, manifest_path)
+        except OSError:
+            # The in-memory bank is complete, the cache is simply rebuilt next time
+            return
+        self._remove_stale_arrays(base, {normalized_path, gray_path})
+
+    def _remove_stale_arrays(self, base: str, keep: set) -> None:
+        """
+        Delete array files of earlier caches for this size. A reader still holding the old
+        manifest then fails to open them and rebuilds from the sources; files mapped by another
+        process on Windows cannot be deleted and are retried on the next write.
+        """
+        prefix = os.path.basename(base) + "_"
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            # templates_<W>x<H>.npy is the normalized array of version 1 caches
+            stale = (name.startswith(prefix) and name.endswith(".npy")) or name == os.path.basename(base) + ".npy"
+            if stale and path not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def prepare_slots(self, slot_images: List[np.ndarray]) -> np.ndarray:
+        """
+        Convert slot crops (BGR or gray) into a (S, H*W) normalized matrix compatible with
+        self.normalized. Crops are resized to template_size if needed; empty crops become zero rows.
+        """
+        w, h = self.template_size or (0, 0)
+        stack = np.zeros((len(slot_images), h, w), dtype=np.uint8)
+        empty = np.zeros(len(slot_images), dtype=bool)
+        for i, img in enumerate(slot_images):
+            if img is None or img.size == 0:
+                empty[i] = True
+                continue
+            stack[i] = resize_gray(to_gray(img), (w, h))
+        slots = normalize_rows(stack)
+        slots[empty] = 0.0
+        return slots
+
+    def score_slots(self, slot_images: List[np.ndarray], arrays: Optional[TemplateArrays] = None) -> np.ndarray:
+        """
+        Score every slot crop against every template with one matrix product.
+
+        Since slot crops and templates have the same size, cv2.matchTemplate would return a
+        1x1 TM_CCOEFF_NORMED result per pair; this computes all of them at once.
+        arrays: snapshot of self.arrays to score against (default: the current one); pass it
+        when the names are needed too, so both come from the same version of the bank.
+        Returns a (S, N) float32 array where column j corresponds to arrays.names[j].
+        """
+        arrays = self.arrays if arrays is None else arrays
+        matrix = arrays.normalized
+        if len(slot_images) == 0 or matrix.size == 0:
+            return np.zeros((len(slot_images), len(arrays.names)), dtype=np.float32)
+        return self.prepare_slots(slot_images) @ matrix.T
+
+    def best_matches(
+        self,
+        slot_images: List[np.ndarray],
+        threshold: float,
+        early_exit_margin: Optional[float] = None,
+        chunk_size: int = 16,
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Return the best template for each slot, or None if its score is below threshold.
+
+        Templates are scored in chunks of chunk_size. When early_exit_margin is set, a slot
+        stops being scored as soon as its best candidate reaches threshold + early_exit_margin;
+        its margin is then measured against the runner-up among the templates scored so far.
+
+        Each result is a dict with keys:
+          - index: column in self.names
+          - name: template filename
+          - score: float
+          - margin: score minus runner-up score (score itself if there is no runner-up)
+        """
+        names, _, matrix = self.arrays
+        results: List[Optional[Dict[str, Any]]] = [None] * len(slot_images)
+        if len(slot_images) == 0 or matrix.size == 0:
+            return results
+
+        slots = self.prepare_slots(slot_images)
+        n = len(names)
+        if early_exit_margin is None:
+            chunk_size = n
+
+        best = np.full(len(slots), -np.inf, dtype=np.float32)
+        second = np.full(len(slots), -np.inf, dtype=np.float32)
+        best_idx = np.full(len(slots), -1, dtype=np.int64)
+        active = np.ones(len(slots), dtype=bool)
+
+        for start in range(0, n, chunk_size):
+            rows = np.flatnonzero(active)
+            if rows.size == 0:
+                break
+            chunk = slots[rows] @ matrix[start:start + chunk_size].T
+
+            # Top two of this chunk
+            c1 = chunk.argmax(axis=1)
+            v1 = chunk[np.arange(len(rows)), c1]
+            if chunk.shape[1] > 1:
+                chunk[np.arange(len(rows)), c1] = -np.inf
+                v2 = chunk.max(axis=1)
+            else:
+                v2 = np.full(len(rows), -np.inf, dtype=np.float32)
+
+            # Merge with the running top two
+            old_best, old_second = best[rows], second[rows]
+            improved = v1 > old_best
+            best[rows] = np.where(improved, v1, old_best)
+            second[rows] = np.where(improved, np.maximum(old_best, v2), np.maximum(old_second, v1))
+            best_idx[rows] = np.where(improved, start + c1, best_idx[rows])
+
+            if early_exit_margin is not None:
+                active[rows] = best[rows] < threshold + early_exit_margin
+
+        for i in range(len(slots)):
+            if best_idx[i] < 0 or best[i] < threshold:
+                continue
+            runner_up = second[i] if np.isfinite(second[i]) else 0.0
+            results[i] = {
+                "index": int(best_idx[i]),
+                "name": names[best_idx[i]],
+                "score": float(best[i]),
+                "margin": float(best[i] - runner_up),
+            }
+        return results
+
+    def items(self) -> List[Tuple[str, np.ndarray]]:
+        """
+        Return list of (filename, gray template), same shape as load_templates_from_dir output
+        but with grayscale images ready for match_template.
+        """
+        arrays = self.arrays
+        return list(zip(arrays.names, arrays.gray))
+
+
+class TemplateBankSet:
+    """
+    TemplateBanks of one template directory, one per slot size (i.e. per display geometry).
+
+    Templates are captured at a single reference resolution; each bank resamples them once
+    to the slot size of the active geometry so crops are matched at their native size.
+    Banks are built lazily on the first request for a slot size and kept (up to max_banks,
+    least recently used evicted), so switching back to a previous resolution is free.
+    """
+
+    def __init__(
+        self,
+        template_dir: str,
+        valid_exts: Optional[Tuple[str, ...]] = None,
+        max_banks: int = 4,
+        cache_dir: Optional[str] = DEFAULT_TEMPLATE_CACHE_DIR,
+    ):
+        """
+        cache_dir: compiled cache directory shared by all banks (one file set per slot size);
+        None disables the cache
+        """
+        if not os.path.isdir(template_dir):
+            raise FileNotFoundError(f"Template directory does not exist: {template_dir}")
+        self.template_dir = template_dir
+        self.valid_exts = valid_exts
+        self.max_banks = max_banks
+        self.cache_dir = cache_dir
+        self._banks: "OrderedDict[Tuple[int, int], TemplateBank]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._banks)
+
+    def get(self, slot_size: Tuple[int, int]) -> TemplateBank:
+        """Return the bank for slot_size (width, height), building it on first use."""
+        slot_size = (int(slot_size[0]), int(slot_size[1]))
+        with self._lock:
+            bank = self._banks.get(slot_size)
+            if bank is None:
+                bank = TemplateBank(self.template_dir, self.valid_exts, template_size=slot_size,
+                                    cache_dir=self.cache_dir)
+                self._banks[slot_size] = bank
+                while len(self._banks) > self.max_banks:
+                    self._banks.popitem(last=False)
+            self._banks.move_to_end(slot_size)
+            return bank
+
+    def for_regions(self, regions: List[Tuple[int, int, int, int]]) -> TemplateBank:
+        """Return the bank whose template size matches the (scaled) slot regions."""
+        slot_size = slot_size_for_regions(regions)
+        if slot_size is None:
+            raise ValueError("No slot regions given")
+        return self.get(slot_size)
+
+
+def build_template_cache(
+    template_dir: str,
+    template_size: Tuple[int, int],
+    cache_dir: str = DEFAULT_TEMPLATE_CACHE_DIR,
+    valid_exts: Optional[Tuple[str, ...]] = None,
+) -> TemplateBank:
+    """
+    Compile (or validate) the template cache for template_dir at template_size.
+
+    Returns the resulting bank; bank.loaded_from_cache tells whether an up-to-date cache existed.
+    """
+    return TemplateBank(template_dir, valid_exts, template_size=template_size, cache_dir=cache_dir)
+
+
+def match_slots(
+    bank: TemplateBank,
+    slot_images: List[np.ndarray],
+    threshold: float,
+    mode: str = "all",
+    early_exit_margin: Optional[float] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Match every slot crop against the bank.
+
+    Returns one list per slot of hits {"name", "score"} (plus "margin" in "best" mode):
+      - mode "all": every template with score >= threshold, in bank order
+      - mode "best": at most the single argmax template (see TemplateBank.best_matches)
+    """
+    if mode not in MATCH_MODES:
+        raise ValueError(f"Unknown match mode: {mode}")
+
+    if mode == "best":
+        best = bank.best_matches(slot_images, threshold, early_exit_margin=early_exit_margin)
+        return [
+            [{"name": r["name"], "score": r["score"], "margin": r["margin"]}] if r else []
+            for r in best
+        ]
+
+    arrays = bank.arrays
+    names = arrays.names
+    scores = bank.score_slots(slot_images, arrays)
+    return [
+        [{"name": names[j], "score": float(row[j])} for j in np.flatnonzero(row >= threshold)]
+        for row in scores
+    ]
+
+
+class RegionDetector:
+    """
+    Locate a single template inside a known search region of the screen.
+
+    The template is decoded, grayscale-converted and scaled once. Each detect() call first runs
+    a coarse pass on a downscaled copy of the search region; only if the coarse score comes
+    within coarse_slack of the threshold is the full-resolution template matched, and then only
+    in a small window around the coarse hit.
+    """
+
+    def __init__(
+        self,
+        template_path: str,
+        scale: Tuple[float, float] = (1.0, 1.0),
+        pyramid_factor: float = 0.5,
+        coarse_slack: float = 0.15,
+        refine_margin: int = 4,
+    ):
+        """
+        template_path: template image file
+        scale: (sx, sy) applied to the template, e.g. current resolution / template resolution
+        pyramid_factor: downscale factor of the coarse pass; >= 1 disables it
+        coarse_slack: coarse scores below threshold - coarse_slack are rejected without refinement
+        refine_margin: extra full-resolution pixels searched around the coarse hit
+        """
+        template = to_gray(load_template_bgr(template_path))
+        sx, sy = scale
+        if (sx, sy) != (1.0, 1.0):
+            h, w = template.shape
+            template = cv2.resize(template, (max(1, round(w * sx)), max(1, round(h * sy))), interpolation=cv2.INTER_AREA)
+
+        self.template_path = template_path
+        self.template = template
+        self.coarse_slack = coarse_slack
+        self.refine_margin = refine_margin
+        self.pyramid_factor = pyramid_factor
+
+        h, w = template.shape
+        coarse_w, coarse_h = int(w * pyramid_factor), int(h * pyramid_factor)
+        # The coarse pass is only meaningful while the downscaled template keeps some detail
+        if pyramid_factor < 1.0 and min(coarse_w, coarse_h) >= 8:
+            self.coarse_template = cv2.resize(template, (coarse_w, coarse_h), interpolation=cv2.INTER_AREA)
+        else:
+            self.coarse_template = None
+
+    def detect(
+        self,
+        scene: np.ndarray,
+        threshold: float = 0.7,
+        offset: Tuple[int, int] = (0, 0),
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Search scene (BGR or gray, usually the crop of the search region) for the template.
+
+        offset: position of scene in screen coordinates, added to the returned points.
+        Returns None or a dict in the same format as match_template.
+        """
+        scene_gray = to_gray(scene)
+        th, tw = self.template.shape
+        sh, sw = scene_gray.shape[:2]
+        if sh < th or sw < tw:
+            return None
+
+        x0, y0, x1, y1 = 0, 0, sw, sh
+        if self.coarse_template is not None:
+            f = self.pyramid_factor
+            small = cv2.resize(scene_gray, (int(sw * f), int(sh * f)), interpolation=cv2.INTER_AREA)
+            ch, cw = self.coarse_template.shape
+            if small.shape[0] >= ch and small.shape[1] >= cw:
+                result = cv2.matchTemplate(small, self.coarse_template, cv2.TM_CCOEFF_NORMED)
+                _, coarse_score, _, (cx, cy) = cv2.minMaxLoc(result)
+                if coarse_score < threshold - self.coarse_slack:
+                    return None
+                # Refine in a window of +-(1/f + refine_margin) pixels around the coarse hit
+                pad = int(np.ceil(1.0 / f)) + self.refine_margin
+                fx, fy = int(cx / f), int(cy / f)
+                x0, y0 = max(0, fx - pad), max(0, fy - pad)
+                x1, y1 = min(sw, fx + tw + pad), min(sh, fy + th + pad)
+
+        hit = match_template(scene_gray[y0:y1, x0:x1], self.template, threshold=threshold)
+        if hit is None:
+            return None
+
+        dx, dy = offset[0] + x0, offset[1] + y0
+        return {
+            "score": hit["score"],
+            "top_left": (hit["top_left"][0] + dx, hit["top_left"][1] + dy),
+            "bottom_right": (hit["bottom_right"][0] + dx, hit["bottom_right"][1] + dy),
+            "center": (hit["center"][0] + dx, hit["center"][1] + dy),
+        }
@@ -4,34 +4,321 @@ OCR模块 - 用于识别指定区域的数字
 """
 
 import cv2
+import hashlib
 import numpy as np
-import pytesseract
-from typing import Optional, Tuple
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, List, Optional, Tuple
 import logging
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 日志格式由入口程序配置，导入本模块时不修改全局logging
 logger = logging.getLogger(__name__)
 
+# Tesseract为可选依赖，首次需要时才导入，未安装时只使用字形分类器
+_pytesseract = None
+_pytesseract_loaded = False
+
+# 可选的OCR后端：auto先用游戏字体字形（ocr_glyphs/或Tesseract确认过的字形），没有把握时回退Tesseract；
+# glyph只用字形分类器（含合成字体原型）；tesseract只用Tesseract。
+# 合成原型来自Hershey字体而不是游戏字体，会把"6"读成"5"，因此默认仍为tesseract
+OCR_BACKENDS = ("auto", "glyph", "tesseract")
+DEFAULT_OCR_BACKEND = "tesseract"
+
+# 字形分类器支持的字符和归一化尺寸 (宽, 高)
+GLYPH_LABELS = "0123456789-"
+GLYPH_SIZE = (12, 16)
+DEFAULT_GLYPH_DIR = "ocr_glyphs"
+
+
+def load_pytesseract():
+    """导入并返回pytesseract模块，未安装时返回None（只导入一次）"""
+    global _pytesseract, _pytesseract_loaded
+    if not _pytesseract_loaded:
+        try:
+            import pytesseract
+            _pytesseract = pytesseract
+        except ImportError:
+            _pytesseract = None
+        _pytesseract_loaded = True
+    return _pytesseract
+
+
+def binarize_digits(image: np.ndarray) -> np.ndarray:
+    """把数字区域二值化为前景为1的掩码
+    
+    Otsu阈值后若前景超过一半像素则反色，保证文字为前景。
+    """
+    if len(image.shape) == 3:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = image
+    _, mask = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if mask.mean() > 0.5:
+        mask = 1 - mask
+    return mask
+
+
+def parse_number_text(text: Optional[str]) -> Optional[int]:
+    """解析Level数字，只接受0-80范围内的纯数字"""
+    text = (text or "").strip()
+    if text.isdigit():
+        number = int(text)
+        if 0 <= number <= 80:
+            return number
+    return None
+
+
+def parse_stage_text(text: Optional[str]) -> Optional[int]:
+    """解析阶段文本，如"4-1" -> 41
+    
+    也接受漏识别横杠的两位数字"41"。
+    """
+    text = (text or "").strip().replace(' ', '')
+    if '-' in text:
+        parts = text.split('-')
+    elif len(text) == 2:
+        parts = [text[0], text[1]]
+    else:
+        return None
+    
+    if len(parts) != 2 or not all(part.isdigit() and len(part) == 1 for part in parts):
+        return None
+    
+    major, minor = int(parts[0]), int(parts[1])
+    if 1 <= major <= 9 and 1 <= minor <= 9:
+        return major * 10 + minor
+    return None
+
+
+class DigitGlyphClassifier:
+    """进程内的数字字形分类器
+    
+    把二值化的区域按连通域切分成单个字形，以行高为基准归一化到固定尺寸，
+    再与数字和横杠的原型做向量化距离比较。原型来自合成字体（synthetic为True时）、
+    glyph_dir中的字形图片（文件名首字符为标签，横杠用"dash"），以及Tesseract确认过的结果。
+    """
+    
+    def __init__(self, glyph_dir: Optional[str] = DEFAULT_GLYPH_DIR, max_distance: float = 0.12,
+                 max_learned_per_label: int = 8, synthetic: bool = True):
+        """初始化分类器
+        
+        Args:
+            glyph_dir: 字形图片目录，不存在时没有游戏字体原型
+            max_distance: 接受识别结果的最大平均平方距离
+            max_learned_per_label: 每个字符最多保留的学习原型数
+            synthetic: 是否加入OpenCV Hershey字体渲染的合成原型
+        """
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._base: List[Tuple[str, np.ndarray]] = []
+        self._learned = {label: deque(maxlen=max_learned_per_label) for label in GLYPH_LABELS}
+        
+        if synthetic:
+            self._add_synthetic_prototypes()
+        if glyph_dir and os.path.isdir(glyph_dir):
+            self._load_glyph_dir(glyph_dir)
+        self._rebuild()
+    
+    @property
+    def prototype_count(self) -> int:
+        """当前的原型数（合成、字形图片和学习到的）"""
+        return len(self._prototypes)
+    
+    def _add_synthetic_prototypes(self):
+        """用OpenCV字体渲染原型，夹在两个0之间以获得正确的行高"""
+        for font in (cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX, cv2.FONT_HERSHEY_TRIPLEX):
+            for thickness in (1, 2, 3):
+                for label in GLYPH_LABELS:
+                    canvas = np.zeros((48, 96), dtype=np.uint8)
+                    cv2.putText(canvas, f"0{label}0", (4, 38), font, 1.2, 255, thickness)
+                    vectors = self.extract(canvas)
+                    if len(vectors) == 3:
+                        self._base.append((label, vectors[1]))
+    
+    def _load_glyph_dir(self, glyph_dir: str):
+        """加载字形图片，每张图片为整行高度的单个字符"""
+        for filename in sorted(os.listdir(glyph_dir)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in (".png", ".jpg", ".jpeg", ".bmp"):
+                continue
+            label = "-" if stem.lower().startswith("dash") else stem[:1]
+            if label not in GLYPH_LABELS:
+                continue
+            image = cv2.imread(os.path.join(glyph_dir, filename), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            mask = binarize_digits(image)
+            cols = np.flatnonzero(mask.any(axis=0))
+            if cols.size == 0:
+                continue
+            self._base.append((label, self._normalize(mask[:, cols[0]:cols[-1] + 1])))
+    
+    def _rebuild(self):
+        """按标签排序后堆叠成原型矩阵，便于按标签分段取最小距离"""
+        entries = list(self._base)
+        for label, vectors in self._learned.items():
+            entries.extend((label, vector) for vector in vectors)
+        entries.sort(key=lambda entry: GLYPH_LABELS.index(entry[0]))
+        
+        if not entries:
+            self._prototypes = np.empty((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+            self._proto_sq = np.empty(0, dtype=np.float32)
+            self._label_chars = []
+            self._label_starts = np.empty(0, dtype=np.intp)
+            return
+        
+        prototypes = np.stack([vector for _, vector in entries]).astype(np.float32)
+        labels = [label for label, _ in entries]
+        starts = [labels.index(label) for label in GLYPH_LABELS if label in labels]
+        
+        self._prototypes = prototypes
+        self._proto_sq = (prototypes * prototypes).sum(axis=1)
+        self._label_chars = [labels[start] for start in starts]
+        self._label_starts = np.array(starts, dtype=np.intp)
+    
+    @staticmethod
+    def _normalize(glyph: np.ndarray) -> np.ndarray:
+        """把整行高度的字形居中放入固定宽高比的框并缩放为向量"""
+        h, w = glyph.shape
+        box_w = max(w, int(round(h * GLYPH_SIZE[0] / GLYPH_SIZE[1])))
+        canvas = np.zeros((h, box_w), dtype=np.float32)
+        offset = (box_w - w) // 2
+        canvas[:, offset:offset + w] = glyph
+        return cv2.resize(canvas, GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel()
+    
+    def extract(self, image: np.ndarray) -> List[np.ndarray]:
+        """把区域切分成从左到右的字形向量"""
+        mask = binarize_digits(image)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if count <= 1:
+            return []
+        
+        h, w = mask.shape
+        min_area = max(2, int(0.002 * h * w))
+        components = [i for i in range(1, count) if stats[i, cv2.CC_STAT_AREA] >= min_area]
+        if not components:
+            return []
+        
+        # 行高由较高的连通域决定；矮的连通域只有形似横杠时才保留
+        tallest = max(stats[i, cv2.CC_STAT_HEIGHT] for i in components)
+        digits = [i for i in components if stats[i, cv2.CC_STAT_HEIGHT] >= 0.5 * tallest]
+        dashes = [i for i in components if i not in digits
+                  and stats[i, cv2.CC_STAT_WIDTH] >= 1.5 * stats[i, cv2.CC_STAT_HEIGHT]]
+        top = min(stats[i, cv2.CC_STAT_TOP] for i in digits)
+        bottom = max(stats[i, cv2.CC_STAT_TOP] + stats[i, cv2.CC_STAT_HEIGHT] for i in digits)
+        
+        vectors = []
+        for i in sorted(digits + dashes, key=lambda i: stats[i, cv2.CC_STAT_LEFT]):
+            x, width = stats[i, cv2.CC_STAT_LEFT], stats[i, cv2.CC_STAT_WIDTH]
+            glyph = (labels[top:bottom, x:x + width] == i).astype(np.float32)
+            vectors.append(self._normalize(glyph))
+        return vectors
+    
+    def classify(self, vectors: List[np.ndarray]) -> Tuple[str, float]:
+        """对字形向量分类
+        
+        Returns:
+            (识别文本, 置信度)。置信度为各字形中最差的
+            1 - 最近距离/次近其他字符距离；任一字形距离超过max_distance时为0，
+            没有任何原型时为 ("", 0)。
+        """
+        with self._lock:
+            prototypes, proto_sq = self._prototypes, self._proto_sq
+            label_chars, label_starts = self._label_chars, self._label_starts
+        if not vectors or not label_chars:
+            return "", 0.0
+        
+        queries = np.stack(vectors).astype(np.float32)
+        
+        # |q-p|^2 = |q|^2 + |p|^2 - 2 q·p，一次矩阵乘法得到全部距离
+        distances = (queries * queries).sum(axis=1)[:, None] + proto_sq[None, :] - 2.0 * queries @ prototypes.T
+        distances = np.maximum(distances, 0.0) / queries.shape[1]
+        per_label = np.minimum.reduceat(distances, label_starts, axis=1)
+        
+        order = np.argsort(per_label, axis=1)
+        rows = np.arange(len(vectors))
+        best = per_label[rows, order[:, 0]]
+        text = "".join(label_chars[j] for j in order[:, 0])
+        
+        if best.max() > self.max_distance:
+            return text, 0.0
+        if per_label.shape[1] < 2:
+            return text, 1.0
+        runner_up = per_label[rows, order[:, 1]]
+        confidence = float(np.min(1.0 - best / np.maximum(runner_up, 1e-6)))
+        return text, confidence
+    
+    def read(self, image: np.ndarray) -> Tuple[str, float]:
+        """识别区域中的字符串"""
+        return self.classify(self.extract(image))
+    
+    def learn(self, image: np.ndarray, text: str) -> bool:
+        """用已确认的文本为区域中的字形补充原型
+        
+        只有切分出的字形数与文本长度一致时才学习。
+        """
+        vectors = self.extract(image)
+        if not text or len(vectors) != len(text) or any(char not in GLYPH_LABELS for char in text):
+            return False
+        with self._lock:
+            for char, vector in zip(text, vectors):
+                self._learned[char].append(vector)
+            self._rebuild()
+        return True
+
+
 class NumberOCR:
     """数字OCR识别器"""
     
-    def __init__(self, tesseract_path: Optional[str] = None):
+    def __init__(self, tesseract_path: Optional[str] = None, cache_size: int = 64, backend: str = DEFAULT_OCR_BACKEND,
+                 glyph_dir: Optional[str] = DEFAULT_GLYPH_DIR, glyph_min_confidence: float = 0.5):
         """初始化OCR识别器
         
         Args:
             tesseract_path: Tesseract可执行文件路径（Windows需要）
+            cache_size: 区域指纹缓存的最大条目数，0表示不缓存
+            backend: OCR后端，见OCR_BACKENDS
+            glyph_dir: 字形分类器的字形图片目录
+            glyph_min_confidence: 字形分类结果低于该置信度时回退Tesseract；置信度是最近字符相对
+                次近其他字符的距离余量，0.5表示次近字符的距离至少是最近字符的两倍
         """
-        if tesseract_path:
-            pytesseract.pytesseract.tesseract_cmd = tesseract_path
+        if backend not in OCR_BACKENDS:
+            raise ValueError(f"未知的OCR后端: {backend}，可选: {', '.join(OCR_BACKENDS)}")
+        # glyph后端不需要Tesseract，不导入pytesseract
+        self._pytesseract = load_pytesseract() if backend != "glyph" else None
+        if backend == "tesseract" and self._pytesseract is None:
+            raise RuntimeError("pytesseract未安装，无法使用tesseract后端")
+        
+        self.backend = backend
+        self.tesseract_available = self._pytesseract is not None
+        if tesseract_path and self._pytesseract is not None:
+            self._pytesseract.pytesseract.tesseract_cmd = tesseract_path
         
         # 配置Tesseract参数，优化数字识别
         self.config = '--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789'
+        self.stage_config = '--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789-'
+        
+        # 字形分类器，tesseract后端下不创建。auto不使用合成原型：Hershey字体与游戏字体不同，
+        # 在ocr_glyphs/提供游戏字体字形或Tesseract确认过字形之前，auto全部交给Tesseract
+        self.glyph_classifier = None
+        self.glyph_min_confidence = glyph_min_confidence
+        if backend != "tesseract":
+            self.glyph_classifier = DigitGlyphClassifier(glyph_dir, synthetic=backend == "glyph")
+            if backend == "auto" and not self.tesseract_available and not self.glyph_classifier.prototype_count:
+                logger.warning("pytesseract未安装且没有游戏字体字形(ocr_glyphs/)，auto后端无法识别数字")
         
         # 记忆上次识别结果，用于OCR失败时的回退
         self.last_recognized_number = None
         
-        logger.info("NumberOCR initialized")
+        # 区域指纹 -> 识别结果的LRU缓存，画面未变化时跳过Tesseract
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        logger.info(f"NumberOCR initialized (backend: {backend})")
     
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """预处理图像以提高OCR识别准确率
@@ -65,9 +352,66 @@ class NumberOCR:
         
         return cleaned
     
+    def fingerprint(self, image: np.ndarray) -> bytes:
+        """计算区域图像的指纹
+        
+        对半尺寸灰度图做Otsu二值化后打包成位图再取哈希，
+        画面上数字不变时指纹稳定，不受轻微亮度变化影响。
+        
+        Args:
+            image: 输入图像
+            
+        Returns:
+            指纹字节串
+        """
+        if len(image.shape) == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+        
+        h, w = gray.shape
+        small = cv2.resize(gray, (max(1, w // 2), max(1, h // 2)), interpolation=cv2.INTER_AREA)
+        _, bitmap = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        
+        digest = hashlib.blake2b(np.packbits(bitmap).tobytes(), digest_size=16)
+        digest.update(np.array(small.shape, dtype=np.int32).tobytes())
+        return digest.digest()
+    
+    def clear_cache(self):
+        """清空指纹缓存"""
+        with self._cache_lock:
+            self._cache.clear()
+    
+    def _cached_read(self, kind: bytes, image: np.ndarray, reader: Callable[[np.ndarray], Optional[int]]) -> Optional[int]:
+        """先查指纹缓存，未命中才调用reader识别并写入缓存
+        
+        识别失败（None）也缓存，同样的画面不再重复识别。
+        """
+        key = None
+        if self.cache_size > 0:
+            key = kind + self.fingerprint(image)
+            with self._cache_lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.cache_hits += 1
+                    return self._cache[key]
+                self.cache_misses += 1
+        
+        value = reader(image)
+        
+        if key is not None:
+            with self._cache_lock:
+                self._cache[key] = value
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return value
+    
     def recognize_number(self, image: np.ndarray) -> int:
         """识别图像中的数字
         
+        先查指纹缓存，命中时直接返回缓存结果，未命中才执行识别。
+        
         Args:
             image: 输入图像
             
@@ -75,38 +419,84 @@ class NumberOCR:
             识别出的数字，如果识别失败则返回上次结果或默认值2
         """
         try:
-            # 预处理图像
-            processed = self.preprocess_image(image)
+            number = self._cached_read(b"number", image, self._read_number)
             
-            # 使用Tesseract进行OCR识别
-            text = pytesseract.image_to_string(processed, config=self.config)
-            
-            # 清理识别结果
-            text = text.strip()
-            
-            # 尝试提取数字
-            if text and text.isdigit():
-                number = int(text)
-                # 验证数字范围（0-80）
-                if 0 <= number <= 80:
-                    # logger.info(f"OCR识别成功: {number}")
-                    # 更新上次识别结果
-                    self.last_recognized_number = number
-                    return number
-                else:
-                    logger.warning(f"OCR识别结果超出范围: {number}")
-                    # 超出范围时使用上次结果或默认值
-                    return self._get_fallback_number()
-            else:
-                logger.warning(f"OCR识别失败，结果: '{text}'")
+            if number is None:
                 # 识别失败时使用上次结果或默认值
                 return self._get_fallback_number()
+            
+            # 更新上次识别结果
+            self.last_recognized_number = number
+            return number
                 
         except Exception as e:
             logger.error(f"OCR识别出错: {e}")
             # 出错时使用上次结果或默认值
             return self._get_fallback_number()
     
+    def recognize_stage(self, image: np.ndarray) -> Optional[int]:
+        """识别阶段文本，如"4-1"返回41
+        
+        Args:
+            image: 阶段区域图像
+            
+        Returns:
+            阶段值，识别失败返回None
+        """
+        try:
+            return self._cached_read(b"stage", image, self._read_stage)
+        except Exception as e:
+            logger.error(f"阶段识别出错: {e}")
+            return None
+    
+    def _read_number(self, image: np.ndarray) -> Optional[int]:
+        return self._read(image, parse_number_text, self.config)
+    
+    def _read_stage(self, image: np.ndarray) -> Optional[int]:
+        return self._read(image, parse_stage_text, self.stage_config)
+    
+    def _read(self, image: np.ndarray, parser: Callable[[str], Optional[int]], tesseract_config: str) -> Optional[int]:
+        """按后端识别并解析
+        
+        字形分类器置信度足够时直接返回；否则回退Tesseract，
+        Tesseract的有效结果会作为原型反馈给字形分类器。
+        """
+        if self.glyph_classifier is not None:
+            text, confidence = self.glyph_classifier.read(image)
+            value = parser(text)
+            if value is not None and confidence >= self.glyph_min_confidence:
+                return value
+            if not self.tesseract_available:
+                logger.warning(f"字形识别失败，结果: '{text}' (置信度 {confidence:.2f})")
+                return None
+        
+        text = self._recognize_with_tesseract(image, tesseract_config)
+        value = parser(text)
+        if value is None:
+            logger.warning(f"OCR识别失败，结果: '{text}'")
+        elif self.glyph_classifier is not None:
+            self.glyph_classifier.learn(image, text)
+        return value
+    
+    def _recognize_with_tesseract(self, image: np.ndarray, config: str) -> str:
+        """使用Tesseract识别文本
+        
+        Args:
+            image: 输入图像
+            config: Tesseract参数
+            
+        Returns:
+            去除首尾空白的识别文本
+        """
+        # 预处理图像
+        processed = self.preprocess_image(image)
+        
+        # 使用Tesseract进行OCR识别
+        text = self._pytesseract.image_to_string(processed, config=config)
+        
+        # 清理识别结果
+        return text.strip()
+    
     def _get_fallback_number(self) -> int:
         """获取回退数字（上次识别结果或默认值2）
         
@@ -305,8 +695,16 @@ def test_ocr():
     result = ocr.recognize_number(test_img)
     print(f"识别结果: {result}")
     
+    if ocr.glyph_classifier is not None:
+        print(f"字形分类结果: {ocr.glyph_classifier.read(test_img)}")
+    
+    print("测试指纹缓存...")
+    ocr.recognize_number(test_img)
+    print(f"缓存命中: {ocr.cache_hits}, 未命中: {ocr.cache_misses}")
+    
     print("OCR模块测试完成")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     test_ocr()
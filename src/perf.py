@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+延迟统计模块 - 记录识别流水线各阶段的耗时，提供滚动分位数和整个会话的直方图
+
+每次记录只做一次加锁、一次deque追加和一次对数分桶，开销在微秒级，可以常开。
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+
+# 流水线阶段，按执行顺序；PERF_STAGE_NAMES为GUI显示的名称
+PERF_STAGES = ("capture", "crop", "score", "ocr", "db_write", "chart")
+PERF_STAGE_NAMES = {
+    "capture": "截图",
+    "crop": "裁剪",
+    "score": "模板打分",
+    "ocr": "OCR",
+    "db_write": "数据库写入",
+    "chart": "图表刷新",
+}
+PERCENTILES = (50, 95, 99)
+
+# 直方图按对数分桶：10微秒起，每桶宽度约10%，覆盖到约100秒
+_BUCKET_MIN = 1e-5
+_BUCKET_GROWTH = 1.1
+_BUCKET_COUNT = 170
+_LOG_GROWTH = math.log(_BUCKET_GROWTH)
+
+
+def _bucket_index(seconds: float) -> int:
+    if seconds <= _BUCKET_MIN:
+        return 0
+    return min(_BUCKET_COUNT - 1, int(math.log(seconds / _BUCKET_MIN) / _LOG_GROWTH) + 1)
+
+
+def _bucket_value(index: int) -> float:
+    """桶的代表值（秒），取上下界的几何中点"""
+    if index == 0:
+        return _BUCKET_MIN
+    return _BUCKET_MIN * _BUCKET_GROWTH ** (index - 0.5)
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法求分位数"""
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StageLatency:
+    """单个阶段的耗时：最近window次的原始值和整个会话的对数直方图"""
+
+    def __init__(self, window: int):
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.buckets = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.recent.append(seconds)
+        self.buckets[_bucket_index(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def recent_summary(self) -> Dict[str, float]:
+        """最近window次的分位数（毫秒）"""
+        values = sorted(self.recent)
+        if not values:
+            return {}
+        summary = {f"p{p}": _percentile(values, p) * 1000.0 for p in PERCENTILES}
+        summary["count"] = self.count
+        return summary
+
+    def session_summary(self) -> Dict[str, float]:
+        """整个会话的分位数、均值和最大值（毫秒），分位数取所在直方图桶的代表值"""
+        if not self.count:
+            return {}
+        summary = {}
+        for p in PERCENTILES:
+            rank = max(1, math.ceil(p / 100.0 * self.count))
+            seen = 0
+            for index, bucket in enumerate(self.buckets):
+                seen += bucket
+                if seen >= rank:
+                    summary[f"p{p}"] = min(_bucket_value(index), self.max) * 1000.0
+                    break
+        summary["count"] = self.count
+        summary["mean"] = self.total / self.count * 1000.0
+        summary["max"] = self.max * 1000.0
+        return summary
+
+
+class LatencyTracker:
+    """线程安全的各阶段耗时统计
+
+    识别线程、调度线程和主线程都可以记录；每次记录递增version，
+    GUI据此判断性能面板是否需要刷新。
+    """
+
+    def __init__(self, window: int = 200):
+        """初始化
+
+        Args:
+            window: 滚动分位数使用的最近样本数
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageLatency] = {}
+        self.version = 0
+
+    def reset(self):
+        """清空所有阶段的统计（新会话开始时调用）"""
+        with self._lock:
+            self._stages = {}
+            self.version += 1
+
+    def record(self, stage: str, seconds: float):
+        """记录一次耗时（秒）"""
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageLatency(self.window)
+            stats.add(seconds)
+            self.version += 1
+
+    @contextmanager
+    def time(self, stage: str):
+        """用单调时钟计时with块，异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def _ordered(self) -> List[str]:
+        known = [stage for stage in PERF_STAGES if stage in self._stages]
+        return known + sorted(stage for stage in self._stages if stage not in PERF_STAGES)
+
+    def recent(self) -> Dict[str, Dict[str, float]]:
+        """各阶段最近样本的p50/p95/p99（毫秒）和累计次数，按流水线顺序"""
+        with self._lock:
+            return {stage: self._stages[stage].recent_summary() for stage in self._ordered()}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各阶段整个会话的p50/p95/p99、均值、最大值（毫秒）和次数，按流水线顺序"""
+        with self._lock:
+            return {stage: self._stages[stage].session_summary() for stage in self._ordered()}
+
+
+def stage_label(stage: str) -> str:
+    return PERF_STAGE_NAMES.get(stage, stage)
+
+
+def format_summary_line(stage: str, summary: Optional[Dict[str, float]]) -> str:
+    """单行文本：阶段名、次数和p50/p95/p99（毫秒）"""
+    if not summary:
+        return f"{stage_label(stage)}: -"
+    return (f"{stage_label(stage)}: p50 {summary['p50']:.1f} / p95 {summary['p95']:.1f} / "
+            f"p99 {summary['p99']:.1f} ms ({summary['count']}次)")
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+性能剖析模块 - 对接下来N次触发或N秒的后台循环做剖析，结果写入日志目录
+
+两种方式：
+- cProfile: 确定性剖析，输出.prof（可用snakeviz/pstats打开）和按耗时排序的文本报告
+- 采样: 后台线程定时读取被剖析线程的调用栈，开销低，输出文本报告和折叠栈（.folded，可生成火焰图）
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Optional, Set, Tuple
+
+# 函数标识 (文件名, 定义行号, 函数名)
+FunctionKey = Tuple[str, int, str]
+
+
+def log_directory_from_config(config_path: str = "config.json", default: str = "log") -> str:
+    """读取配置文件中的database.log_directory"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("database", {}).get("log_directory", default)
+    except (OSError, ValueError):
+        return default
+
+
+def _function_label(key: FunctionKey) -> str:
+    filename, lineno, name = key
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+class StackSampler:
+    """定时采样指定线程的调用栈"""
+
+    def __init__(self, interval: float = 0.005):
+        """初始化
+
+        Args:
+            interval: 采样间隔（秒）
+        """
+        self.interval = interval
+        self.thread_ids: Set[int] = set()
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            thread_ids = set(self.thread_ids)
+            if not thread_ids:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in thread_ids:
+                    self._add(frame)
+
+    def _add(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if not stack:
+            return
+        self.samples += 1
+        self.self_counts[stack[0]] += 1
+        for key in set(stack):
+            self.total_counts[key] += 1
+        self.stacks[";".join(key[2] for key in reversed(stack))] += 1
+
+    def report(self, top: int) -> str:
+        """按自身和累计采样数排序的文本报告"""
+        lines = [f"采样数: {self.samples} (间隔 {self.interval * 1000:.1f}ms)", ""]
+        for title, counts in (("按自身采样数排序", self.self_counts), ("按累计采样数排序", self.total_counts)):
+            lines.append(f"=== {title} ===")
+            lines.append(f"{'占比':>7} {'采样':>7}  函数")
+            for key, count in counts.most_common(top):
+                lines.append(f"{count / self.samples * 100:6.1f}% {count:7d}  {_function_label(key)}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+class PipelineProfiler:
+    """对识别流水线的接下来triggers次触发，或从第一次剖析起seconds秒内的后台循环做剖析
+
+    在要剖析的代码外使用 `with profiler.profile():`；达到次数或时长后自动写出结果，
+    之后profile()不再有任何开销。同一时间只剖析一个线程，其他线程的调用照常执行。
+    """
+
+    def __init__(self, output_dir: str, label: str, session_id: Optional[int] = None,
+                 triggers: Optional[int] = None, seconds: Optional[float] = None, sampling: bool = False,
+                 sample_interval: float = 0.005, top: int = 40,
+                 on_dump: Optional[Callable[[List[str]], None]] = None):
+        """初始化
+
+        Args:
+            output_dir: 结果输出目录（配置中的log_directory）
+            label: 输出文件名中的标签，如gui、continuous
+            session_id: 统计会话ID，写入文件名
+            triggers: 剖析的触发次数
+            seconds: 剖析的时长（秒），与triggers同时指定时先达到者结束
+            sampling: 使用采样剖析代替cProfile
+            sample_interval: 采样间隔（秒）
+            top: 文本报告列出的函数数
+            on_dump: 写出结果后的回调，参数为输出文件路径列表
+        """
+        if not triggers and not seconds:
+            raise ValueError("需要指定剖析的触发次数或时长")
+        self.output_dir = output_dir
+        self.label = label
+        self.session_id = session_id
+        self.triggers = triggers
+        self.seconds = seconds
+        self.sampling = sampling
+        self.top = top
+        self.on_dump = on_dump
+
+        self.runs = 0
+        self.done = False
+        self.output_paths: List[str] = []
+        self._busy = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._started: Optional[float] = None
+        self._profiled_seconds = 0.0
+        self._profile = None if sampling else cProfile.Profile()
+        self._sampler = StackSampler(sample_interval) if sampling else None
+
+    @contextmanager
+    def profile(self):
+        """剖析with块；已结束或其他线程正在剖析时直接执行"""
+        if self.done or not self._busy.acquire(blocking=False):
+            yield
+            return
+        try:
+            if self.done:
+                yield
+                return
+            if self._started is None:
+                self._started = time.monotonic()
+                if self._sampler is not None:
+                    self._sampler.start()
+            start = time.perf_counter()
+            self._enable()
+            try:
+                yield
+            finally:
+                self._disable()
+                self._profiled_seconds += time.perf_counter() - start
+                self.runs += 1
+        finally:
+            self._busy.release()
+        if self._limit_reached():
+            self.finish()
+
+    def _enable(self):
+        if self._sampler is not None:
+            self._sampler.thread_ids.add(threading.get_ident())
+        else:
+            self._profile.enable()
+
+    def _disable(self):
+        if self._sampler is not None:
+            self._sampler.thread_ids.discard(threading.get_ident())
+        else:
+            self._profile.disable()
+
+    def _limit_reached(self) -> bool:
+        if self.triggers and self.runs >= self.triggers:
+            return True
+        return bool(self.seconds) and time.monotonic() - self._started >= self.seconds
+
+    def finish(self) -> List[str]:
+        """结束剖析并写出结果（可重复调用）；没有剖析到任何调用时不写文件"""
+        with self._state_lock:
+            if self.done:
+                return self.output_paths
+            self.done = True
+        # 等待正在进行的剖析结束
+        with self._busy:
+            if self._sampler is not None:
+                self._sampler.stop()
+            if self.runs:
+                self.output_paths = self._dump()
+        if self.output_paths and self.on_dump is not None:
+            self.on_dump(self.output_paths)
+        return self.output_paths
+
+    def _header(self) -> str:
+        wall = time.monotonic() - self._started if self._started is not None else 0.0
+        return "\n".join([
+            f"剖析: {self.label}  会话: {self.session_id if self.session_id is not None else '-'}",
+            f"方式: {'采样' if self.sampling else 'cProfile'}",
+            f"剖析次数: {self.runs}  剖析内耗时: {self._profiled_seconds:.3f}s  总时长: {wall:.1f}s",
+            "",
+        ])
+
+    def _dump(self) -> List[str]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        session = f"session{self.session_id}" if self.session_id is not None else "nosession"
+        timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+        mode = "sample" if self.sampling else "cprofile"
+        prefix = os.path.join(self.output_dir, f"profile_{self.label}_{session}_{timestamp}_{mode}")
+        paths = []
+
+        if self._sampler is not None:
+            report = self._sampler.report(self.top)
+            with open(prefix + ".folded", 'w', encoding='utf-8') as f:
+                for stack, count in self._sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            paths.append(prefix + ".folded")
+        else:
+            self._profile.dump_stats(prefix + ".prof")
+            paths.append(prefix + ".prof")
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream).strip_dirs()
+            for sort_key in ("cumulative", "tottime"):
+                stream.write(f"=== 按 {sort_key} 排序 ===\n")
+                stats.sort_stats(sort_key).print_stats(self.top)
+            report = stream.getvalue()
+
+        with open(prefix + ".txt", 'w', encoding='utf-8') as f:
+            f.write(self._header())
+            f.write(report)
+        paths.append(prefix + ".txt")
+        return paths
+
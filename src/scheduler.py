@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+识别调度模块 - 每个tick只截一次屏，各检测器按自己的节奏和状态在同一帧上运行
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .capture import Frame, grab_frame
+from .perf import LatencyTracker
+from .profiling import PipelineProfiler
+
+
+Region = Tuple[int, int, int, int]
+# 固定秒数，或每次运行后调用以获得下一次间隔的函数
+Interval = Union[float, Callable[[], float]]
+
+
+class ScheduledDetector:
+    """调度器中注册的一个检测器
+
+    interval为None时只在trigger()后运行一次，也可以是返回秒数的函数（自适应节奏）；
+    enabled返回False时跳过且不计时。timed为True时，它运行的tick的截图耗时计入capture阶段。
+    """
+
+    def __init__(self, name: str, callback: Callable[[Frame], None], regions: Iterable[Region],
+                 interval: Optional[Interval] = None, enabled: Optional[Callable[[], bool]] = None,
+                 timed: bool = False):
+        self.name = name
+        self.callback = callback
+        self.regions: List[Region] = [tuple(region) for region in regions]
+        self.interval = interval
+        self.enabled = enabled
+        self.timed = timed
+        self.next_due = 0.0
+        self.triggered = False
+        self.run_count = 0
+
+    def is_enabled(self) -> bool:
+        return self.enabled is None or bool(self.enabled())
+
+    def current_interval(self) -> Optional[float]:
+        """当前的运行间隔（秒）"""
+        if callable(self.interval):
+            return self.interval()
+        return self.interval
+
+    def is_due(self, now: float) -> bool:
+        """是否应在本tick运行"""
+        if self.triggered:
+            return True
+        if self.interval is None or not self.is_enabled():
+            return False
+        return now >= self.next_due
+
+
+class RecognitionScheduler:
+    """统一的识别调度器
+
+    每个tick先找出到期的检测器，用它们区域的并集截一次屏，然后按注册顺序
+    在这一帧上依次运行。某个检测器在回调中trigger()了排在它后面的检测器时，
+    后者在同一tick、同一帧上运行，因此前者注册时应把后者需要的区域一并声明。
+    """
+
+    def __init__(self, monitor_index: int = 1, tick_interval: float = 0.05,
+                 capture: Callable[..., Frame] = grab_frame,
+                 on_error: Optional[Callable[[str, Exception], None]] = None,
+                 latency: Optional[LatencyTracker] = None,
+                 profiler: Optional[PipelineProfiler] = None):
+        """初始化调度器
+
+        Args:
+            monitor_index: 截图的显示器索引
+            tick_interval: 没有检测器到期时的最长等待时间（秒）
+            capture: 截图函数，签名同capture.grab_frame
+            on_error: 检测器出错时的回调 (检测器名, 异常)
+            latency: 记录截图耗时（capture阶段）的延迟统计，只统计运行了timed检测器的tick
+            profiler: 指定时对调度线程的每个tick做性能剖析（剖析器自行决定何时结束）
+        """
+        self.monitor_index = monitor_index
+        self.tick_interval = tick_interval
+        self.capture = capture
+        self.on_error = on_error
+        self.latency = latency
+        self.profiler = profiler
+
+        self._detectors: List[ScheduledDetector] = []
+        self._by_name: Dict[str, ScheduledDetector] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.tick_count = 0
+        self.capture_count = 0
+
+    def register(self, name: str, callback: Callable[[Frame], None], regions: Iterable[Region],
+                 interval: Optional[Interval] = None,
+                 enabled: Optional[Callable[[], bool]] = None, timed: bool = False) -> ScheduledDetector:
+        """注册检测器，运行顺序即注册顺序；timed见ScheduledDetector"""
+        detector = ScheduledDetector(name, callback, regions, interval, enabled, timed)
+        with self._lock:
+            if name in self._by_name:
+                raise ValueError(f"检测器已存在: {name}")
+            self._detectors.append(detector)
+            self._by_name[name] = detector
+        return detector
+
+    def get(self, name: str) -> ScheduledDetector:
+        return self._by_name[name]
+
+    def trigger(self, name: str):
+        """让检测器在下一个tick（或当前tick中稍后）运行一次，可从任意线程调用"""
+        self._by_name[name].triggered = True
+        self._wake.set()
+
+    def reset_timer(self, name: str, delay: float = 0.0):
+        """把检测器的下次运行时间设为delay秒之后"""
+        self._by_name[name].next_due = time.monotonic() + delay
+        self._wake.set()
+
+    def run_once(self, now: Optional[float] = None) -> Optional[Frame]:
+        """执行一个tick，返回本tick使用的帧；没有到期检测器时返回None"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            detectors = list(self._detectors)
+
+        due = [detector for detector in detectors if detector.is_due(now)]
+        if not due:
+            return None
+
+        regions = [region for detector in due for region in detector.regions]
+        captured = set(regions)
+        capture_start = time.perf_counter()
+        frame = self.capture(regions, monitor_index=self.monitor_index)
+        capture_seconds = time.perf_counter() - capture_start
+        timed_ran = False
+        self.tick_count += 1
+        self.capture_count += 1
+
+        # 按注册顺序运行；前面的检测器（或其他线程）可以在本tick内触发后面的检测器。
+        # 截图之后才被触发的检测器只有在本帧包含它的全部区域时才运行，
+        # 否则保留triggered，下一个tick按它的区域重新截图
+        for detector in detectors:
+            if detector not in due:
+                if not detector.triggered:
+                    continue
+                if not all(region in captured for region in detector.regions):
+                    self._wake.set()
+                    continue
+            detector.triggered = False
+            detector.run_count += 1
+            timed_ran = timed_ran or detector.timed
+            try:
+                detector.callback(frame)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(detector.name, e)
+            # 回调之后再取间隔，自适应节奏可以立即反映本次结果
+            if detector.interval is not None:
+                detector.next_due = now + detector.current_interval()
+
+        # 阶段、Buy XP等廉价轮询的小截图不计入，capture阶段与其他阶段一样只反映识别流水线
+        if timed_ran and self.latency is not None:
+            self.latency.record("capture", capture_seconds)
+        return frame
+
+    def _time_to_next_due(self) -> float:
+        """距离最早到期的检测器还有多久，最长tick_interval"""
+        now = time.monotonic()
+        wait = self.tick_interval
+        for detector in self._detectors:
+            if detector.interval is not None and detector.is_enabled():
+                wait = min(wait, max(0.0, detector.next_due - now))
+        return wait
+
+    def _loop(self):
+        while self._running:
+            if self.profiler is not None:
+                with self.profiler.profile():
+                    self.run_once()
+            else:
+                self.run_once()
+            self._wake.wait(timeout=self._time_to_next_due())
+            self._wake.clear()
+
+    def start(self):
+        """启动调度线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        """停止调度线程并等待当前tick结束"""
+        self._running = False
+        self._wake.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+
+class AdaptiveCadence:
+    """根据识别到的阶段和阶段变化历史调整轮询间隔
+
+    阶段刚变化后离下一次变化还早（战斗、选秀），按idle_interval低频轮询；
+    接近预计的变化时间时切换到fast_interval；超过max_round_seconds仍无变化
+    （暂停、结算、不在对局中）时退回stable_interval。预计的回合时长取配置值
+    与最近几次实测时长中较小者，选秀回合（X-4，以及1-1）单独统计。
+
+    Buy XP搜索在阶段变化后从fast_interval开始，每次未找到按backoff倍数放慢。
+    """
+
+    MODES = ("unknown", "waiting", "window", "stable")
+
+    def __init__(self, base_interval: float = 0.5, fast_interval: float = 0.25, idle_interval: float = 3.0,
+                 stable_interval: float = 1.5, min_round_seconds: float = 40.0,
+                 carousel_round_seconds: float = 25.0, max_round_seconds: float = 120.0,
+                 lead_seconds: float = 5.0, buy_xp_max_interval: float = 2.0, backoff: float = 1.5,
+                 history_size: int = 5, on_change: Optional[Callable[[str, float], None]] = None):
+        """初始化节奏控制器
+
+        Args:
+            base_interval: 尚未识别到阶段时的轮询间隔
+            fast_interval: 预计阶段变化前后的轮询间隔
+            idle_interval: 刚变化后（战斗/选秀中）的最长轮询间隔
+            stable_interval: 长时间无变化时的轮询间隔
+            min_round_seconds: 普通回合从阶段变化到下一次变化的最短预计时长
+            carousel_round_seconds: 选秀回合的最短预计时长
+            max_round_seconds: 超过该时长仍无变化则视为稳定状态
+            lead_seconds: 提前多少秒进入快速轮询
+            buy_xp_max_interval: Buy XP搜索退避后的最大间隔
+            backoff: Buy XP搜索每次未找到后的间隔倍数
+            history_size: 保留的实测回合时长个数
+            on_change: 模式或阶段轮询间隔变化时的回调 (模式, 间隔)
+        """
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+        self.stable_interval = stable_interval
+        self.min_round_seconds = min_round_seconds
+        self.carousel_round_seconds = carousel_round_seconds
+        self.max_round_seconds = max_round_seconds
+        self.lead_seconds = lead_seconds
+        self.buy_xp_max_interval = buy_xp_max_interval
+        self.backoff = backoff
+        self.on_change = on_change
+
+        self.stage: Optional[int] = None
+        self.last_change: Optional[float] = None
+        self.buy_xp_attempts = 0
+        self._history = {False: deque(maxlen=history_size), True: deque(maxlen=history_size)}
+        self._lock = threading.Lock()
+
+        self.mode = "unknown"
+        self.interval = base_interval
+
+    @classmethod
+    def from_config(cls, settings: dict, base_interval: float = 0.5, **kwargs) -> "AdaptiveCadence":
+        """从auto_identification.adaptive_polling配置创建"""
+        keys = ("fast_interval", "idle_interval", "stable_interval", "min_round_seconds",
+                "carousel_round_seconds", "max_round_seconds", "lead_seconds", "buy_xp_max_interval", "backoff")
+        options = {key: settings[key] for key in keys if key in settings}
+        return cls(base_interval=base_interval, **options, **kwargs)
+
+    @staticmethod
+    def is_carousel(stage: int) -> bool:
+        """阶段值（如41表示4-1）是否为选秀回合"""
+        major, minor = divmod(stage, 10)
+        return (major == 1 and minor == 1) or (major >= 2 and minor == 4)
+
+    def expected_round_seconds(self, stage: Optional[int]) -> float:
+        """从该阶段开始到下一次阶段变化的预计最短时长"""
+        carousel = stage is not None and self.is_carousel(stage)
+        configured = self.carousel_round_seconds if carousel else self.min_round_seconds
+        history = self._history[carousel]
+        if history:
+            # 实测时长留10%余量，漏识别导致的偏长样本不会拉长预期
+            return min(configured, 0.9 * min(history))
+        return configured
+
+    def observe_stage(self, stage: Optional[int], now: Optional[float] = None):
+        """记录一次阶段识别结果"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            # 与GUI一致，只接受递增的阶段，忽略误识别出的较小值
+            if stage is None or (self.stage is not None and stage <= self.stage):
+                return
+            if self.stage is not None and self.last_change is not None:
+                self._history[self.is_carousel(self.stage)].append(now - self.last_change)
+            self.stage = stage
+            self.last_change = now
+
+    def stage_interval(self, now: Optional[float] = None) -> float:
+        """阶段OCR的下一次轮询间隔"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.last_change is None:
+                mode, interval = "unknown", self.base_interval
+            else:
+                elapsed = now - self.last_change
+                window_start = self.expected_round_seconds(self.stage) - self.lead_seconds
+                if elapsed < window_start:
+                    # 恰好在进入快速窗口时醒来
+                    mode = "waiting"
+                    interval = max(self.fast_interval, min(self.idle_interval, window_start - elapsed))
+                elif elapsed < self.max_round_seconds:
+                    mode, interval = "window", self.fast_interval
+                else:
+                    mode, interval = "stable", self.stable_interval
+        self._publish(mode, interval)
+        return interval
+
+    def start_buy_xp_search(self):
+        """阶段变化后开始Buy XP搜索"""
+        self.buy_xp_attempts = 0
+
+    def buy_xp_interval(self) -> float:
+        """Buy XP搜索的下一次间隔，每次未找到后按backoff放慢"""
+        interval = self.fast_interval * (self.backoff ** self.buy_xp_attempts)
+        self.buy_xp_attempts += 1
+        return min(self.buy_xp_max_interval, interval)
+
+    def _publish(self, mode: str, interval: float):
+        changed = mode != self.mode or (mode != "waiting" and interval != self.interval)
+        self.mode = mode
+        self.interval = interval
+        if changed and self.on_change:
+            self.on_change(mode, interval)
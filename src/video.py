@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+录像分析模块 - 解码对局录像，只在商店内容变化时识别，结果写入统计数据库
+
+录像按时间切分为若干段，由进程池中的工作进程各自用cv2.VideoCapture解码。
+每隔sample_step帧取一帧，把5个卡牌区域缩小成灰度小图作为特征，与上一个稳定画面比较：
+商店刷新时多数卡牌区域同时变化，购买卡牌只改变一个区域，不会重复计数。
+变化后等画面稳定（刷新动画结束）再做与perform_matching相同的模板匹配和Level/阶段OCR。
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .batch import _worker, load_region_config, prepare_template_cache, recognize_image, regions_for_size, worker_pool
+from .database import TFTStatsDatabase
+from .ocr_module import DEFAULT_OCR_BACKEND
+
+
+Region = Tuple[int, int, int, int]
+
+
+class ShopChangeDetector:
+    """用缩小后的卡牌区域灰度图判断商店是否刷新"""
+
+    def __init__(self, fixed_regions: List[Region], signature_size: Tuple[int, int] = (32, 24),
+                 change_threshold: float = 12.0, stable_threshold: float = 4.0, min_changed_slots: int = 3):
+        """初始化检测器
+
+        Args:
+            fixed_regions: 卡牌区域（画面像素坐标）
+            signature_size: 每个区域缩小后的 (宽, 高)
+            change_threshold: 区域平均灰度差超过该值视为内容变化
+            stable_threshold: 相邻采样帧所有区域的平均灰度差都低于该值视为画面稳定
+            min_changed_slots: 至少多少个区域变化才算商店刷新（购买卡牌只改变一个区域）
+        """
+        self.fixed_regions = list(fixed_regions)
+        self.signature_size = signature_size
+        self.change_threshold = change_threshold
+        self.stable_threshold = stable_threshold
+        self.min_changed_slots = min(min_changed_slots, len(self.fixed_regions))
+        self._previous: Optional[np.ndarray] = None
+        self._settled: Optional[np.ndarray] = None
+
+    def signature(self, image: np.ndarray) -> np.ndarray:
+        """各卡牌区域缩小后的灰度图，形状为 (区域数, 高, 宽)"""
+        slots = []
+        for x, y, w, h in self.fixed_regions:
+            small = cv2.resize(image[y:y + h, x:x + w], self.signature_size, interpolation=cv2.INTER_AREA)
+            slots.append(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        return np.stack(slots).astype(np.int16)
+
+    @staticmethod
+    def _slot_diffs(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.abs(a - b).mean(axis=(1, 2))
+
+    def update(self, image: np.ndarray) -> bool:
+        """输入一帧采样画面，返回是否应当识别这一帧（商店刷新且画面已稳定）"""
+        signature = self.signature(image)
+        previous, self._previous = self._previous, signature
+        if previous is None or self._slot_diffs(signature, previous).max() >= self.stable_threshold:
+            return False
+
+        settled, self._settled = self._settled, signature
+        if settled is None:
+            return True
+        changed = int((self._slot_diffs(signature, settled) > self.change_threshold).sum())
+        return changed >= self.min_changed_slots
+
+
+def probe_video(path: str) -> dict:
+    """读取录像的帧率、帧数和分辨率"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"无法打开录像: {path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        return {
+            "fps": fps if fps and fps > 0 else 30.0,
+            "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        cap.release()
+
+
+def analyze_video_chunk(path: str, start_frame: int, end_frame: Optional[int], sample_step: int,
+                        detector_settings: dict) -> dict:
+    """在工作进程中分析录像的 [start_frame, end_frame) 段，返回商店刷新时的识别结果"""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return {"start": start_frame, "error": "无法打开录像"}
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        regions = regions_for_size(_worker["region_config"], width, height)
+        detector = ShopChangeDetector(regions["fixed_regions"], **detector_settings)
+
+        events = []
+        sampled = 0
+        index = start_frame
+        while end_frame is None or index < end_frame:
+            # 采样点按全片帧号对齐，各段结果可以直接拼接；不采样的帧只解码不取出
+            if index % sample_step:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ok, image = cap.read()
+            if not ok:
+                break
+            sampled += 1
+            if detector.update(image):
+                result = recognize_image(image)
+                result["frame"] = index
+                events.append(result)
+            index += 1
+
+        return {"start": start_frame, "end": index, "sampled": sampled, "events": events}
+    except Exception as e:
+        return {"start": start_frame, "error": str(e)}
+    finally:
+        cap.release()
+
+
+def same_shop(matches, last_shop: Optional[dict]) -> bool:
+    """识别结果是否为上一个商店（或其购买了部分卡牌后的剩余部分）"""
+    if not last_shop:
+        return False
+    return all(last_shop.get(region) == tuple(names) for region, names in matches)
+
+
+def video_mode(video_path: str, templates_dir: str = "tft_units", threshold: float = 0.68, match_mode: str = "all",
+               early_exit_margin: Optional[float] = None, ocr_backend: str = DEFAULT_OCR_BACKEND, enable_ocr: bool = True,
+               workers: Optional[int] = None, sample_fps: float = 4.0, chunk_seconds: float = 60.0,
+               config_path: str = "config.json", fixed_regions: Optional[List[Region]] = None,
+               ocr_region: Optional[Region] = None, db_path: str = "tft_stats.db",
+               detector_settings: Optional[dict] = None):
+    """分析一个录像文件并把每次商店刷新的识别结果写入统计数据库
+
+    Args:
+        video_path: 录像文件
+        workers: 工作进程数，默认使用全部CPU核心
+        sample_fps: 每秒检查商店变化的帧数
+        chunk_seconds: 每个工作任务处理的录像时长（秒）
+        config_path: 提供fixed_regions和ocr_regions的配置文件
+        fixed_regions, ocr_region: 配置文件不存在时使用的区域
+        db_path: 统计数据库路径
+        detector_settings: 传给ShopChangeDetector的参数
+    """
+    if not os.path.isfile(video_path):
+        raise SystemExit(f"录像文件不存在: {video_path}")
+
+    info = probe_video(video_path)
+    fps = info["fps"]
+    total_frames = info["frames"]
+    duration = total_frames / fps if total_frames > 0 else 0.0
+    workers = workers or os.cpu_count() or 1
+    sample_step = max(1, round(fps / sample_fps)) if sample_fps > 0 else 1
+    region_config = load_region_config(config_path, fixed_regions, ocr_region)
+
+    print(f"=== 录像分析: {video_path} ===")
+    print(f"分辨率: {info['width']}x{info['height']}, {fps:.1f} fps, 时长 {duration / 60:.1f} 分钟")
+    print(f"工作进程: {workers}, 每 {sample_step} 帧检查一次商店变化")
+
+    # 按录像时长切段；帧数未知时整段交给一个进程
+    if total_frames > 0:
+        chunk_frames = max(sample_step, int(chunk_seconds * fps))
+        chunks = [(start, min(start + chunk_frames, total_frames)) for start in range(0, total_frames, chunk_frames)]
+    else:
+        chunks = [(0, None)]
+
+    prepare_template_cache(templates_dir, region_config, info["width"], info["height"])
+
+    # 录像文件的修改时间约为录制结束时间，据此推算每次商店刷新的时间
+    recorded_start = datetime.fromtimestamp(os.path.getmtime(video_path)) - timedelta(seconds=duration)
+
+    db = TFTStatsDatabase(db_path)
+    session_id = db.start_session(templates_dir, threshold, 0)
+    shops = recorded = sampled = errors = 0
+    last_shop = None
+    start = time.perf_counter()
+
+    try:
+        with worker_pool(workers, templates_dir, ocr_backend, enable_ocr, region_config,
+                         threshold, match_mode, early_exit_margin) as pool:
+            futures = [pool.submit(analyze_video_chunk, video_path, chunk_start, chunk_end, sample_step,
+                                   detector_settings or {})
+                       for chunk_start, chunk_end in chunks]
+            try:
+                for done, future in enumerate(futures, 1):
+                    result = future.result()
+                    if "error" in result:
+                        errors += 1
+                        print(f"⚠️ 第 {result['start']} 帧起的录像段分析失败: {result['error']}")
+                        continue
+                    sampled += result["sampled"]
+
+                    # 按时间顺序合并；跨段边界或商店关闭后重新打开时识别到的同一商店只记一次
+                    captures = []
+                    for event in result["events"]:
+                        if not event["matches"]:
+                            continue
+                        if same_shop(event["matches"], last_shop):
+                            continue
+                        last_shop = {region: tuple(names) for region, names in event["matches"]}
+                        capture_time = recorded_start + timedelta(seconds=event["frame"] / fps)
+                        captures.append((event["matches"], event["match_details"], event["stage"], capture_time))
+                    if captures:
+                        recorded += db.record_matches_batch(session_id, captures)
+                        shops += len(captures)
+
+                    elapsed = time.perf_counter() - start
+                    position = result["end"] / fps
+                    print(f"📊 {done}/{len(futures)} 段, 录像进度 {position / 60:.1f} 分钟, "
+                          f"商店 {shops} 次 ({position / elapsed:.0f}x 实时)")
+            except KeyboardInterrupt:
+                print("\n检测到中断信号，保存已完成的结果...")
+                pool.shutdown(wait=False, cancel_futures=True)
+    finally:
+        db.end_session(session_id)
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ 录像分析完成: 识别商店 {shops} 次, 写入 {recorded} 个区域结果, 检查 {sampled} 帧, "
+          f"失败 {errors} 段, 用时 {elapsed:.1f}s")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 被测模块作为src包导入（src内部使用包内相对导入），只需把仓库根目录加入路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
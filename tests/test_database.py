@@ -0,0 +1,209 @@
+"""TFTStatsDatabase 按 PRAGMA user_version 升级旧数据库"""
+
+import sqlite3
+
+import pytest
+
+from src.database import TFTStatsDatabase
+
+# 当前版本保留的matches索引
+MATCH_INDEXES = {'idx_matches_session_sequence', 'idx_matches_sequence_unit'}
+
+# 引入user_version之前的表结构（版本0）：没有match_margin列，区域分布以JSON存在template_stats中
+V0_SCHEMA = """
+CREATE TABLE sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP,
+    templates_dir TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    monitor_index INTEGER NOT NULL,
+    total_captures INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'running'
+);
+CREATE TABLE matches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL,
+    capture_time TIMESTAMP NOT NULL,
+    capture_sequence INTEGER NOT NULL,
+    region_number INTEGER NOT NULL,
+    template_name TEXT NOT NULL,
+    unit_name TEXT NOT NULL,
+    cost INTEGER NOT NULL,
+    match_score REAL NOT NULL,
+    match_bbox TEXT,
+    level INTEGER,
+    ocr_confidence REAL,
+    stage INTEGER,
+    FOREIGN KEY (session_id) REFERENCES sessions (id)
+);
+CREATE TABLE template_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    template_name TEXT NOT NULL,
+    unit_name TEXT NOT NULL,
+    cost INTEGER NOT NULL,
+    level INTEGER,
+    total_matches INTEGER DEFAULT 0,
+    first_seen TIMESTAMP,
+    last_seen TIMESTAMP,
+    avg_score REAL DEFAULT 0.0,
+    region_distribution TEXT
+);
+CREATE UNIQUE INDEX idx_unit_cost_ocr ON template_stats (unit_name, cost, level);
+"""
+
+
+@pytest.fixture
+def v0_db(tmp_path):
+    path = str(tmp_path / "v0.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(V0_SCHEMA)
+    conn.execute("INSERT INTO sessions (start_time, templates_dir, threshold, monitor_index) "
+                 "VALUES ('2024-01-01 10:00:00', 'tft_units', 0.68, 1)")
+    conn.execute("INSERT INTO matches (session_id, capture_time, capture_sequence, region_number, template_name, "
+                 "unit_name, cost, match_score, level) "
+                 "VALUES (1, '2024-01-01 10:00:05', 1, 2, '1c_Aatrox.png', 'Aatrox', 1, 0.91, 4)")
+    conn.executemany("INSERT INTO template_stats (template_name, unit_name, cost, level, total_matches, "
+                     "region_distribution) VALUES (?, ?, ?, ?, ?, ?)", [
+                         ('1c_Aatrox.png', 'Aatrox', 1, 4, 5, '{"2": 3, "5": 2}'),
+                         ('2c_Jinx.png', 'Jinx', 2, None, 1, '{"1": 1}'),
+                         ('3c_Bad.png', 'Bad', 3, 5, 1, 'not json'),
+                     ])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def user_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def match_indexes(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_matches_%'")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def test_migrates_v0_database(v0_db):
+    db = TFTStatsDatabase(v0_db)
+    try:
+        assert db.get_region_distribution('Aatrox', 1, 4) == {2: 3, 5: 2}
+        assert db.get_region_distribution('Jinx', 2) == {1: 1}
+
+        cursor = db.get_read_connection().cursor()
+        cursor.execute("PRAGMA table_info(matches)")
+        assert 'match_margin' in {row[1] for row in cursor.fetchall()}
+        cursor.execute("SELECT template_name, match_score, match_margin FROM matches")
+        assert cursor.fetchall() == [('1c_Aatrox.png', 0.91, None)]
+        assert match_indexes(cursor) == MATCH_INDEXES
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'session_perf'")
+        assert cursor.fetchone() is not None
+    finally:
+        db.close()
+    assert user_version(v0_db) == 5
+
+
+def test_reopening_does_not_migrate_again(v0_db):
+    TFTStatsDatabase(v0_db).close()
+    db = TFTStatsDatabase(v0_db)
+    try:
+        assert db.get_region_distribution('Aatrox', 1, 4) == {2: 3, 5: 2}
+    finally:
+        db.close()
+    assert user_version(v0_db) == 5
+
+
+def test_new_database_starts_at_latest_version(tmp_path):
+    path = str(tmp_path / "new.db")
+    db = TFTStatsDatabase(path)
+    try:
+        session_id = db.start_session('tft_units', 0.68, 1)
+        db.record_matches(session_id, [(1, ['1c_Aatrox.png'])], [{'score': 0.9, 'margin': 0.2, 'level': 3}])
+        assert db.get_region_distribution('Aatrox', 1, 3) == {1: 1}
+    finally:
+        db.close()
+    assert user_version(path) == 5
+
+
+def test_v4_database_drops_unused_match_indexes(tmp_path):
+    path = str(tmp_path / "v4.db")
+    TFTStatsDatabase(path).close()
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE INDEX idx_matches_session_region ON matches (session_id, region_number);
+        CREATE INDEX idx_matches_session_template ON matches (session_id, template_name, unit_name, cost);
+        CREATE INDEX idx_matches_session_cost ON matches (session_id, cost);
+        PRAGMA user_version = 4;
+    """)
+    conn.close()
+
+    db = TFTStatsDatabase(path)
+    try:
+        assert match_indexes(db.get_read_connection().cursor()) == MATCH_INDEXES
+    finally:
+        db.close()
+    assert user_version(path) == 5
+
+
+@pytest.mark.parametrize("query, index", [
+    ("SELECT region_number, COUNT(*) FROM matches WHERE session_id = ? GROUP BY region_number",
+     'idx_matches_session_sequence'),
+    ("SELECT cost, COUNT(*) FROM matches WHERE session_id = ? GROUP BY cost", 'idx_matches_session_sequence'),
+    ("SELECT MAX(capture_sequence) FROM matches", 'idx_matches_sequence_unit'),
+])
+def test_match_queries_use_indexes(tmp_path, query, index):
+    db = TFTStatsDatabase(str(tmp_path / "plan.db"))
+    try:
+        params = (1,) if '?' in query else ()
+        plan = [row[3] for row in db.get_read_connection().execute('EXPLAIN QUERY PLAN ' + query, params)]
+    finally:
+        db.close()
+    assert any(detail.startswith('SEARCH') and index in detail for detail in plan)
+
+
+def template_stats(db):
+    cursor = db.get_read_connection().cursor()
+    cursor.execute("SELECT unit_name, level, total_matches, avg_score FROM template_stats ORDER BY unit_name, level")
+    return [(unit, level, total, round(avg, 6)) for unit, level, total, avg in cursor.fetchall()]
+
+
+def test_batched_upsert_counts(tmp_path):
+    db = TFTStatsDatabase(str(tmp_path / "batch.db"))
+    try:
+        session_id = db.start_session('tft_units', 0.68, 1)
+        captures = [
+            ([(1, ['1c_Aatrox.png']), (2, ['2c_Jinx.png'])], [{'score': 0.8, 'level': 4}, {'score': 0.9, 'level': 4}], 21, None),
+            ([], [], 21, None),  # 没有匹配的截图不计数
+            ([(3, ['1c_Aatrox.png'])], [{'score': 0.6, 'level': 4}], 22, None),
+            ([(1, ['1c_Aatrox.png'])], [{'score': 0.7, 'level': 5}], 22, None),
+        ]
+        assert db.record_matches_batch(session_id, captures) == 4
+        # 第二批与已有行合并
+        assert db.record_matches_batch(session_id, [([(5, ['1c_Aatrox.png'])], [{'score': 1.0, 'level': 4}], 23, None)]) == 1
+
+        assert template_stats(db) == [('Aatrox', 4, 3, 0.8), ('Aatrox', 5, 1, 0.7), ('Jinx', 4, 1, 0.9)]
+        assert db.get_region_distribution('Aatrox', 1, 4) == {1: 1, 3: 1, 5: 1}
+        assert db.get_region_distribution('Aatrox', 1) == {1: 2, 3: 1, 5: 1}
+
+        cursor = db.get_read_connection().cursor()
+        cursor.execute("SELECT total_captures FROM sessions WHERE id = ?", (session_id,))
+        assert cursor.fetchone()[0] == 4
+        cursor.execute("SELECT capture_sequence, COUNT(*) FROM matches GROUP BY capture_sequence")
+        assert cursor.fetchall() == [(1, 2), (2, 1), (3, 1), (4, 1)]
+    finally:
+        db.close()
+
+
+def test_unleveled_matches_only_update_unleveled_row(tmp_path):
+    db = TFTStatsDatabase(str(tmp_path / "unleveled.db"))
+    try:
+        session_id = db.start_session('tft_units', 0.68, 1)
+        db.record_matches(session_id, [(1, ['1c_Aatrox.png'])], [{'score': 0.8, 'level': 4}])
+        db.record_matches(session_id, [(1, ['1c_Aatrox.png'])], [{'score': 0.6}])
+        db.record_matches(session_id, [(2, ['1c_Aatrox.png'])], [{'score': 1.0}])
+        assert template_stats(db) == [('Aatrox', None, 2, 0.8), ('Aatrox', 4, 1, 0.8)]
+    finally:
+        db.close()
@@ -0,0 +1,93 @@
+"""FrameRecorder 写入、FrameLog 读回的帧日志"""
+
+import numpy as np
+import pytest
+
+from src.capture import Frame, FrameLog, FrameRecorder, ROLE_LEVEL, ROLE_SLOTS
+
+SLOTS = [(10, 20, 16, 12), (30, 20, 16, 12)]
+LEVEL = (2, 4, 6, 8)
+ROLES = {ROLE_SLOTS: SLOTS, ROLE_LEVEL: [LEVEL]}
+
+
+def make_frame(seed, timestamp):
+    image = np.random.default_rng(seed).integers(0, 256, size=(40, 60, 3), dtype=np.uint8)
+    return Frame(image, timestamp=timestamp)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "frames.tftlog")
+    frames = [make_frame(seed, 100.0 + seed) for seed in range(3)]
+    recorder = FrameRecorder(path, SLOTS + [LEVEL], capacity=5, roles=ROLES)
+    for frame in frames:
+        assert recorder.record(frame)
+    recorder.close()
+
+    frame_log = FrameLog(path)
+    assert len(frame_log) == 3
+    assert frame_log.capacity == 5
+    assert frame_log.regions == SLOTS + [LEVEL]
+    assert frame_log.slot_regions == SLOTS
+    assert frame_log.level_region == LEVEL
+    np.testing.assert_array_equal(frame_log.timestamps, [100.0, 101.0, 102.0])
+    for logged, original in zip(frame_log, frames):
+        for region in SLOTS + [LEVEL]:
+            np.testing.assert_array_equal(logged.view(region), original.view(region))
+    assert frame_log[0].view((0, 0, 5, 5)).size == 0
+
+
+def test_full_log_stops_recording(tmp_path):
+    path = str(tmp_path / "frames.tftlog")
+    recorder = FrameRecorder(path, SLOTS, capacity=2)
+    assert recorder.record(make_frame(0, 1.0))
+    assert recorder.record(make_frame(1, 2.0))
+    assert recorder.full
+    assert not recorder.record(make_frame(2, 3.0))
+    recorder.close()
+
+    frame_log = FrameLog(path)
+    assert len(frame_log) == 2
+    np.testing.assert_array_equal(frame_log.timestamps, [1.0, 2.0])
+
+
+def test_reopen_appends_to_same_regions(tmp_path):
+    path = str(tmp_path / "frames.tftlog")
+    recorder = FrameRecorder(path, SLOTS + [LEVEL], capacity=4, roles=ROLES)
+    recorder.record(make_frame(0, 1.0))
+    recorder.close()
+
+    recorder = FrameRecorder(path, SLOTS + [LEVEL], capacity=4, roles=ROLES)
+    assert len(recorder) == 1
+    recorder.record(make_frame(1, 2.0))
+    recorder.close()
+
+    assert len(FrameLog(path)) == 2
+
+
+def test_reopen_with_other_regions_replaces_log(tmp_path):
+    path = str(tmp_path / "frames.tftlog")
+    recorder = FrameRecorder(path, SLOTS + [LEVEL], capacity=4, roles=ROLES)
+    recorder.record(make_frame(0, 1.0))
+    recorder.close()
+
+    moved = [(x + 1, y, w, h) for x, y, w, h in SLOTS]
+    recorder = FrameRecorder(path, moved + [LEVEL], capacity=4, roles={ROLE_SLOTS: moved, ROLE_LEVEL: [LEVEL]})
+    assert len(recorder) == 0
+    recorder.close()
+
+    assert FrameLog(path).slot_regions == moved
+
+
+def test_log_without_roles_takes_last_region_as_level(tmp_path):
+    path = str(tmp_path / "frames.tftlog")
+    FrameRecorder(path, SLOTS + [LEVEL], capacity=1).close()
+
+    frame_log = FrameLog(path)
+    assert frame_log.roles == {}
+    assert frame_log.slot_regions == SLOTS
+    assert frame_log.level_region == LEVEL
+
+
+def test_role_must_name_logged_regions(tmp_path):
+    with pytest.raises(ValueError):
+        FrameRecorder(str(tmp_path / "frames.tftlog"), SLOTS, roles={ROLE_LEVEL: [LEVEL]})
@@ -0,0 +1,118 @@
+"""TemplateBank 打分和编译缓存"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from src.matching import TemplateBank, match_slots
+
+SIZE = (24, 18)
+
+
+def write_templates(directory, seeds):
+    os.makedirs(directory, exist_ok=True)
+    for cost, seed in seeds.items():
+        image = np.random.default_rng(seed).integers(0, 256, size=(SIZE[1], SIZE[0], 3), dtype=np.uint8)
+        cv2.imwrite(os.path.join(directory, f"{cost}c_Unit{seed}.png"), image)
+
+
+@pytest.fixture
+def template_dir(tmp_path):
+    directory = str(tmp_path / "units")
+    write_templates(directory, {1: 1, 2: 2, 3: 3})
+    return directory
+
+
+def test_cache_manifest_references_content_named_arrays(tmp_path, template_dir):
+    cache_dir = str(tmp_path / "cache")
+    bank = TemplateBank(template_dir, template_size=SIZE, cache_dir=cache_dir)
+    assert not bank.loaded_from_cache
+
+    with open(os.path.join(cache_dir, "templates_24x18.json"), encoding="utf-8") as f:
+        first = json.load(f)
+    assert sorted(os.listdir(cache_dir)) == sorted(["templates_24x18.json", first["normalized_file"],
+                                                    first["gray_file"]])
+
+    cached = TemplateBank(template_dir, template_size=SIZE, cache_dir=cache_dir)
+    assert cached.loaded_from_cache
+    assert cached.names == bank.names
+    np.testing.assert_array_equal(cached.normalized, bank.normalized)
+
+    # 模板变化后写入新文件名的数组，旧数组被清理
+    write_templates(template_dir, {4: 4})
+    assert cached.refresh()
+    with open(os.path.join(cache_dir, "templates_24x18.json"), encoding="utf-8") as f:
+        second = json.load(f)
+    assert second["normalized_file"] != first["normalized_file"]
+    assert sorted(os.listdir(cache_dir)) == sorted(["templates_24x18.json", second["normalized_file"],
+                                                    second["gray_file"]])
+    assert len(TemplateBank(template_dir, template_size=SIZE, cache_dir=cache_dir).names) == 4
+
+
+def test_manifest_with_missing_arrays_falls_back_to_sources(tmp_path, template_dir):
+    cache_dir = str(tmp_path / "cache")
+    TemplateBank(template_dir, template_size=SIZE, cache_dir=cache_dir)
+    with open(os.path.join(cache_dir, "templates_24x18.json"), encoding="utf-8") as f:
+        os.remove(os.path.join(cache_dir, json.load(f)["gray_file"]))
+
+    bank = TemplateBank(template_dir, template_size=SIZE, cache_dir=cache_dir)
+    assert not bank.loaded_from_cache
+    assert len(bank.names) == 3
+
+
+def textures(count, seed=0):
+    """count张互不相关的随机纹理（BGR），尺寸为SIZE"""
+    rng = np.random.default_rng(seed)
+    images = rng.integers(0, 256, size=(count, SIZE[1], SIZE[0], 3), dtype=np.uint8)
+    return [cv2.GaussianBlur(image, (3, 3), 0) for image in images]
+
+
+def noisy(image, sigma, seed):
+    noise = np.random.default_rng(seed).normal(0.0, sigma, image.shape)
+    return np.clip(image.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+
+def bank_of(tmp_path, images):
+    directory = str(tmp_path / "bank")
+    os.makedirs(directory)
+    for i, image in enumerate(images):
+        cv2.imwrite(os.path.join(directory, f"{i % 5 + 1}c_Unit{i:02d}.png"), image)
+    return TemplateBank(directory, template_size=SIZE)
+
+
+def test_scores_equal_match_template_ccoeff_normed(tmp_path):
+    templates = textures(6)
+    bank = bank_of(tmp_path, templates)
+    slots = [noisy(templates[3], 20, 1), noisy(templates[0], 60, 2), textures(1, seed=9)[0]]
+
+    scores = bank.score_slots(slots)
+    assert scores.shape == (len(slots), len(bank.names))
+    for s, slot in enumerate(slots):
+        for t, name in enumerate(bank.names):
+            template = cv2.cvtColor(cv2.imread(os.path.join(bank.template_dir, name)), cv2.COLOR_BGR2GRAY)
+            expected = cv2.matchTemplate(cv2.cvtColor(slot, cv2.COLOR_BGR2GRAY), template, cv2.TM_CCOEFF_NORMED)
+            assert scores[s, t] == pytest.approx(float(expected[0, 0]), abs=1e-4)
+
+
+def test_best_mode_with_early_exit_picks_the_all_mode_winner(tmp_path):
+    # 多于一个分块(chunk_size=16)，提前退出才会跳过后面的模板
+    templates = textures(40, seed=3)
+    bank = bank_of(tmp_path, templates)
+    slots = [noisy(templates[i], 25, i) for i in (0, 17, 39)] + [textures(1, seed=99)[0]]
+    threshold = 0.5
+
+    all_hits = match_slots(bank, slots, threshold, mode="all")
+    assert [bool(hits) for hits in all_hits] == [True, True, True, False]
+    for margin in (None, 0.05, 0.3):
+        best_hits = match_slots(bank, slots, threshold, mode="best", early_exit_margin=margin)
+        for hits, best in zip(all_hits, best_hits):
+            if not hits:
+                assert best == []
+                continue
+            winner = max(hits, key=lambda hit: hit["score"])
+            assert [hit["name"] for hit in best] == [winner["name"]]
+            assert best[0]["score"] == pytest.approx(winner["score"], abs=1e-6)
+            assert best[0]["margin"] > 0
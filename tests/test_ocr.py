@@ -0,0 +1,121 @@
+"""数字字形分类器、阶段解析和NumberOCR后端"""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from src.ocr_module import DigitGlyphClassifier, NumberOCR, parse_number_text, parse_stage_text
+
+
+def render(text, height=36, font="DejaVuSans.ttf"):
+    """用TrueType字体（不同于合成原型的Hershey字体）绘制深色背景上的白色数字"""
+    canvas = Image.new("L", (24 * len(text) + 8, height), 20)
+    draw = ImageDraw.Draw(canvas)
+    try:
+        face = ImageFont.truetype(font, int(height * 0.7))
+    except OSError:
+        face = ImageFont.load_default(int(height * 0.7))
+    draw.text((4, 4), text, font=face, fill=235)
+    return np.asarray(canvas)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("4-1", 41), ("41", 41), (" 2 - 5 ", 25), ("1-1", 11),
+    ("4-", None), ("0-1", None), ("4-10", None), ("411", None), ("", None), (None, None),
+])
+def test_parse_stage_text(text, expected):
+    assert parse_stage_text(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("7", 7), (" 10\n", 10), ("80", 80), ("81", None), ("7a", None), ("", None), (None, None),
+])
+def test_parse_number_text(text, expected):
+    assert parse_number_text(text) == expected
+
+
+def test_auto_backend_ignores_synthetic_prototypes():
+    """auto不使用Hershey合成原型：没有游戏字体字形时不会把TrueType的6读成5"""
+    ocr = NumberOCR(backend="auto", glyph_dir=None, cache_size=0)
+    assert ocr.glyph_classifier.prototype_count == 0
+    ocr.tesseract_available = False
+    assert ocr._read_number(render("6")) is None
+
+
+def test_glyph_backend_rejects_low_margin_readings():
+    """合成原型把TrueType数字读错时余量很小，宁可识别失败也不写入错误的Level"""
+    ocr = NumberOCR(backend="glyph", glyph_dir=None, cache_size=0)
+    for digit in "0123456789":
+        assert ocr._read_number(render(digit)) in (int(digit), None)
+
+
+def test_game_font_glyphs_are_read(tmp_path):
+    """ocr_glyphs/中的单字符截图作为原型，同一字体的数字和阶段可以直接识别"""
+    import cv2
+
+    # 字形图片为整行高度：裁掉数字上下的空白
+    for digit in "0123456789":
+        image = render(digit)
+        rows = np.flatnonzero((image > 128).any(axis=1))
+        cv2.imwrite(str(tmp_path / f"{digit}.png"), image[rows[0]:rows[-1] + 1])
+    classifier = DigitGlyphClassifier(str(tmp_path), synthetic=False)
+    assert classifier.prototype_count == 10
+
+    for digit in "0123456789":
+        text, confidence = classifier.read(render(digit))
+        assert text == digit
+        assert confidence >= 0.5
+    assert classifier.read(render("37"))[0] == "37"
+
+
+def test_learned_glyphs_are_used_by_auto_backend():
+    """Tesseract确认过的结果学习为原型后，auto不再需要Tesseract"""
+    ocr = NumberOCR(backend="auto", glyph_dir=None, cache_size=0)
+    for digit in "0123456789":
+        assert ocr.glyph_classifier.learn(render(digit), digit)
+    ocr.tesseract_available = False
+
+    assert ocr._read_number(render("6")) == 6
+    assert ocr._read_number(render("8")) == 8
+
+
+def counting_reader(values):
+    """按调用顺序返回values的reader，记录调用次数"""
+    calls = []
+
+    def read(image):
+        calls.append(image)
+        return values[len(calls) - 1]
+
+    return read, calls
+
+
+def test_fingerprint_cache_hits_and_misses():
+    ocr = NumberOCR(backend="glyph", glyph_dir=None, cache_size=2)
+    ocr._read_number, calls = counting_reader([4, 7, None, 4])
+    four, seven, blank = render("4"), render("7"), np.full((36, 32), 20, dtype=np.uint8)
+
+    assert ocr.recognize_number(four) == 4
+    assert ocr.recognize_number(four) == 4
+    # 轻微亮度变化不改变指纹
+    assert ocr.recognize_number(np.clip(four.astype(np.int16) + 6, 0, 255).astype(np.uint8)) == 4
+    assert (ocr.cache_hits, ocr.cache_misses, len(calls)) == (2, 1, 1)
+
+    assert ocr.recognize_number(seven) == 7
+    # 识别失败也缓存，返回上次结果
+    assert ocr.recognize_number(blank) == 7
+    assert ocr.recognize_number(blank) == 7
+    assert (ocr.cache_hits, ocr.cache_misses, len(calls)) == (3, 3, 3)
+
+    # 容量为2，最早的"4"已被淘汰
+    assert ocr.recognize_number(four) == 4
+    assert (ocr.cache_hits, ocr.cache_misses, len(calls)) == (3, 4, 4)
+
+
+def test_disabled_cache_reads_every_time():
+    ocr = NumberOCR(backend="glyph", glyph_dir=None, cache_size=0)
+    ocr._read_number, calls = counting_reader([4, 4])
+    image = render("4")
+    assert ocr.recognize_number(image) == 4
+    assert ocr.recognize_number(image) == 4
+    assert (ocr.cache_hits, ocr.cache_misses, len(calls)) == (0, 0, 2)
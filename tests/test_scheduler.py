@@ -0,0 +1,159 @@
+"""RecognitionScheduler.run_once 的到期/触发/区域约定"""
+
+import pytest
+
+from src.scheduler import RecognitionScheduler
+
+STAGE = (10, 10, 20, 10)
+BUY_XP = (100, 100, 40, 20)
+SLOTS = [(200, 300, 50, 40), (260, 300, 50, 40)]
+LEVEL = (150, 280, 10, 12)
+
+
+class FakeCapture:
+    """记录每次截图请求的区域，返回带编号的假帧；on_capture在截图时调用（模拟截图期间到达的触发）"""
+
+    def __init__(self):
+        self.requests = []
+        self.on_capture = None
+
+    def __call__(self, regions, monitor_index=1):
+        self.requests.append(list(regions))
+        if self.on_capture is not None:
+            self.on_capture()
+        return {"index": len(self.requests), "regions": set(regions)}
+
+
+@pytest.fixture
+def capture():
+    return FakeCapture()
+
+
+@pytest.fixture
+def scheduler(capture):
+    return RecognitionScheduler(capture=capture)
+
+
+def recorder(calls, name):
+    return lambda frame: calls.append((name, frame["index"]))
+
+
+def test_nothing_due_does_not_capture(scheduler, capture):
+    scheduler.register("stage", lambda frame: None, [STAGE], interval=1.0)
+    scheduler.register("shop", lambda frame: None, SLOTS)
+    scheduler.run_once(now=0.0)
+
+    assert scheduler.run_once(now=0.5) is None
+    assert len(capture.requests) == 1
+
+
+def test_due_detectors_share_one_capture(scheduler, capture):
+    calls = []
+    scheduler.register("stage", recorder(calls, "stage"), [STAGE], interval=0.5)
+    scheduler.register("buy_xp", recorder(calls, "buy_xp"), [BUY_XP], interval=0.5)
+
+    frame = scheduler.run_once(now=0.0)
+
+    assert capture.requests == [[STAGE, BUY_XP]]
+    assert calls == [("stage", 1), ("buy_xp", 1)]
+    assert frame["index"] == 1
+    assert scheduler.get("stage").next_due == pytest.approx(0.5)
+
+
+def test_disabled_detector_is_not_due(scheduler, capture):
+    scheduler.register("stage", lambda frame: None, [STAGE], interval=0.5, enabled=lambda: False)
+
+    assert scheduler.run_once(now=0.0) is None
+    assert capture.requests == []
+
+
+def test_trigger_runs_once(scheduler, capture):
+    calls = []
+    scheduler.register("shop", recorder(calls, "shop"), SLOTS + [LEVEL])
+
+    scheduler.trigger("shop")
+    scheduler.run_once(now=0.0)
+    scheduler.run_once(now=0.1)
+
+    assert calls == [("shop", 1)]
+    assert capture.requests == [SLOTS + [LEVEL]]
+    assert not scheduler.get("shop").triggered
+
+
+def test_trigger_from_earlier_detector_runs_on_same_frame(scheduler, capture):
+    """Buy XP声明了卡牌区域，它触发的卡牌匹配在同一帧上运行"""
+    calls = []
+
+    def buy_xp(frame):
+        calls.append(("buy_xp", frame["index"]))
+        scheduler.trigger("shop")
+
+    scheduler.register("buy_xp", buy_xp, [BUY_XP, LEVEL] + SLOTS, interval=0.5)
+    scheduler.register("shop", recorder(calls, "shop"), SLOTS + [LEVEL])
+
+    scheduler.run_once(now=0.0)
+
+    assert calls == [("buy_xp", 1), ("shop", 1)]
+    assert len(capture.requests) == 1
+
+
+def test_trigger_during_capture_waits_for_frame_with_its_regions(scheduler, capture):
+    """截图期间到达的触发不能在缺少其区域的帧上运行，而是保留到下一个tick"""
+    calls = []
+    scheduler.register("stage", recorder(calls, "stage"), [STAGE], interval=0.5)
+    scheduler.register("shop", recorder(calls, "shop"), SLOTS + [LEVEL])
+    capture.on_capture = lambda: scheduler.trigger("shop")
+
+    scheduler.run_once(now=0.0)
+
+    assert calls == [("stage", 1)]
+    assert scheduler.get("shop").triggered
+
+    capture.on_capture = None
+    scheduler.run_once(now=0.1)
+
+    assert calls == [("stage", 1), ("shop", 2)]
+    assert capture.requests[1] == SLOTS + [LEVEL]
+    assert not scheduler.get("shop").triggered
+
+
+def test_trigger_during_capture_runs_when_frame_covers_its_regions(scheduler, capture):
+    calls = []
+    scheduler.register("buy_xp", recorder(calls, "buy_xp"), [BUY_XP, LEVEL] + SLOTS, interval=0.5)
+    scheduler.register("shop", recorder(calls, "shop"), SLOTS + [LEVEL])
+    capture.on_capture = lambda: scheduler.trigger("shop")
+
+    scheduler.run_once(now=0.0)
+
+    assert calls == [("buy_xp", 1), ("shop", 1)]
+    assert not scheduler.get("shop").triggered
+
+
+def test_callback_error_is_reported_and_rescheduled(capture):
+    errors = []
+    scheduler = RecognitionScheduler(capture=capture, on_error=lambda name, e: errors.append((name, str(e))))
+
+    def stage(frame):
+        raise RuntimeError("boom")
+
+    scheduler.register("stage", stage, [STAGE], interval=0.5)
+    scheduler.run_once(now=0.0)
+
+    assert errors == [("stage", "boom")]
+    assert scheduler.get("stage").next_due == pytest.approx(0.5)
+
+
+def test_timed_detector_records_capture_latency(capture):
+    from src.perf import LatencyTracker
+
+    latency = LatencyTracker()
+    scheduler = RecognitionScheduler(capture=capture, latency=latency)
+    scheduler.register("stage", lambda frame: None, [STAGE], interval=0.5)
+    scheduler.register("shop", lambda frame: None, SLOTS, timed=True)
+
+    scheduler.run_once(now=0.0)
+    assert "capture" not in latency.recent()
+
+    scheduler.trigger("shop")
+    scheduler.run_once(now=0.1)
+    assert latency.recent()["capture"]["count"] == 1
@@ -0,0 +1,107 @@
+"""录像分析：商店刷新检测和跨段去重"""
+
+import numpy as np
+import pytest
+
+from src.video import ShopChangeDetector, same_shop
+
+SLOTS = [(10 + 60 * i, 20, 50, 40) for i in range(5)]
+
+
+def shop_image(seed, blank=()):
+    """5个卡牌区域各自填充随机纹理；blank中的区域（已购买）为纯色"""
+    rng = np.random.default_rng(seed)
+    image = np.full((80, 320, 3), 40, dtype=np.uint8)
+    for index, (x, y, w, h) in enumerate(SLOTS):
+        texture = rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+        if index not in blank:
+            image[y:y + h, x:x + w] = texture
+    return image
+
+
+@pytest.fixture
+def detector():
+    return ShopChangeDetector(SLOTS)
+
+
+def test_first_settled_shop_is_recognized_once(detector):
+    shop = shop_image(1)
+    assert detector.update(shop) is False
+    assert detector.update(shop) is True
+    assert detector.update(shop) is False
+
+
+def test_reroll_is_recognized_after_it_settles(detector):
+    detector.update(shop_image(1))
+    detector.update(shop_image(1))
+
+    rerolled = shop_image(2)
+    assert detector.update(rerolled) is False
+    assert detector.update(rerolled) is True
+    assert detector.update(rerolled) is False
+
+
+def test_single_purchase_is_not_a_reroll(detector):
+    detector.update(shop_image(1))
+    detector.update(shop_image(1))
+
+    bought = shop_image(1, blank=(2,))
+    assert detector.update(bought) is False
+    assert detector.update(bought) is False
+
+    bought_two = shop_image(1, blank=(2, 4))
+    assert detector.update(bought_two) is False
+    assert detector.update(bought_two) is False
+
+
+def test_unstable_frames_are_skipped(detector):
+    detector.update(shop_image(1))
+    detector.update(shop_image(1))
+
+    # 刷新动画：每个采样帧都不同，画面稳定后才识别
+    assert detector.update(shop_image(10)) is False
+    assert detector.update(shop_image(11)) is False
+    assert detector.update(shop_image(2)) is False
+    assert detector.update(shop_image(2)) is True
+
+
+SHOP = [(1, ['1c_Aatrox.png']), (2, ['2c_Jinx.png']), (3, ['1c_Garen.png']),
+        (4, ['3c_Ahri.png']), (5, ['1c_Gnar.png'])]
+
+
+def as_last_shop(matches):
+    return {region: tuple(names) for region, names in matches}
+
+
+def test_same_shop():
+    assert not same_shop(SHOP, None)
+    assert same_shop(SHOP, as_last_shop(SHOP))
+    # 购买了区域2后剩余的卡牌
+    assert same_shop([match for match in SHOP if match[0] != 2], as_last_shop(SHOP))
+    assert not same_shop([(1, ['1c_Ezreal.png'])] + SHOP[1:], as_last_shop(SHOP))
+
+
+def merge_chunks(chunks):
+    """按video_mode的方式按段顺序合并识别结果，返回记录下的商店"""
+    recorded, last_shop = [], None
+    for events in chunks:
+        for matches in events:
+            if not matches or same_shop(matches, last_shop):
+                continue
+            last_shop = as_last_shop(matches)
+            recorded.append(matches)
+    return recorded
+
+
+def test_shop_spanning_chunk_boundary_is_recorded_once():
+    rerolled = [(1, ['2c_Jinx.png']), (2, ['4c_Yone.png']), (3, ['1c_Garen.png']),
+                (4, ['1c_Aatrox.png']), (5, ['3c_Ahri.png'])]
+    after_purchase = [match for match in SHOP if match[0] != 4]
+    chunks = [
+        [SHOP],
+        # 新的一段从购买之后开始，第一帧稳定画面是同一商店剩下的4张卡
+        [after_purchase, rerolled],
+        # 商店关闭后重新打开
+        [rerolled],
+    ]
+    assert merge_chunks(chunks) == [SHOP, rerolled]